@@ -6,14 +6,19 @@ Aplicación Principal Streamlit
 """
 
 import streamlit as st
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional
 import sys
 
 # Agregar el directorio raíz al path
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
-from config.database import initialize_pool, test_connection
+from config.database import initialize_pool
+from config.logging_setup import configure_logging
 from config.settings import AppConfig
+from repositories.base_repository import request_scope
+from ui.pages import get_page
 
 # ============================================
 # CONFIGURACIÓN DE LA PÁGINA
@@ -30,7 +35,10 @@ st.set_page_config(
 # ESTILOS CSS PERSONALIZADOS
 # ============================================
 
-st.markdown("""
+@st.cache_resource
+def _css() -> str:
+    """Retorna el bloque <style> de la aplicación (construido una vez por proceso)"""
+    return """
 <style>
     .main-header {
         font-size: 2.5rem;
@@ -67,57 +75,75 @@ st.markdown("""
         color: #856404;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+
+st.markdown(_css(), unsafe_allow_html=True)
 
 # ============================================
 # INICIALIZACIÓN
 # ============================================
 
-@st.cache_resource
-def init_database():
-    """Inicializa la conexión a la base de datos"""
+configure_logging()
+
+def init_database() -> Optional[str]:
+    """
+    Inicializa la conexión a la base de datos.
+    
+    Se ejecuta en un hilo de fondo, por lo que no usa funciones de
+    Streamlit: retorna el mensaje de error y el script lo muestra.
+    
+    Returns:
+        str|None: None si la conexión fue exitosa, o el mensaje de error
+    """
     try:
         initialize_pool()
-        test_connection()
-        return True
+        return None
     except Exception as e:
-        st.error(f"Error conectando a la base de datos: {e}")
-        return False
+        return str(e)
 
-# Inicializar base de datos
-if 'db_initialized' not in st.session_state:
-    st.session_state.db_initialized = init_database()
 
-if not st.session_state.db_initialized:
-    st.error("⚠️ No se pudo conectar a la base de datos. Verifica la configuración.")
-    st.stop()
+@st.cache_resource
+def _startup_executor() -> ThreadPoolExecutor:
+    """Executor compartido para las tareas de arranque"""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="startup")
+
+
+@st.cache_resource
+def _db_future() -> Future:
+    """
+    Lanza la conexión a la base de datos y precarga el dashboard en
+    segundo plano, mientras se dibujan los estilos y la barra lateral.
+    Se ejecuta una sola vez por proceso.
+    """
+    executor = _startup_executor()
+    executor.submit(get_page, "dashboard")
+    return executor.submit(init_database)
+
+
+# Inicializar base de datos (sin bloquear el primer render)
+_db_init = _db_future()
 
 # ============================================
 # INICIALIZAR SESSION STATE
 # ============================================
 
-if 'usuario_id' not in st.session_state:
-    st.session_state.usuario_id = 1  # Usuario por defecto (admin)
-
-if 'usuario_nombre' not in st.session_state:
-    st.session_state.usuario_nombre = "Administrador"
+# app.py se ejecuta de nuevo en cada rerun, así que la lista del carrito
+# es un objeto nuevo cada vez y no se comparte entre sesiones
+_SESSION_DEFAULTS = (
+    ('usuario_id', 1),  # Usuario por defecto (admin)
+    ('usuario_nombre', "Administrador"),
+    ('carrito', []),
+)
 
-if 'carrito' not in st.session_state:
-    st.session_state.carrito = []
+for key, default in _SESSION_DEFAULTS:
+    st.session_state.setdefault(key, default)
 
 # ============================================
 # MENÚ DE NAVEGACIÓN
 # ============================================
 
-st.sidebar.markdown("### 🛒 Sistema de Comercialización")
-st.sidebar.markdown("---")
-
-# Información del usuario
-st.sidebar.info(f"👤 Usuario: {st.session_state.usuario_nombre}")
-st.sidebar.markdown("---")
-
-# Menú de navegación
-menu_options = {
+MENU_OPTIONS = {
     "🏠 Dashboard": "dashboard",
     "📦 Productos": "productos",
     "🛍️ Ventas": "ventas",
@@ -125,37 +151,49 @@ menu_options = {
     "📊 Inventario": "inventario"
 }
 
-selected_page = st.sidebar.radio(
-    "Navegación",
-    list(menu_options.keys()),
-    key="navigation"
-)
 
-st.sidebar.markdown("---")
-st.sidebar.caption("© 2026 Sistema de Comercialización v1.0")
+def render_sidebar() -> str:
+    """
+    Dibuja la barra lateral y retorna el slug de la página elegida.
+    
+    La navegación no se envuelve en st.fragment: cambiar de página debe
+    volver a dibujar el panel principal, y un rerun de fragmento
+    necesitaría de todos modos st.rerun(scope="app").
+    """
+    with st.sidebar:
+        st.markdown("### 🛒 Sistema de Comercialización")
+        st.markdown("---")
+        
+        # Información del usuario
+        st.info(f"👤 Usuario: {st.session_state.usuario_nombre}")
+        st.markdown("---")
+        
+        # Menú de navegación
+        selected_page = st.radio(
+            "Navegación",
+            list(MENU_OPTIONS.keys()),
+            key="navigation"
+        )
+        
+        st.markdown("---")
+        st.caption("© 2026 Sistema de Comercialización v1.0")
+    
+    return MENU_OPTIONS[selected_page]
+
 
 # ============================================
 # ENRUTAMIENTO DE PÁGINAS
 # ============================================
 
-page = menu_options[selected_page]
-
-if page == "dashboard":
-    from ui.pages import dashboard
-    dashboard.render()
-
-elif page == "productos":
-    from ui.pages import productos
-    productos.render()
+page = render_sidebar()
 
-elif page == "ventas":
-    from ui.pages import ventas
-    ventas.render()
-
-elif page == "compras":
-    from ui.pages import compras
-    compras.render()
+db_error = _db_init.result()
+if db_error is not None:
+    st.error(f"Error conectando a la base de datos: {db_error}")
+    st.error("⚠️ No se pudo conectar a la base de datos. Verifica la configuración.")
+    st.stop()
 
-elif page == "inventario":
-    from ui.pages import inventario
-    inventario.render()
+# Cada ejecución del script es una petición: las búsquedas repetidas
+# de una misma compra se resuelven una sola vez
+with request_scope():
+    get_page(page).render()
@@ -18,41 +18,71 @@ Fecha: 2026
 
 import psycopg2
 from psycopg2 import pool, OperationalError
-from psycopg2.extras import RealDictCursor, DictCursor
+from psycopg2 import errors as pg_errors
+from psycopg2.extras import (
+    RealDictCursor, DictCursor, NamedTupleCursor, execute_batch, execute_values
+)
 from contextlib import contextmanager
+from functools import lru_cache, wraps
+from itertools import groupby
+from types import MappingProxyType
+import atexit
+import hashlib
 import logging
-from typing import Optional, Dict, Any, List, Tuple
+import re
+import threading
+import time
+import weakref
+from uuid import uuid4
+from typing import Optional, Dict, Any, List, Tuple, Iterator
 from config.settings import DatabaseConfig
 
+# Los handlers se configuran una sola vez en config/logging_setup.py
+logger = logging.getLogger(__name__)
+
+
 # ============================================
-# CONFIGURACIÓN DE LOGGING
+# POOL DE CONEXIONES GLOBAL
 # ============================================
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/database.log'),
-        logging.StreamHandler()
-    ]
-)
-
-logger = logging.getLogger(__name__)
+# ThreadedConnectionPool protege getconn()/putconn() con un lock interno;
+# Streamlit atiende las sesiones desde varios hilos a la vez.
+_connection_pool: Optional[pool.ThreadedConnectionPool] = None
+_pool_lock = threading.Lock()
 
 
 # ============================================
-# POOL DE CONEXIONES GLOBAL
+# CACHÉ DE SENTENCIAS PREPARADAS
 # ============================================
 
-_connection_pool: Optional[pool.SimpleConnectionPool] = None
+# Máximo de consultas distintas cuya traducción a PREPARE se recuerda
+_MAX_PREPARED_QUERIES = 512
+
+# query -> nombre legible registrado con prepared_statement()
+_statement_names: Dict[str, str] = {}
+
+# conexión -> nombres de sentencias ya preparadas en esa sesión
+_prepared_by_connection: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+
+_PLACEHOLDER_RE = re.compile(r'%s|%%')
+
+# Único FeatureNotSupported que justifica volver a preparar la sentencia
+_STALE_PLAN_MESSAGE = 'cached plan must not change result type'
 
 
 def initialize_pool():
     """
     Inicializa el pool de conexiones a PostgreSQL.
     
-    Esta función debe llamarse una vez al inicio de la aplicación.
+    Esta función debe llamarse una vez al inicio de la aplicación
+    (app.py lo hace desde init_database, cacheado por proceso). El pool
+    es único por proceso: la creación está protegida por un lock, la
+    configuración se lee una sola vez y se cierra al salir (atexit).
     Crea un pool de conexiones reutilizables para mejorar el rendimiento.
+    La verificación de la conexión reutiliza la primera conexión que
+    abrió el constructor del pool (una sola consulta), en lugar de una
+    llamada aparte a test_connection().
     
     Raises:
         OperationalError: Si no se puede crear el pool de conexiones
@@ -63,27 +93,58 @@ def initialize_pool():
         logger.warning("El pool de conexiones ya está inicializado")
         return
     
+    with _pool_lock:
+        # Otro hilo pudo haberlo creado mientras se esperaba el lock
+        if _connection_pool is not None:
+            return
+        _create_pool()
+
+
+def _create_pool():
+    """
+    Crea y verifica el pool. Se llama con _pool_lock tomado.
+    
+    Raises:
+        OperationalError: Si no se puede crear el pool de conexiones
+    """
+    global _connection_pool
+    
     try:
         logger.info("Inicializando pool de conexiones a PostgreSQL...")
         
         pool_config = DatabaseConfig.get_pool_config()
         
-        _connection_pool = pool.SimpleConnectionPool(
-            minconn=1,
+        _connection_pool = pool.ThreadedConnectionPool(
+            minconn=pool_config['minconn'],
             maxconn=pool_config['maxconn'],
-            dsn=pool_config['dsn']
+            dsn=pool_config['dsn'],
+            # Se fija al abrir cada conexión: sin un SET por préstamo
+            application_name=pool_config['application_name']
         )
         
         logger.info(
             f"Pool de conexiones creado exitosamente "
-            f"(size={pool_config['maxconn']})"
+            f"(min={pool_config['minconn']}, max={pool_config['maxconn']})"
         )
         
-        # Probar la conexión
-        test_connection()
+        # Verificar la conexión con una de las ya abiertas por el pool
+        connection = _connection_pool.getconn()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT version(), current_database()")
+                version, db_name = cursor.fetchone()
+        finally:
+            _connection_pool.putconn(connection)
+        
+        logger.info(f"Conexión exitosa a PostgreSQL - Versión: {version[:50]}...")
+        logger.info(f"Base de datos: {db_name}")
+        
+        atexit.register(close_pool)
         
     except OperationalError as e:
         logger.error(f"Error al crear el pool de conexiones: {e}")
+        if _connection_pool is not None:
+            _connection_pool.closeall()
         _connection_pool = None
         raise
 
@@ -93,13 +154,16 @@ def get_connection():
     Obtiene una conexión del pool.
     
     Esta es la función principal que debe usarse para obtener conexiones
-    en todo el sistema. Utiliza el pool de conexiones si está disponible,
-    o crea una conexión directa como fallback.
+    en todo el sistema. Requiere que initialize_pool() se haya llamado
+    antes; no abre conexiones directas de forma silenciosa, para que un
+    pool ausente o agotado sea visible en lugar de dejar conexiones
+    huérfanas. Para una conexión fuera del pool usar get_direct_connection().
     
     Returns:
         psycopg2.extensions.connection: Conexión a la base de datos
         
     Raises:
+        RuntimeError: Si el pool no está inicializado
         OperationalError: Si no se puede obtener una conexión
         
     Example:
@@ -108,21 +172,17 @@ def get_connection():
         >>> cursor.execute("SELECT * FROM usuarios")
         >>> results = cursor.fetchall()
         >>> cursor.close()
-        >>> conn.close()
+        >>> _connection_pool.putconn(conn)
     """
-    global _connection_pool
+    if _connection_pool is None:
+        raise RuntimeError(
+            "El pool de conexiones no está inicializado. "
+            "Llama a initialize_pool() primero."
+        )
     
     try:
-        # Intentar obtener conexión del pool
-        if _connection_pool is not None:
-            connection = _connection_pool.getconn()
-            logger.debug("Conexión obtenida del pool")
-            return connection
-        
-        # Fallback: crear conexión directa si no hay pool
-        logger.warning("Pool no disponible, creando conexión directa")
-        config = DatabaseConfig.get_config_dict()
-        connection = psycopg2.connect(config['dsn'])
+        connection = _connection_pool.getconn()
+        logger.debug("Conexión obtenida del pool")
         return connection
         
     except OperationalError as e:
@@ -130,6 +190,45 @@ def get_connection():
         raise
 
 
+def get_direct_connection():
+    """
+    Abre una conexión directa a PostgreSQL, fuera del pool.
+    
+    Solo para usos explícitos (scripts de diagnóstico, migraciones).
+    Quien la pide es responsable de cerrarla con conn.close().
+    
+    Returns:
+        psycopg2.extensions.connection: Conexión a la base de datos
+        
+    Raises:
+        OperationalError: Si no se puede conectar
+    """
+    config = DatabaseConfig.get_config_dict()
+    try:
+        return psycopg2.connect(config['dsn'], application_name=config['application_name'])
+    except OperationalError as e:
+        logger.error(f"Error al abrir conexión directa: {e}")
+        raise
+
+
+def _release_connection(connection) -> None:
+    """
+    Devuelve la conexión al pool, o la cierra si el pool ya fue cerrado.
+    
+    close() es idempotente en psycopg2, así que no se verifica antes el
+    estado de la conexión (evita un viaje extra al servidor); un error
+    al cerrar una conexión ya caída se ignora.
+    """
+    if _connection_pool:
+        _connection_pool.putconn(connection)
+        return
+    
+    try:
+        connection.close()
+    except psycopg2.Error:
+        pass
+
+
 @contextmanager
 def get_db_connection():
     """
@@ -157,15 +256,12 @@ def get_db_connection():
         raise
     finally:
         if connection:
-            if _connection_pool:
-                _connection_pool.putconn(connection)
-            else:
-                connection.close()
+            _release_connection(connection)
             logger.debug("Conexión cerrada correctamente")
 
 
 @contextmanager
-def get_db_cursor(dictionary=True, buffered=True):
+def get_db_cursor(dictionary=True, buffered=True, real_dict=True, named=False):
     """
     Context manager que proporciona cursor y conexión juntos.
     
@@ -175,6 +271,15 @@ def get_db_cursor(dictionary=True, buffered=True):
     Args:
         dictionary (bool): Si True, los resultados se retornan como diccionarios
         buffered (bool): No aplica directamente en PostgreSQL, pero se mantiene para compatibilidad
+        real_dict (bool): Si True (por defecto) cada fila es un dict real
+            (RealDictCursor), necesario para mutar filas o construir
+            DataFrames por nombre de columna. Si False se usa DictCursor:
+            filas tipo lista que comparten un único índice de columnas,
+            con menos memoria por fila en resultados grandes.
+        named (bool): Si True cada fila es una namedtuple (NamedTupleCursor,
+            acceso por atributo y por posición); tiene prioridad sobre
+            dictionary. Es la opción más liviana para listados grandes
+            de solo lectura.
         
     Yields:
         tuple: (cursor, connection)
@@ -190,7 +295,11 @@ def get_db_cursor(dictionary=True, buffered=True):
     cursor = None
     try:
         connection = get_connection()
-        cursor_factory = RealDictCursor if dictionary else None
+        cursor_factory = None
+        if named:
+            cursor_factory = NamedTupleCursor
+        elif dictionary:
+            cursor_factory = RealDictCursor if real_dict else DictCursor
         cursor = connection.cursor(cursor_factory=cursor_factory)
         yield cursor, connection
     except OperationalError as e:
@@ -200,25 +309,228 @@ def get_db_cursor(dictionary=True, buffered=True):
         if cursor:
             cursor.close()
         if connection:
-            if _connection_pool:
-                _connection_pool.putconn(connection)
-            else:
-                connection.close()
+            _release_connection(connection)
+
+
+@lru_cache(maxsize=_MAX_PREPARED_QUERIES)
+def _encode_template(query: str, encoding: str) -> bytes:
+    """Codifica una consulta con la codificación de PostgreSQL indicada"""
+    return query.encode(psycopg2.extensions.encodings[encoding])
+
+
+def _encode_sql(cursor, query: str) -> bytes:
+    """
+    Retorna la consulta codificada según la conexión, cacheada por texto.
+    
+    psycopg2 acepta consultas en bytes; reutilizar la versión ya
+    codificada evita volver a codificar el mismo SQL en cada ejecución.
+    La caché es un LRU acotado a _MAX_PREPARED_QUERIES consultas.
+    
+    Args:
+        cursor: Cursor abierto sobre la conexión
+        query (str): Consulta SQL
+        
+    Returns:
+        bytes: Consulta codificada
+    """
+    return _encode_template(query, cursor.connection.encoding)
+
+
+@lru_cache(maxsize=_MAX_PREPARED_QUERIES)
+def _prepare_statement(query: str) -> Optional[Tuple[str, str, str]]:
+    """
+    Traduce una consulta con placeholders posicionales (%s) a una
+    sentencia PREPARE con parámetros $1..$n.
+    
+    El resultado se cachea por texto de consulta (LRU acotado a
+    _MAX_PREPARED_QUERIES). Las consultas con parámetros nombrados
+    (%(campo)s) no se preparan y retornan None.
+    
+    Args:
+        query (str): Consulta SQL con placeholders %s
+        
+    Returns:
+        tuple|None: (nombre, sentencia PREPARE, sentencia EXECUTE)
+    """
+    if '%(' in query:
+        return None
+    
+    counter = 0
+    
+    def _replace(match):
+        nonlocal counter
+        if match.group(0) == '%%':
+            return '%'
+        counter += 1
+        return f"${counter}"
+    
+    body = _PLACEHOLDER_RE.sub(_replace, query)
+    name = _statement_names.get(query) or f"stmt_{hashlib.md5(query.encode('utf-8')).hexdigest()[:16]}"
+    
+    execute_sql = f"EXECUTE {name}"
+    if counter:
+        execute_sql += f" ({', '.join(['%s'] * counter)})"
+    
+    return (name, f"PREPARE {name} AS {body}", execute_sql)
+
+
+def prepared_statement(name: str, query: str) -> str:
+    """
+    Registra un nombre legible para la sentencia preparada de una consulta.
+    
+    execute_query ya prepara todas las consultas con %s (una vez por
+    conexión); registrar la consulta solo cambia el nombre con el que
+    aparece en pg_prepared_statements, útil para las consultas de
+    búsqueda más frecuentes. Llamar al importar el módulo que la define.
+    
+    Args:
+        name (str): Identificador SQL de la sentencia (p. ej. 'compra_por_id')
+        query (str): Consulta SQL con placeholders %s
+        
+    Returns:
+        str: La misma consulta, para asignarla a una constante
+        
+    Example:
+        >>> _FIND_BY_ID_SQL = prepared_statement(
+        ...     'compra_por_id', "SELECT * FROM compras WHERE id = %s"
+        ... )
+        >>> execute_query(_FIND_BY_ID_SQL, (1,), fetch='one')
+    """
+    if not re.fullmatch(r'[a-z_][a-z0-9_]*', name):
+        raise ValueError(f"Nombre de sentencia inválido: {name}")
+    
+    if query not in _statement_names and len(_statement_names) >= _MAX_PREPARED_QUERIES:
+        # Descartar el registro más antiguo; su consulta vuelve al nombre por hash
+        _statement_names.pop(next(iter(_statement_names)))
+    _statement_names[query] = name
+    _prepare_statement.cache_clear()
+    return query
+
+
+def _execute_prepared(cursor, query: str, params: tuple = None) -> None:
+    """
+    Ejecuta una consulta de lectura usando una sentencia preparada.
+    
+    La sentencia se prepara una sola vez por conexión del pool; las
+    ejecuciones siguientes solo envían EXECUTE con los parámetros,
+    evitando que PostgreSQL vuelva a analizar y planificar el SQL.
+    
+    Si una migración cambió las columnas de la tabla (p. ej. un SELECT *
+    tras un ALTER TABLE ... ADD COLUMN), PostgreSQL rechaza el plan
+    guardado con "cached plan must not change result type"; solo en ese
+    caso la sentencia se descarta (DEALLOCATE), se vuelve a preparar y se
+    reintenta una vez; cualquier otro error se propaga. Solo se usa con
+    cursores de conexiones propias (execute_query, execute_query_df), por
+    lo que el rollback es seguro.
+    
+    Args:
+        cursor: Cursor abierto sobre la conexión
+        query (str): Consulta SQL con placeholders %s
+        params (tuple, optional): Parámetros de la consulta
+    """
+    statement = None
+    if DatabaseConfig.PREPARED_STATEMENTS and not isinstance(params, dict):
+        statement = _prepare_statement(query)
+    
+    if statement is None:
+        cursor.execute(_encode_sql(cursor, query), params or ())
+        return
+    
+    name, prepare_sql, execute_sql = statement
+    
+    with _prepared_lock:
+        prepared = _prepared_by_connection.setdefault(cursor.connection, set())
+    
+    if name not in prepared:
+        cursor.execute(prepare_sql)
+        prepared.add(name)
+        logger.debug(f"Sentencia preparada: {name}")
+    
+    try:
+        cursor.execute(_encode_sql(cursor, execute_sql), params or None)
+    except pg_errors.FeatureNotSupported as e:
+        if _STALE_PLAN_MESSAGE not in (e.diag.message_primary or ''):
+            raise
+        
+        # Plan obsoleto tras cambiar el esquema: volver a preparar
+        logger.warning(f"Sentencia {name} invalidada por cambio de esquema; se vuelve a preparar")
+        cursor.connection.rollback()
+        prepared.discard(name)
+        cursor.execute(f"DEALLOCATE {name}")
+        cursor.execute(prepare_sql)
+        prepared.add(name)
+        cursor.execute(_encode_sql(cursor, execute_sql), params or None)
+
+
+@contextmanager
+def get_write_cursor():
+    """
+    Context manager para operaciones de escritura (INSERT/UPDATE/DELETE).
+    
+    Proporciona un cursor simple de tuplas, sin la fábrica RealDictCursor
+    que solo tiene sentido al leer filas. Para sentencias con RETURNING
+    el resultado se lee por posición (cursor.fetchone()[0]).
+    
+    Yields:
+        tuple: (cursor, connection)
+        
+    Example:
+        >>> with get_write_cursor() as (cursor, conn):
+        ...     cursor.execute("UPDATE productos SET activo = FALSE WHERE id = %s", (5,))
+        ...     conn.commit()
+    """
+    with get_db_cursor(dictionary=False) as (cursor, connection):
+        yield cursor, connection
 
 
-def execute_query(query: str, params: tuple = None, fetch: str = 'all') -> Optional[Any]:
+@contextmanager
+def transaction():
+    """
+    Transacción de escritura compartida por varias llamadas a repositorios.
+    
+    Entrega un cursor de tuplas (como get_write_cursor) para pasarlo como
+    cursor=... a los métodos de repositorio: todas las escrituras usan la
+    misma conexión y se confirman con un único commit al salir del bloque,
+    o se revierten si ocurre una excepción.
+    
+    Yields:
+        cursor: Cursor de la transacción
+        
+    Example:
+        >>> with transaction() as cursor:
+        ...     producto_repo.update_stock(5, 2, 'restar', cursor=cursor)
+        ...     movimiento_repo.registrar_movimiento(datos, cursor=cursor)
+    """
+    with get_write_cursor() as (cursor, connection):
+        try:
+            yield cursor
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
+
+def execute_query(query: str, params: tuple = None, fetch: str = 'all',
+                  dictionary: bool = True, named: bool = False) -> Optional[Any]:
     """
     Ejecuta una consulta SELECT y retorna los resultados.
     
     Función de conveniencia para consultas simples de lectura.
+    Las consultas se ejecutan como sentencias preparadas por conexión
+    (ver DatabaseConfig.PREPARED_STATEMENTS).
     
     Args:
         query (str): Consulta SQL a ejecutar
         params (tuple, optional): Parámetros para la consulta
-        fetch (str): Tipo de fetch - 'all', 'one', 'many'
+        fetch (str): Tipo de fetch - 'all', 'one', 'many', 'stream'
+        dictionary (bool): Si False, las filas son tuplas (sin construir
+            un diccionario por fila; útil para agregados y conteos)
+        named (bool): Si True, las filas son namedtuples con los nombres
+            de columna (fila.total en lugar de fila['total'])
         
     Returns:
-        list|dict|None: Resultados de la consulta
+        list|dict|None|Iterator: Resultados de la consulta. Con
+        fetch='stream' retorna un iterador (ver stream_query).
         
     Example:
         >>> usuarios = execute_query("SELECT * FROM usuarios WHERE activo = %s", (True,))
@@ -228,9 +540,12 @@ def execute_query(query: str, params: tuple = None, fetch: str = 'all') -> Optio
         ...     fetch='one'
         ... )
     """
+    if fetch == 'stream':
+        return stream_query(query, params)
+    
     try:
-        with get_db_cursor() as (cursor, conn):
-            cursor.execute(query, params or ())
+        with get_db_cursor(dictionary=dictionary, named=named) as (cursor, conn):
+            _execute_prepared(cursor, query, params)
             
             if fetch == 'one':
                 result = cursor.fetchone()
@@ -239,7 +554,8 @@ def execute_query(query: str, params: tuple = None, fetch: str = 'all') -> Optio
             else:  # 'all'
                 result = cursor.fetchall()
             
-            logger.debug(f"Query ejecutado: {query[:100]}...")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Query ejecutado: {query[:100]}...")
             return result
             
     except OperationalError as e:
@@ -248,12 +564,134 @@ def execute_query(query: str, params: tuple = None, fetch: str = 'all') -> Optio
         raise
 
 
+def execute_query_df(query: str, params: tuple = None):
+    """
+    Ejecuta una consulta SELECT y retorna un DataFrame de pandas.
+    
+    Usa un cursor de tuplas y construye el DataFrame de una vez con los
+    nombres de cursor.description, sin un diccionario por fila.
+    
+    Args:
+        query (str): Consulta SQL a ejecutar
+        params (tuple, optional): Parámetros para la consulta
+        
+    Returns:
+        pandas.DataFrame: Resultados (vacío con columnas si no hay filas)
+    """
+    import pandas as pd
+    
+    try:
+        with get_db_cursor(dictionary=False) as (cursor, conn):
+            _execute_prepared(cursor, query, params)
+            columns = [column.name for column in cursor.description]
+            return pd.DataFrame(cursor.fetchall(), columns=columns)
+            
+    except OperationalError as e:
+        logger.error(f"Error ejecutando query: {e}")
+        logger.error(f"Query: {query}")
+        raise
+
+
+def stream_query(query: str, params: tuple = None, itersize: int = 2000,
+                 real_dict: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Ejecuta una consulta SELECT con un cursor del lado del servidor.
+    
+    Las filas se traen en bloques de `itersize`, por lo que la memoria
+    usada es O(itersize) en lugar de O(filas). La conexión permanece
+    tomada del pool mientras se consume el iterador.
+    
+    Por defecto las filas son DictRow (acceso por nombre y por posición,
+    con un índice de columnas compartido); real_dict=True retorna dicts.
+    
+    Args:
+        query (str): Consulta SQL a ejecutar
+        params (tuple, optional): Parámetros para la consulta
+        itersize (int): Filas por cada viaje al servidor
+        real_dict (bool): Si True usa RealDictCursor
+        
+    Yields:
+        DictRow|dict: Cada fila del resultado
+        
+    Example:
+        >>> for movimiento in stream_query("SELECT * FROM movimientos_inventario"):
+        ...     procesar(movimiento)
+    """
+    with get_db_connection() as conn:
+        cursor_factory = RealDictCursor if real_dict else DictCursor
+        cursor = conn.cursor(name=f"ss_{uuid4().hex}", cursor_factory=cursor_factory)
+        cursor.itersize = itersize
+        try:
+            cursor.execute(query, params or ())
+            yield from cursor
+        finally:
+            cursor.close()
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Query en streaming: {query[:100]}...")
+
+
+def _freeze(value: Any) -> Any:
+    """
+    Convierte resultados de consultas en estructuras inmutables.
+    
+    Las listas pasan a tuplas y los diccionarios (incluidas las filas
+    RealDictRow) a MappingProxyType, de modo que un resultado cacheado
+    no pueda ser modificado por quien lo consume.
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def cached_query(ttl: int = 60, maxsize: int = 128):
+    """
+    Decorador que cachea en memoria funciones de solo lectura.
+    
+    Usa functools.lru_cache con la clave (argumentos, ventana de tiempo):
+    al cambiar la ventana de `ttl` segundos la entrada deja de coincidir
+    y se vuelve a consultar la base de datos. Los resultados se retornan
+    congelados (tuplas / MappingProxyType) para que sean seguros de
+    compartir entre sesiones.
+    
+    Args:
+        ttl (int): Segundos de validez de cada resultado
+        maxsize (int): Máximo de entradas en la caché
+        
+    Example:
+        >>> @cached_query(ttl=60)
+        ... def categorias_activas():
+        ...     return execute_query("SELECT * FROM categorias WHERE activo = TRUE")
+        >>> categorias_activas.cache_clear()  # invalidar tras una escritura
+    """
+    def decorator(func):
+        @lru_cache(maxsize=maxsize)
+        def _cached(_ventana, *args, **kwargs):
+            return _freeze(func(*args, **kwargs))
+        
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return _cached(int(time.monotonic() // ttl), *args, **kwargs)
+        
+        wrapper.cache_clear = _cached.cache_clear
+        return wrapper
+    
+    return decorator
+
+
+# Variante cacheada de execute_query para lecturas repetidas (dashboard)
+cached_execute_query = cached_query(ttl=60)(execute_query)
+
+
 def execute_transaction(operations: List[Tuple[str, tuple]]) -> bool:
     """
     Ejecuta múltiples operaciones en una transacción.
     
     Garantiza atomicidad: todas las operaciones se ejecutan o ninguna.
     Útil para operaciones complejas como ventas con múltiples detalles.
+    Las operaciones consecutivas con la misma consulta se agrupan con
+    execute_batch para enviarlas en menos viajes al servidor.
     
     Args:
         operations (list): Lista de tuplas (query, params)
@@ -268,6 +706,9 @@ def execute_transaction(operations: List[Tuple[str, tuple]]) -> bool:
         ...     ("UPDATE productos SET stock_actual = stock_actual - %s WHERE id = %s", (cantidad, producto_id))
         ... ]
         >>> success = execute_transaction(operations)
+        
+    Para insertar muchas filas en una misma tabla (p. ej. los detalles
+    de una venta) es preferible execute_bulk_insert.
     """
     connection = None
     cursor = None
@@ -279,10 +720,18 @@ def execute_transaction(operations: List[Tuple[str, tuple]]) -> bool:
         # Iniciar transacción (autocommit=False por defecto en psycopg2)
         logger.debug("Transacción iniciada")
         
-        # Ejecutar todas las operaciones
-        for query, params in operations:
-            cursor.execute(query, params or ())
-            logger.debug(f"Operación ejecutada: {query[:80]}...")
+        # Ejecutar las operaciones agrupando consultas idénticas consecutivas
+        for query, grupo in groupby(operations, key=lambda op: op[0]):
+            params_list = [params or () for _, params in grupo]
+            
+            sql = _encode_sql(cursor, query)
+            if len(params_list) == 1:
+                cursor.execute(sql, params_list[0])
+            else:
+                execute_batch(cursor, sql, params_list, page_size=100)
+            
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Operación ejecutada ({len(params_list)}x): {query[:80]}...")
         
         # Confirmar transacción
         connection.commit()
@@ -300,10 +749,67 @@ def execute_transaction(operations: List[Tuple[str, tuple]]) -> bool:
         if cursor:
             cursor.close()
         if connection:
-            if _connection_pool:
-                _connection_pool.putconn(connection)
-            else:
-                connection.close()
+            _release_connection(connection)
+
+
+def execute_bulk_insert(table: str, columns: List[str], rows: List[tuple],
+                        returning: str = None, page_size: int = 500,
+                        cursor=None) -> List[Any]:
+    """
+    Inserta muchas filas en una tabla con un INSERT multi-fila.
+    
+    Usa psycopg2.extras.execute_values, que envía las filas en bloques
+    de `page_size`: N filas cuestan ceil(N / page_size) viajes al
+    servidor en lugar de N.
+    
+    Args:
+        table (str): Nombre de la tabla
+        columns (list): Columnas a insertar, en el orden de cada fila
+        rows (list): Lista de tuplas con los valores
+        returning (str, optional): Columna(s) a retornar (ej: 'id')
+        page_size (int): Filas por sentencia INSERT
+        cursor (optional): Cursor de una transacción abierta. Si se
+            indica, no se hace commit; si no, se abre una conexión
+            propia y se confirma al terminar.
+        
+    Returns:
+        list: Valores de la primera columna de RETURNING (vacía si no se pidió)
+        
+    Example:
+        >>> ids = execute_bulk_insert(
+        ...     'detalle_ventas',
+        ...     ['venta_id', 'producto_id', 'cantidad', 'precio_unitario', 'subtotal'],
+        ...     [(10, 1, 2, 45.0, 90.0), (10, 3, 1, 150.0, 150.0)],
+        ...     returning='id'
+        ... )
+    """
+    if not rows:
+        return []
+    
+    query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s"
+    if returning:
+        query += f" RETURNING {returning}"
+    
+    # Plantilla de fila fija: execute_values no la reconstruye por página
+    template = f"({', '.join(['%s'] * len(columns))})"
+    
+    if cursor is not None:
+        result = execute_values(cursor, query, rows, template=template,
+                                page_size=page_size, fetch=bool(returning))
+        return [r[0] for r in result] if returning else []
+    
+    with get_write_cursor() as (cursor, conn):
+        try:
+            result = execute_values(cursor, query, rows, template=template,
+                                    page_size=page_size, fetch=bool(returning))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Inserción masiva en {table}: {len(rows)} filas")
+        return [r[0] for r in result] if returning else []
 
 
 def test_connection() -> bool:
@@ -321,14 +827,12 @@ def test_connection() -> bool:
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT version()")
-            version = cursor.fetchone()
-            cursor.execute("SELECT current_database()")
-            db_name = cursor.fetchone()
+            cursor.execute("SELECT version(), current_database()")
+            version, db_name = cursor.fetchone()
             cursor.close()
             
-            logger.info(f"Conexión exitosa a PostgreSQL - Versión: {version[0][:50]}...")
-            logger.info(f"Base de datos: {db_name[0]}")
+            logger.info(f"Conexión exitosa a PostgreSQL - Versión: {version[:50]}...")
+            logger.info(f"Base de datos: {db_name}")
             return True
             
     except OperationalError as e:
@@ -344,11 +848,12 @@ def close_pool():
     """
     global _connection_pool
     
-    if _connection_pool:
-        logger.info("Cerrando pool de conexiones...")
-        _connection_pool.closeall()
-        _connection_pool = None
-        logger.info("Pool de conexiones cerrado")
+    with _pool_lock:
+        if _connection_pool:
+            logger.info("Cerrando pool de conexiones...")
+            _connection_pool.closeall()
+            _connection_pool = None
+            logger.info("Pool de conexiones cerrado")
 
 
 def get_pool_status() -> Dict[str, Any]:
@@ -368,6 +873,7 @@ def get_pool_status() -> Dict[str, Any]:
         return {
             'initialized': False,
             'pool_name': None,
+            'pool_min': 0,
             'pool_size': 0
         }
     
@@ -375,17 +881,7 @@ def get_pool_status() -> Dict[str, Any]:
     return {
         'initialized': True,
         'pool_name': DatabaseConfig.POOL_NAME,
+        'pool_min': config['minconn'],
         'pool_size': config['maxconn']
     }
 
-
-# ============================================
-# INICIALIZACIÓN AUTOMÁTICA
-# ============================================
-
-# Inicializar el pool al importar el módulo
-try:
-    initialize_pool()
-except OperationalError as e:
-    logger.error(f"No se pudo inicializar el pool automáticamente: {e}")
-    logger.warning("Las conexiones se crearán bajo demanda")
\ No newline at end of file
@@ -0,0 +1,57 @@
+"""
+============================================
+CONFIGURACIÓN DE LOGGING
+============================================
+Configura una sola vez los handlers de logging del sistema
+(archivo logs/database.log + consola).
+
+Autor: Sistema de Comercialización
+Fecha: 2026
+============================================
+"""
+
+import logging
+import threading
+from config.settings import AppConfig
+
+_configured = False
+_lock = threading.Lock()
+
+
+def configure_logging(level: int = None):
+    """
+    Configura el logger raíz con handlers de archivo y consola.
+    
+    Es idempotente: las llamadas posteriores no agregan handlers
+    duplicados, por lo que puede invocarse en cada rerun de Streamlit.
+    
+    Args:
+        level (int, optional): Nivel de logging. Por defecto INFO en modo
+            DEBUG y WARNING en producción.
+    """
+    global _configured
+    
+    if _configured:
+        return
+    
+    with _lock:
+        if _configured:
+            return
+        
+        if level is None:
+            level = logging.INFO if AppConfig.DEBUG else logging.WARNING
+        
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        
+        file_handler = logging.FileHandler(AppConfig.LOGS_DIR / 'database.log')
+        file_handler.setFormatter(formatter)
+        
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(formatter)
+        
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(file_handler)
+        root.addHandler(stream_handler)
+        
+        _configured = True
@@ -10,9 +10,11 @@ Fecha: 2026
 ============================================
 """
 
+import enum
 import os
+import sys
+from functools import lru_cache
 from pathlib import Path
-from dotenv import load_dotenv
 
 # ============================================
 # CARGAR VARIABLES DE ENTORNO
@@ -21,9 +23,26 @@ from dotenv import load_dotenv
 # Obtener la ruta del directorio raíz del proyecto
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-# Cargar el archivo .env
+# Archivo .env
 ENV_FILE = BASE_DIR / '.env'
-load_dotenv(ENV_FILE)
+
+
+def _load_env():
+    """
+    Carga las variables del .env sin sobrescribir las ya definidas.
+    
+    Las variables exportadas en el entorno del proceso (p. ej.
+    DATABASE_URL en producción) tienen prioridad; el resto de claves del
+    .env (APP_SECRET_KEY, DB_POOL_*, ...) se completan igualmente.
+    """
+    if not ENV_FILE.exists():
+        return
+    
+    from dotenv import load_dotenv
+    load_dotenv(ENV_FILE, override=False)
+
+
+_load_env()
 
 # ============================================
 # CONFIGURACIÓN DE BASE DE DATOS - POSTGRESQL
@@ -35,22 +54,40 @@ class DatabaseConfig:
     """
     
     @staticmethod
+    @lru_cache(maxsize=1)
     def get_database_url():
         """
         Obtiene la URL de conexión según el entorno.
         Prioriza Streamlit secrets, luego .env
+        
+        El resultado se resuelve una sola vez por proceso; usar
+        DatabaseConfig.get_database_url.cache_clear() para releerlo.
         """
+        if 'streamlit' not in sys.modules:
+            # Fuera de Streamlit (scripts de prueba): no importarlo
+            return os.getenv("DATABASE_URL")
+        
+        import streamlit as st
+        
         try:
-            import streamlit as st
             # En Streamlit Cloud
             return st.secrets["DATABASE_URL"]
-        except:
-            # En local
+        except Exception:
+            # En local (sin secrets.toml o sin la clave)
             return os.getenv("DATABASE_URL")
     
     # Configuración de Pool de Conexiones
     POOL_NAME = os.getenv('DB_POOL_NAME', 'postgres_pool')
-    POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+    POOL_MIN = int(os.getenv('DB_POOL_MIN', 5))
+    POOL_SIZE = int(os.getenv('DB_POOL_MAX', os.getenv('DB_POOL_SIZE', 20)))
+    
+    # Nombre con el que las conexiones aparecen en pg_stat_activity
+    APPLICATION_NAME = os.getenv('DB_APPLICATION_NAME', 'sistema_comercial')
+    
+    # Sentencias preparadas en el servidor (PREPARE/EXECUTE) para lecturas.
+    # Desactivar si se conecta a través de PgBouncer en modo transacción
+    # (p. ej. el endpoint "-pooler" de Neon).
+    PREPARED_STATEMENTS = os.getenv('DB_PREPARED_STATEMENTS', 'True').lower() == 'true'
     
     @classmethod
     def get_config_dict(cls):
@@ -71,7 +108,8 @@ class DatabaseConfig:
             )
         
         return {
-            'dsn': database_url
+            'dsn': database_url,
+            'application_name': cls.APPLICATION_NAME
         }
     
     @classmethod
@@ -92,7 +130,9 @@ class DatabaseConfig:
         
         return {
             'dsn': database_url,
-            'maxconn': cls.POOL_SIZE
+            'minconn': min(cls.POOL_MIN, cls.POOL_SIZE),
+            'maxconn': cls.POOL_SIZE,
+            'application_name': cls.APPLICATION_NAME
         }
 
 
@@ -114,65 +154,170 @@ class AppConfig:
     LOGS_DIR = BASE_DIR / 'logs'
     UPLOADS_DIR = BASE_DIR / 'uploads'
     
+    _dirs_ready = False
+    
     @classmethod
     def create_directories(cls):
         """
-        Crea los directorios necesarios si no existen
+        Crea los directorios necesarios si no existen.
+        
+        Usa mkdir con exist_ok, sin comprobar antes si existen; después
+        de la primera ejecución exitosa no hace nada.
         """
-        cls.REPORTS_DIR.mkdir(exist_ok=True)
-        cls.LOGS_DIR.mkdir(exist_ok=True)
-        cls.UPLOADS_DIR.mkdir(exist_ok=True)
+        if cls._dirs_ready:
+            return
+        
+        for directory in (cls.REPORTS_DIR, cls.LOGS_DIR, cls.UPLOADS_DIR):
+            directory.mkdir(parents=True, exist_ok=True)
+        
+        cls._dirs_ready = True
 
 
 # ============================================
 # CONSTANTES DEL SISTEMA
 # ============================================
 
+class _StrEnum(str, enum.Enum):
+    """Enum de cadenas: cada miembro es igual a su valor en la BD"""
+    
+    def __new__(cls, value):
+        member = str.__new__(cls, sys.intern(value))
+        member._value_ = sys.intern(value)
+        return member
+    
+    def __str__(self):
+        return self.value
+
+
+class CompraEstado(_StrEnum):
+    """Estados de compras"""
+    PENDIENTE = 'pendiente'
+    RECIBIDA = 'recibida'
+    CANCELADA = 'cancelada'
+
+
+class VentaEstado(_StrEnum):
+    """Estados de ventas"""
+    COMPLETADA = 'completada'
+    ANULADA = 'anulada'
+
+
+class TipoMovimiento(_StrEnum):
+    """Tipos de movimiento de inventario"""
+    ENTRADA = 'entrada'
+    SALIDA = 'salida'
+    AJUSTE = 'ajuste'
+
+
+class RolUsuario(_StrEnum):
+    """Roles de usuario"""
+    ADMIN = 'admin'
+    VENDEDOR = 'vendedor'
+    ALMACENERO = 'almacenero'
+
+
+class TipoComprobante(_StrEnum):
+    """Tipos de comprobante"""
+    BOLETA = 'boleta'
+    FACTURA = 'factura'
+    TICKET = 'ticket'
+
+
+class MetodoPago(_StrEnum):
+    """Métodos de pago"""
+    EFECTIVO = 'efectivo'
+    TARJETA = 'tarjeta'
+    TRANSFERENCIA = 'transferencia'
+
+
+# Conjuntos de valores válidos por categoría (membresía O(1))
+VALID_COMPRA_ESTADOS = frozenset(e.value for e in CompraEstado)
+VALID_VENTA_ESTADOS = frozenset(e.value for e in VentaEstado)
+VALID_TIPOS_MOVIMIENTO = frozenset(e.value for e in TipoMovimiento)
+VALID_ROLES = frozenset(e.value for e in RolUsuario)
+VALID_TIPOS_COMPROBANTE = frozenset(e.value for e in TipoComprobante)
+VALID_METODOS_PAGO = frozenset(e.value for e in MetodoPago)
+
+
 class Constants:
     """
-    Constantes utilizadas en todo el sistema
+    Constantes utilizadas en todo el sistema.
+    
+    Alias de los enums anteriores, conservados por compatibilidad.
     """
     # Estados de compras
-    COMPRA_ESTADO_PENDIENTE = 'pendiente'
-    COMPRA_ESTADO_RECIBIDA = 'recibida'
-    COMPRA_ESTADO_CANCELADA = 'cancelada'
+    COMPRA_ESTADO_PENDIENTE = CompraEstado.PENDIENTE
+    COMPRA_ESTADO_RECIBIDA = CompraEstado.RECIBIDA
+    COMPRA_ESTADO_CANCELADA = CompraEstado.CANCELADA
     
     # Estados de ventas
-    VENTA_ESTADO_COMPLETADA = 'completada'
-    VENTA_ESTADO_ANULADA = 'anulada'
+    VENTA_ESTADO_COMPLETADA = VentaEstado.COMPLETADA
+    VENTA_ESTADO_ANULADA = VentaEstado.ANULADA
     
     # Tipos de movimiento de inventario
-    MOVIMIENTO_ENTRADA = 'entrada'
-    MOVIMIENTO_SALIDA = 'salida'
-    MOVIMIENTO_AJUSTE = 'ajuste'
+    MOVIMIENTO_ENTRADA = TipoMovimiento.ENTRADA
+    MOVIMIENTO_SALIDA = TipoMovimiento.SALIDA
+    MOVIMIENTO_AJUSTE = TipoMovimiento.AJUSTE
     
     # Roles de usuario
-    ROL_ADMIN = 'admin'
-    ROL_VENDEDOR = 'vendedor'
-    ROL_ALMACENERO = 'almacenero'
+    ROL_ADMIN = RolUsuario.ADMIN
+    ROL_VENDEDOR = RolUsuario.VENDEDOR
+    ROL_ALMACENERO = RolUsuario.ALMACENERO
     
     # Tipos de comprobante
-    COMPROBANTE_BOLETA = 'boleta'
-    COMPROBANTE_FACTURA = 'factura'
-    COMPROBANTE_TICKET = 'ticket'
+    COMPROBANTE_BOLETA = TipoComprobante.BOLETA
+    COMPROBANTE_FACTURA = TipoComprobante.FACTURA
+    COMPROBANTE_TICKET = TipoComprobante.TICKET
     
     # Métodos de pago
-    PAGO_EFECTIVO = 'efectivo'
-    PAGO_TARJETA = 'tarjeta'
-    PAGO_TRANSFERENCIA = 'transferencia'
+    PAGO_EFECTIVO = MetodoPago.EFECTIVO
+    PAGO_TARJETA = MetodoPago.TARJETA
+    PAGO_TRANSFERENCIA = MetodoPago.TRANSFERENCIA
 
 
 # ============================================
 # VALIDACIÓN DE CONFIGURACIÓN
 # ============================================
 
+_validated = False
+
+
 def validate_config():
     """
-    Valida que las configuraciones críticas estén presentes
+    Valida todas las invariantes de configuración.
+    
+    No se ejecuta al importar: la corre tools/validate_config.py desde
+    pre-commit. En tiempo de ejecución solo se usa _fast_validate().
+    El caso válido se resuelve con una sola expresión y se memoriza;
+    el detalle de errores solo se arma si algo falla.
     
     Raises:
         ValueError: Si falta alguna configuración crítica
     """
+    global _validated
+    
+    if _validated:
+        return
+    
+    ok = (
+        DatabaseConfig.get_database_url()
+        and (AppConfig.DEBUG or AppConfig.SECRET_KEY != 'change-me-in-production')
+        and 0 <= DatabaseConfig.POOL_MIN <= DatabaseConfig.POOL_SIZE
+        and DatabaseConfig.POOL_SIZE >= 1
+    )
+    if not ok:
+        _raise_config_errors()
+    
+    _validated = True
+
+
+def _raise_config_errors():
+    """
+    Arma el reporte detallado de errores de configuración.
+    
+    Raises:
+        ValueError: Siempre, con la lista de problemas encontrados
+    """
     errors = []
     
     # Verificar DATABASE_URL
@@ -186,11 +331,35 @@ def validate_config():
     if AppConfig.SECRET_KEY == 'change-me-in-production' and not AppConfig.DEBUG:
         errors.append("APP_SECRET_KEY debe cambiarse en producción")
     
-    if errors:
-        raise ValueError(f"Errores de configuración:\n" + "\n".join(f"- {e}" for e in errors))
+    # Verificar tamaños del pool
+    if DatabaseConfig.POOL_MIN < 0:
+        errors.append("DB_POOL_MIN no puede ser negativo")
+    if DatabaseConfig.POOL_SIZE < 1:
+        errors.append("DB_POOL_MAX debe ser al menos 1")
+    if DatabaseConfig.POOL_MIN > DatabaseConfig.POOL_SIZE:
+        errors.append("DB_POOL_MIN no puede ser mayor que DB_POOL_MAX")
+    
+    raise ValueError(f"Errores de configuración:\n" + "\n".join(f"- {e}" for e in errors))
+
+
+def _fast_validate():
+    """
+    Verificación mínima al importar: solo que exista DATABASE_URL.
+    
+    Raises:
+        ValueError: Si DATABASE_URL no está configurada
+    """
+    if not DatabaseConfig.get_database_url():
+        raise ValueError(
+            "Errores de configuración:\n"
+            "- DATABASE_URL no está configurado en .env o Streamlit secrets"
+        )
 
 
-# Validar configuración al importar
-if __name__ != '__main__':
-    validate_config()
-    AppConfig.create_directories()
\ No newline at end of file
+# Validar configuración al importar (una sola vez, aunque el módulo se
+# recargue con importlib.reload, que conserva los globales del módulo)
+if __name__ != '__main__' and not getattr(sys.modules[__name__], '_INITIALIZED', False):
+    if os.environ.get('SKIP_CONFIG_VALIDATION') != '1':
+        _fast_validate()
+    AppConfig.create_directories()
+    _INITIALIZED = True
\ No newline at end of file
@@ -9,12 +9,50 @@ de lógica de negocio de forma clara y consistente.
 
 
 class BusinessException(Exception):
-    """Excepción base para errores de lógica de negocio"""
+    """
+    Excepción base para errores de lógica de negocio.
     
-    def __init__(self, message: str, details: dict = None):
-        self.message = message
+    Las subclases definen _TEMPLATE y solo guardan los datos en details;
+    el mensaje se formatea al leer .message o str(), no al crear la
+    excepción (muchas se capturan sin mostrarse nunca).
+    """
+    
+    __slots__ = ('_message', '_args', 'details')
+    
+    _TEMPLATE = ""
+    
+    def __init__(self, message: str = None, details: dict = None):
+        self._message = message
+        self._args = None
         self.details = details or {}
-        super().__init__(self.message)
+        super().__init__(message)
+    
+    @property
+    def args(self) -> tuple:
+        """Como Exception.args, con el mensaje ya formateado"""
+        if self._args is not None:
+            return self._args
+        return (self.message,)
+    
+    @args.setter
+    def args(self, value):
+        # Igual que Exception.args: asignable y siempre una tupla
+        self._args = tuple(value)
+    
+    def __repr__(self):
+        return f"{type(self).__name__}({self.message!r})"
+    
+    def __reduce__(self):
+        # Las subclases no aceptan (message,) en __init__: se reconstruyen
+        # sin llamarlo, con el mensaje y los detalles originales
+        return (_rebuild_exception, (type(self), self._message, self.details, self._args))
+    
+    @property
+    def message(self) -> str:
+        """Mensaje legible, formateado bajo demanda desde _TEMPLATE"""
+        if self._message is None:
+            return self._TEMPLATE.format(**self.details)
+        return self._message
     
     def __str__(self):
         if self.details:
@@ -22,82 +60,114 @@ class BusinessException(Exception):
         return self.message
 
 
+def _rebuild_exception(cls, message, details, args=None):
+    """Reconstruye una BusinessException al deserializarla (pickle)"""
+    exc = cls.__new__(cls)
+    BusinessException.__init__(exc, message, details)
+    exc._args = args
+    return exc
+
+
 class StockInsuficienteException(BusinessException):
     """Se lanza cuando no hay suficiente stock para una operación"""
     
+    __slots__ = ()
+    
+    _TEMPLATE = "Stock insuficiente para '{producto}'"
+    
     def __init__(self, producto_nombre: str, stock_disponible: int, cantidad_solicitada: int):
-        message = f"Stock insuficiente para '{producto_nombre}'"
         details = {
             'producto': producto_nombre,
             'stock_disponible': stock_disponible,
             'cantidad_solicitada': cantidad_solicitada,
             'faltante': cantidad_solicitada - stock_disponible
         }
-        super().__init__(message, details)
+        super().__init__(details=details)
 
 
 class ProductoNoEncontradoException(BusinessException):
     """Se lanza cuando no se encuentra un producto"""
     
+    __slots__ = ()
+    
+    _TEMPLATE = "Producto no encontrado ({tipo}: {identificador})"
+    
     def __init__(self, identificador: str, tipo: str = "ID"):
-        message = f"Producto no encontrado ({tipo}: {identificador})"
         details = {'identificador': identificador, 'tipo': tipo}
-        super().__init__(message, details)
+        super().__init__(details=details)
 
 
 class ClienteNoEncontradoException(BusinessException):
     """Se lanza cuando no se encuentra un cliente"""
     
+    __slots__ = ()
+    
+    _TEMPLATE = "Cliente no encontrado (ID/Documento: {identificador})"
+    
     def __init__(self, identificador: str):
-        message = f"Cliente no encontrado (ID/Documento: {identificador})"
         details = {'identificador': identificador}
-        super().__init__(message, details)
+        super().__init__(details=details)
 
 
 class ProveedorNoEncontradoException(BusinessException):
     """Se lanza cuando no se encuentra un proveedor"""
     
+    __slots__ = ()
+    
+    _TEMPLATE = "Proveedor no encontrado (ID/RUC: {identificador})"
+    
     def __init__(self, identificador: str):
-        message = f"Proveedor no encontrado (ID/RUC: {identificador})"
         details = {'identificador': identificador}
-        super().__init__(message, details)
+        super().__init__(details=details)
 
 
 class CompraNoEncontradaException(BusinessException):
     """Se lanza cuando no se encuentra una compra"""
     
+    __slots__ = ()
+    
+    _TEMPLATE = "Compra no encontrada (ID/Número: {identificador})"
+    
     def __init__(self, identificador: str):
-        message = f"Compra no encontrada (ID/Número: {identificador})"
         details = {'identificador': identificador}
-        super().__init__(message, details)
+        super().__init__(details=details)
 
 
 class VentaNoEncontradaException(BusinessException):
     """Se lanza cuando no se encuentra una venta"""
     
+    __slots__ = ()
+    
+    _TEMPLATE = "Venta no encontrada (ID/Número: {identificador})"
+    
     def __init__(self, identificador: str):
-        message = f"Venta no encontrada (ID/Número: {identificador})"
         details = {'identificador': identificador}
-        super().__init__(message, details)
+        super().__init__(details=details)
 
 
 class EstadoInvalidoException(BusinessException):
     """Se lanza cuando se intenta una operación con un estado inválido"""
     
+    __slots__ = ()
+    
+    _TEMPLATE = "No se puede realizar '{operacion}' en {entidad} con estado '{estado_actual}'"
+    
     def __init__(self, entidad: str, estado_actual: str, operacion: str):
-        message = f"No se puede realizar '{operacion}' en {entidad} con estado '{estado_actual}'"
         details = {
             'entidad': entidad,
             'estado_actual': estado_actual,
             'operacion': operacion
         }
-        super().__init__(message, details)
+        super().__init__(details=details)
 
 
 class DatosInvalidosException(BusinessException):
     """Se lanza cuando los datos proporcionados son inválidos"""
     
+    __slots__ = ()
+    
+    _TEMPLATE = "Datos inválidos en campo '{campo}': {razon}"
+    
     def __init__(self, campo: str, razon: str):
-        message = f"Datos inválidos en campo '{campo}': {razon}"
         details = {'campo': campo, 'razon': razon}
-        super().__init__(message, details)
\ No newline at end of file
+        super().__init__(details=details)
\ No newline at end of file
@@ -8,56 +8,371 @@ Proporciona operaciones CRUD genéricas.
 """
 
 import logging
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache, wraps
 from typing import Optional, List, Dict, Any, Tuple
-from config.database import get_db_cursor, execute_query, execute_transaction
+from config.database import (
+    get_write_cursor,
+    execute_query,
+    execute_query_df,
+    execute_transaction,
+    execute_bulk_insert
+)
 
 logger = logging.getLogger(__name__)
 
 
+def log_errors(log: logging.Logger):
+    """
+    Decorador que registra el error de un método de repositorio y lo relanza.
+    
+    Reemplaza el bloque try/except/logger.error/raise repetido en cada
+    método; el mensaje incluye la tabla cuando el método pertenece a un
+    repositorio.
+    
+    Args:
+        log (logging.Logger): Logger del módulo que define el método
+        
+    Example:
+        >>> @log_errors(logger)
+        ... def get_all_active(self): ...
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                table = getattr(args[0], 'table_name', None) if args else None
+                if table:
+                    log.error("Error en %s (%s): %s", fn.__qualname__, table, e)
+                else:
+                    log.error("Error en %s: %s", fn.__qualname__, e)
+                raise
+        return wrapper
+    return decorator
+
+
+# ============================================
+# CACHÉ POR PETICIÓN
+# ============================================
+
+# None fuera de request_scope(): las búsquedas van siempre a la base
+_request_cache: ContextVar[Optional[Dict[tuple, Any]]] = ContextVar(
+    'request_cache', default=None
+)
+
+
+@contextmanager
+def request_scope():
+    """
+    Abre una caché de lecturas que vive solo durante una petición.
+    
+    Dentro del bloque, los métodos marcados con @request_cached devuelven
+    el resultado ya leído en vez de repetir la consulta. Se puede usar
+    también como decorador.
+    
+    Example:
+        >>> with request_scope():
+        ...     get_page(page).render()
+    """
+    token = _request_cache.set({})
+    try:
+        yield
+    finally:
+        _request_cache.reset(token)
+
+
+def request_cached(kind: str):
+    """
+    Decorador que memoiza una búsqueda de un argumento dentro de request_scope().
+    
+    La clave es (clase, kind, argumento); se guarda y se devuelve una
+    copia del dict para que el llamador pueda modificarlo.
+    
+    Args:
+        kind (str): Nombre de la búsqueda (p. ej. 'by_id')
+        
+    Example:
+        >>> @request_cached('by_id')
+        ... def find_by_id(self, compra_id): ...
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(self, value):
+            cache = _request_cache.get()
+            if cache is None:
+                return fn(self, value)
+            key = (type(self), kind, value)
+            if key not in cache:
+                cache[key] = fn(self, value)
+            row = cache[key]
+            return dict(row) if row is not None else None
+        return wrapper
+    return decorator
+
+
+def load_many(repo: Any, kind: str, keys, fetch_many) -> Dict[Any, Dict[str, Any]]:
+    """
+    Carga varias búsquedas de una vez, compartiendo la caché por petición.
+    
+    Las claves ya leídas en la petición se toman de la caché; las demás se
+    piden juntas a fetch_many (un solo viaje al servidor) y quedan en la
+    caché, de modo que un find_by_id posterior marcado con
+    @request_cached(kind) no vuelve a consultar.
+    
+    Args:
+        repo: Repositorio dueño de las búsquedas
+        kind (str): Nombre de la búsqueda (el mismo de @request_cached)
+        keys (Iterable): Claves a cargar
+        fetch_many (Callable): Recibe la lista de claves faltantes y
+            retorna {clave: fila}
+        
+    Returns:
+        Dict: {clave: fila} con las claves encontradas
+    """
+    cache = _request_cache.get()
+    owner = type(repo)
+    keys = list(dict.fromkeys(keys))
+    
+    if cache is None:
+        missing = keys
+    else:
+        missing = [k for k in keys if (owner, kind, k) not in cache]
+    
+    fetched = fetch_many(missing) if missing else {}
+    if cache is None:
+        return fetched
+    
+    for key in missing:
+        cache[(owner, kind, key)] = fetched.get(key)
+    
+    result = {}
+    for key in keys:
+        row = cache[(owner, kind, key)]
+        if row is not None:
+            result[key] = dict(row)
+    return result
+
+
+def escape_like(term: str) -> str:
+    """
+    Escapa los comodines de LIKE/ILIKE en un texto ingresado por el usuario.
+    
+    Usar con ESCAPE '\\' en la consulta: así "50%" busca el texto "50%"
+    y no cualquier cosa que contenga "50".
+    
+    Args:
+        term (str): Texto a buscar
+        
+    Returns:
+        str: Texto con \\, % y _ escapados
+        
+    Example:
+        >>> f"%{escape_like('50%_off')}%"
+        '%50\\%\\_off%'
+    """
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+@contextmanager
+def write_scope(cursor=None):
+    """
+    Cursor para una escritura de repositorio.
+    
+    Sin cursor se abre uno propio y se confirma al salir del bloque; con
+    el cursor de una transacción abierta (get_write_cursor) no se hace
+    commit: lo decide el servicio, una sola vez para toda la operación.
+    
+    Example:
+        >>> with write_scope(cursor) as cur:
+        ...     cur.execute("UPDATE productos SET activo = FALSE WHERE id = %s", (1,))
+    """
+    if cursor is not None:
+        yield cursor
+        return
+    with get_write_cursor() as (own_cursor, conn):
+        yield own_cursor
+        conn.commit()
+
+
+def forget_request_cache(owner: type) -> None:
+    """
+    Descarta las búsquedas en caché de un repositorio en la petición actual.
+    
+    Args:
+        owner (type): Clase del repositorio cuyas entradas se descartan
+    """
+    cache = _request_cache.get()
+    if cache:
+        for key in [k for k in cache if k[0] is owner]:
+            del cache[key]
+
+
+# Estimación de filas mantenida por ANALYZE/autovacuum (-1 si nunca se analizó)
+_ESTIMATE_COUNT_SQL = "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)"
+
+
+@lru_cache(maxsize=128)
+def _compile_select(table: str, conditions: str, order_by: str) -> str:
+    """
+    Construye (una vez por combinación) el SELECT de find_all.
+    
+    El texto resultante es idéntico entre llamadas, de modo que el caché
+    de sentencias preparadas de execute_query reutiliza el plan.
+    
+    Args:
+        table (str): Nombre de la tabla
+        conditions (str): Condiciones WHERE (vacío si no hay)
+        order_by (str): Ordenamiento ya validado
+        
+    Returns:
+        str: Sentencia SELECT
+    """
+    query = f"SELECT * FROM {table}"
+    if conditions:
+        query += f" WHERE {conditions}"
+    return query + f" ORDER BY {order_by}"
+
+
+@lru_cache(maxsize=128)
+def _compile_insert(table: str, columns: Tuple[str, ...]) -> str:
+    """
+    Construye (una vez por tabla y conjunto de columnas) el INSERT,
+    con RETURNING id para obtener el ID sin otra consulta.
+    
+    Args:
+        table (str): Nombre de la tabla
+        columns (tuple): Columnas ordenadas
+        
+    Returns:
+        str: Sentencia INSERT con placeholders
+    """
+    placeholders = ', '.join(['%s'] * len(columns))
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) RETURNING id"
+
+
+@lru_cache(maxsize=128)
+def _compile_update(table: str, columns: Tuple[str, ...]) -> str:
+    """
+    Construye (una vez por tabla y conjunto de columnas) el UPDATE por id.
+    
+    Args:
+        table (str): Nombre de la tabla
+        columns (tuple): Columnas ordenadas
+        
+    Returns:
+        str: Sentencia UPDATE con placeholders
+    """
+    set_clause = ', '.join([f"{column} = %s" for column in columns])
+    return f"UPDATE {table} SET {set_clause} WHERE id = %s"
+
+
 class BaseRepository:
     """
     Clase base para todos los repositorios.
     Proporciona métodos CRUD genéricos que pueden ser reutilizados.
+    
+    Cada subclase registra en _ALLOWED_ORDER los ordenamientos que usa;
+    find_all rechaza cualquier otro para que order_by nunca sea SQL
+    arbitrario.
     """
     
+    _ALLOWED_ORDER = frozenset({"id ASC"})
+    
     def __init__(self, table_name: str):
         """
         Inicializa el repositorio base.
         
+        Las sentencias fijas por tabla se construyen aquí una sola vez.
+        
         Args:
             table_name (str): Nombre de la tabla en la base de datos
         """
-        self.table_name = table_name
+        table = sys.intern(table_name)
+        self.table_name = table
+        self._sql_find_by_id = f"SELECT * FROM {table} WHERE id = %s"
+        self._sql_find_by_ids = f"SELECT * FROM {table} WHERE id = ANY(%s)"
+        self._sql_exists = f"SELECT 1 FROM {table} WHERE id = %s LIMIT 1"
+        self._sql_delete = f"DELETE FROM {table} WHERE id = %s"
+        self._sql_count = f"SELECT COUNT(*) FROM {table}"
     
+    def _after_write(self) -> None:
+        """
+        Se llama tras cada escritura confirmada de insert/update/delete.
+        
+        Los repositorios con lecturas cacheadas lo sobrescriben para
+        descartarlas.
+        """
+    
+    def after_commit(self, *args) -> None:
+        """
+        Descarta las lecturas cacheadas tras confirmar una transacción.
+        
+        Las escrituras hechas con cursor=... no llaman a _after_write:
+        antes del commit, una lectura concurrente volvería a cachear la
+        fila anterior. El servicio que confirma la transacción llama a
+        este método una vez hecho el commit.
+        """
+        self._after_write(*args)
+    
+    @log_errors(logger)
     def find_all(self, conditions: str = "", params: tuple = None, 
                  order_by: str = "id ASC") -> List[Dict[str, Any]]:
         """
         Obtiene todos los registros de la tabla.
         
         Args:
-            conditions (str): Condiciones WHERE opcionales
+            conditions (str): Condiciones WHERE opcionales (texto fijo del
+                código; los valores van siempre en params)
             params (tuple): Parámetros para las condiciones
-            order_by (str): Ordenamiento
+            order_by (str): Ordenamiento, uno de _ALLOWED_ORDER
             
         Returns:
             List[Dict]: Lista de registros
-        """
-        try:
-            query = f"SELECT * FROM {self.table_name}"
             
-            if conditions:
-                query += f" WHERE {conditions}"
-            
-            query += f" ORDER BY {order_by}"
+        Raises:
+            ValueError: Si order_by no está permitido para el repositorio
+        """
+        if order_by not in self._ALLOWED_ORDER:
+            raise ValueError(f"Ordenamiento no permitido en {self.table_name}: {order_by}")
+        
+        query = _compile_select(self.table_name, conditions, order_by)
+        
+        result = execute_query(query, params)
+        logger.info("find_all en %s: %d registros", self.table_name, len(result))
+        return result if result else []
+    
+    @log_errors(logger)
+    def find_all_df(self, conditions: str = "", params: tuple = None,
+                    order_by: str = "id ASC"):
+        """
+        Igual que find_all, pero retorna un DataFrame columnar.
+        
+        Evita crear un diccionario por fila en listados grandes.
+        
+        Args:
+            conditions (str): Condiciones WHERE opcionales
+            params (tuple): Parámetros para las condiciones
+            order_by (str): Ordenamiento, uno de _ALLOWED_ORDER
             
-            result = execute_query(query, params)
-            logger.info(f"find_all en {self.table_name}: {len(result)} registros")
-            return result if result else []
+        Returns:
+            pandas.DataFrame: Registros encontrados
             
-        except Exception as e:
-            logger.error(f"Error en find_all de {self.table_name}: {e}")
-            raise
+        Raises:
+            ValueError: Si order_by no está permitido para el repositorio
+        """
+        if order_by not in self._ALLOWED_ORDER:
+            raise ValueError(f"Ordenamiento no permitido en {self.table_name}: {order_by}")
+        
+        query = _compile_select(self.table_name, conditions, order_by)
+        df = execute_query_df(query, params)
+        logger.info("find_all_df en %s: %d registros", self.table_name, len(df))
+        return df
     
+    @log_errors(logger)
     def find_by_id(self, id: int) -> Optional[Dict[str, Any]]:
         """
         Busca un registro por su ID.
@@ -68,50 +383,116 @@ class BaseRepository:
         Returns:
             Dict|None: Registro encontrado o None
         """
-        try:
-            query = f"SELECT * FROM {self.table_name} WHERE id = %s"
-            result = execute_query(query, (id,), fetch='one')
+        query = self._sql_find_by_id
+        result = execute_query(query, (id,), fetch='one')
+        
+        if result:
+            logger.debug("find_by_id en %s: ID %s encontrado", self.table_name, id)
+        else:
+            logger.warning("find_by_id en %s: ID %s no encontrado", self.table_name, id)
+        
+        return result
+    
+    @log_errors(logger)
+    def find_by_ids(self, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Busca varios registros por ID en un solo viaje al servidor.
+        
+        Args:
+            ids (List[int]): IDs a buscar
             
-            if result:
-                logger.debug(f"find_by_id en {self.table_name}: ID {id} encontrado")
-            else:
-                logger.warning(f"find_by_id en {self.table_name}: ID {id} no encontrado")
+        Returns:
+            Dict[int, Dict]: {id: registro} con los IDs encontrados
+        """
+        if not ids:
+            return {}
+        rows = execute_query(self._sql_find_by_ids, (list(ids),)) or []
+        return {row['id']: row for row in rows}
+    
+    @log_errors(logger)
+    def find_by_id_cols(self, id: int, cols: Tuple[str, ...]) -> Optional[Dict[str, Any]]:
+        """
+        Busca un registro por su ID trayendo solo las columnas indicadas.
+        
+        Args:
+            id (int): ID del registro
+            cols (tuple): Columnas a obtener (definidas en código, no por el usuario)
             
-            return result
+        Returns:
+            Dict|None: Registro con las columnas pedidas o None
+        """
+        query = f"SELECT {', '.join(cols)} FROM {self.table_name} WHERE id = %s"
+        return execute_query(query, (id,), fetch='one')
+    
+    @log_errors(logger)
+    def exists(self, id: int) -> bool:
+        """
+        Verifica si existe un registro sin traer sus columnas.
+        
+        Args:
+            id (int): ID del registro
             
-        except Exception as e:
-            logger.error(f"Error en find_by_id de {self.table_name}: {e}")
-            raise
+        Returns:
+            bool: True si el registro existe
+        """
+        query = self._sql_exists
+        return execute_query(query, (id,), fetch='one') is not None
     
-    def insert(self, data: Dict[str, Any]) -> Optional[int]:
+    @log_errors(logger)
+    def insert(self, data: Dict[str, Any], cursor=None) -> Optional[int]:
         """
         Inserta un nuevo registro.
         
         Args:
             data (Dict): Diccionario con los datos a insertar
+            cursor (optional): Cursor de una transacción abierta; si se
+                indica no se hace commit
             
         Returns:
             int|None: ID del registro insertado
         """
-        try:
-            columns = ', '.join(data.keys())
-            placeholders = ', '.join(['%s'] * len(data))
-            values = tuple(data.values())
-            
-            query = f"INSERT INTO {self.table_name} ({columns}) VALUES ({placeholders})"
-            
-            with get_db_cursor() as (cursor, conn):
-                cursor.execute(query, values)
-                conn.commit()
-                inserted_id = cursor.lastrowid
-                
-                logger.info(f"insert en {self.table_name}: ID {inserted_id} creado")
-                return inserted_id
-                
-        except Exception as e:
-            logger.error(f"Error en insert de {self.table_name}: {e}")
-            raise
+        columns = tuple(sorted(data))
+        values = tuple(data[column] for column in columns)
+        
+        query = _compile_insert(self.table_name, columns)
+        
+        with write_scope(cursor) as cur:
+            cur.execute(query, values)
+            inserted_id = cur.fetchone()[0]
+        if cursor is None:
+            self._after_write()
+        
+        logger.info("insert en %s: ID %s creado", self.table_name, inserted_id)
+        return inserted_id
     
+    @log_errors(logger)
+    def insert_many(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """
+        Inserta varios registros en un solo viaje al servidor.
+        
+        Todas las filas deben tener las mismas columnas.
+        
+        Args:
+            rows (List[Dict]): Registros a insertar
+            
+        Returns:
+            List[int]: IDs de los registros insertados, en orden
+        """
+        if not rows:
+            return []
+        
+        columns = tuple(sorted(rows[0]))
+        values = [tuple(row[column] for column in columns) for row in rows]
+        
+        inserted_ids = execute_bulk_insert(
+            self.table_name, list(columns), values, returning='id'
+        )
+        self._after_write()
+        
+        logger.info("insert_many en %s: %d registros creados", self.table_name, len(inserted_ids))
+        return inserted_ids
+    
+    @log_errors(logger)
     def update(self, id: int, data: Dict[str, Any]) -> bool:
         """
         Actualiza un registro existente.
@@ -123,28 +504,25 @@ class BaseRepository:
         Returns:
             bool: True si se actualizó correctamente
         """
-        try:
-            set_clause = ', '.join([f"{key} = %s" for key in data.keys()])
-            values = tuple(data.values()) + (id,)
-            
-            query = f"UPDATE {self.table_name} SET {set_clause} WHERE id = %s"
+        columns = tuple(sorted(data))
+        values = tuple(data[column] for column in columns) + (id,)
+        
+        query = _compile_update(self.table_name, columns)
+        
+        with get_write_cursor() as (cursor, conn):
+            cursor.execute(query, values)
+            conn.commit()
+            self._after_write()
+            affected_rows = cursor.rowcount
             
-            with get_db_cursor() as (cursor, conn):
-                cursor.execute(query, values)
-                conn.commit()
-                affected_rows = cursor.rowcount
-                
-                if affected_rows > 0:
-                    logger.info(f"update en {self.table_name}: ID {id} actualizado")
-                    return True
-                else:
-                    logger.warning(f"update en {self.table_name}: ID {id} no encontrado")
-                    return False
-                    
-        except Exception as e:
-            logger.error(f"Error en update de {self.table_name}: {e}")
-            raise
+            if affected_rows > 0:
+                logger.info("update en %s: ID %s actualizado", self.table_name, id)
+                return True
+            else:
+                logger.warning("update en %s: ID %s no encontrado", self.table_name, id)
+                return False
     
+    @log_errors(logger)
     def delete(self, id: int) -> bool:
         """
         Elimina un registro por su ID (hard delete).
@@ -155,25 +533,22 @@ class BaseRepository:
         Returns:
             bool: True si se eliminó correctamente
         """
-        try:
-            query = f"DELETE FROM {self.table_name} WHERE id = %s"
-            
-            with get_db_cursor() as (cursor, conn):
-                cursor.execute(query, (id,))
-                conn.commit()
-                affected_rows = cursor.rowcount
-                
-                if affected_rows > 0:
-                    logger.info(f"delete en {self.table_name}: ID {id} eliminado")
-                    return True
-                else:
-                    logger.warning(f"delete en {self.table_name}: ID {id} no encontrado")
-                    return False
-                    
-        except Exception as e:
-            logger.error(f"Error en delete de {self.table_name}: {e}")
-            raise
+        query = self._sql_delete
+        
+        with get_write_cursor() as (cursor, conn):
+            cursor.execute(query, (id,))
+            conn.commit()
+            self._after_write()
+            affected_rows = cursor.rowcount
+            
+            if affected_rows > 0:
+                logger.info("delete en %s: ID %s eliminado", self.table_name, id)
+                return True
+            else:
+                logger.warning("delete en %s: ID %s no encontrado", self.table_name, id)
+                return False
     
+    @log_errors(logger)
     def soft_delete(self, id: int) -> bool:
         """
         Desactiva un registro (soft delete) marcando activo = False.
@@ -184,35 +559,39 @@ class BaseRepository:
         Returns:
             bool: True si se desactivó correctamente
         """
-        try:
-            return self.update(id, {'activo': False})
-        except Exception as e:
-            logger.error(f"Error en soft_delete de {self.table_name}: {e}")
-            raise
+        return self.update(id, {'activo': False})
     
-    def count(self, conditions: str = "", params: tuple = None) -> int:
+    @log_errors(logger)
+    def count(self, conditions: str = "", params: tuple = None,
+              estimate: bool = False) -> int:
         """
         Cuenta registros en la tabla.
         
         Args:
             conditions (str): Condiciones WHERE opcionales
             params (tuple): Parámetros para las condiciones
+            estimate (bool): Sin condiciones, usar la estimación de
+                pg_class.reltuples en lugar de recorrer la tabla. Si la
+                tabla nunca fue analizada se hace el conteo exacto.
             
         Returns:
             int: Cantidad de registros
         """
-        try:
-            query = f"SELECT COUNT(*) as total FROM {self.table_name}"
-            
-            if conditions:
-                query += f" WHERE {conditions}"
-            
-            result = execute_query(query, params, fetch='one')
-            total = result['total'] if result else 0
-            
-            logger.debug(f"count en {self.table_name}: {total} registros")
-            return total
-            
-        except Exception as e:
-            logger.error(f"Error en count de {self.table_name}: {e}")
-            raise
\ No newline at end of file
+        if estimate and not conditions:
+            result = execute_query(
+                _ESTIMATE_COUNT_SQL, (self.table_name,), fetch='one', dictionary=False
+            )
+            if result and result[0] is not None and result[0] >= 0:
+                logger.debug("count estimado en %s: %d registros", self.table_name, result[0])
+                return int(result[0])
+        
+        query = self._sql_count
+        
+        if conditions:
+            query += f" WHERE {conditions}"
+        
+        result = execute_query(query, params, fetch='one', dictionary=False)
+        total = result[0] if result else 0
+        
+        logger.debug("count en %s: %d registros", self.table_name, total)
+        return total
\ No newline at end of file
@@ -5,19 +5,57 @@ REPOSITORIO DE CATEGORÍAS
 """
 
 import logging
-from typing import List, Dict, Any, Optional
-from .base_repository import BaseRepository
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+from .base_repository import BaseRepository, log_errors
 from config.database import execute_query
 
 logger = logging.getLogger(__name__)
 
+# Versión de la tabla categorias en este proceso; cada escritura hecha a
+# través de CategoriaRepository la incrementa e invalida las lecturas
+# cacheadas (las claves con la versión anterior dejan de usarse)
+_CATEGORIAS_VERSION = 0
+
+
+def _bump_version():
+    """Invalida el caché de categorías"""
+    global _CATEGORIAS_VERSION
+    _CATEGORIAS_VERSION += 1
+
+
+@lru_cache(maxsize=32)
+def _cached_all_active(version: int, query: str) -> Tuple[Dict[str, Any], ...]:
+    """Categorías activas para una versión dada de la tabla"""
+    return tuple(execute_query(query) or [])
+
+
+@lru_cache(maxsize=32)
+def _cached_by_name(version: int, nombre: str) -> Optional[Dict[str, Any]]:
+    """Categoría por nombre para una versión dada de la tabla"""
+    query = "SELECT * FROM categorias WHERE nombre = %s"
+    return execute_query(query, (nombre,), fetch='one')
+
 
 class CategoriaRepository(BaseRepository):
-    """Repositorio para gestionar categorías de productos"""
+    """
+    Repositorio para gestionar categorías de productos.
+    
+    get_all_active y find_by_name se sirven desde un caché en memoria que
+    se invalida con cada insert/update/delete hecho por este repositorio.
+    Cambios hechos directamente en la base de datos no se ven hasta la
+    siguiente escritura o hasta reiniciar el proceso.
+    """
+    
+    _ALL_ACTIVE_SQL = "SELECT * FROM categorias WHERE activo = TRUE ORDER BY nombre ASC"
     
     def __init__(self):
         super().__init__('categorias')
     
+    def _after_write(self) -> None:
+        _bump_version()
+    
+    @log_errors(logger)
     def get_all_active(self) -> List[Dict[str, Any]]:
         """
         Obtiene todas las categorías activas.
@@ -25,12 +63,9 @@ class CategoriaRepository(BaseRepository):
         Returns:
             List[Dict]: Lista de categorías activas
         """
-        try:
-            return self.find_all(conditions="activo = TRUE", order_by="nombre ASC")
-        except Exception as e:
-            logger.error(f"Error obteniendo categorías activas: {e}")
-            raise
+        return [dict(row) for row in _cached_all_active(_CATEGORIAS_VERSION, self._ALL_ACTIVE_SQL)]
     
+    @log_errors(logger)
     def find_by_name(self, nombre: str) -> Optional[Dict[str, Any]]:
         """
         Busca una categoría por nombre.
@@ -41,9 +76,5 @@ class CategoriaRepository(BaseRepository):
         Returns:
             Dict|None: Categoría encontrada o None
         """
-        try:
-            query = "SELECT * FROM categorias WHERE nombre = %s"
-            return execute_query(query, (nombre,), fetch='one')
-        except Exception as e:
-            logger.error(f"Error buscando categoría por nombre: {e}")
-            raise
\ No newline at end of file
+        categoria = _cached_by_name(_CATEGORIAS_VERSION, nombre)
+        return dict(categoria) if categoria else None
\ No newline at end of file
@@ -6,29 +6,39 @@ REPOSITORIO DE CLIENTES
 
 import logging
 from typing import List, Dict, Any, Optional
-from .base_repository import BaseRepository
+from .base_repository import BaseRepository, log_errors, escape_like
 from config.database import execute_query
 
 logger = logging.getLogger(__name__)
 
+# Búsqueda por subcadena; usa los índices trigram de
+# sql/optimizaciones_postgresql.sql
+_SEARCH_SQL = """
+    SELECT * FROM clientes
+    WHERE (numero_documento ILIKE %s ESCAPE '\\'
+       OR nombres ILIKE %s ESCAPE '\\'
+       OR apellidos ILIKE %s ESCAPE '\\'
+       OR razon_social ILIKE %s ESCAPE '\\')
+      AND activo = TRUE
+    ORDER BY nombres ASC
+    LIMIT 50
+"""
+
 
 class ClienteRepository(BaseRepository):
     """Repositorio para gestionar clientes"""
     
+    _ALL_ACTIVE_SQL = "SELECT * FROM clientes WHERE activo = TRUE ORDER BY nombres ASC"
+    
     def __init__(self):
         super().__init__('clientes')
     
+    @log_errors(logger)
     def get_all_active(self) -> List[Dict[str, Any]]:
         """Obtiene todos los clientes activos"""
-        try:
-            return self.find_all(
-                conditions="activo = TRUE",
-                order_by="nombres ASC"
-            )
-        except Exception as e:
-            logger.error(f"Error obteniendo clientes activos: {e}")
-            raise
+        return execute_query(self._ALL_ACTIVE_SQL) or []
     
+    @log_errors(logger)
     def find_by_documento(self, numero_documento: str) -> Optional[Dict[str, Any]]:
         """
         Busca un cliente por número de documento.
@@ -39,16 +49,13 @@ class ClienteRepository(BaseRepository):
         Returns:
             Dict|None: Cliente encontrado o None
         """
-        try:
-            query = "SELECT * FROM clientes WHERE numero_documento = %s"
-            return execute_query(query, (numero_documento,), fetch='one')
-        except Exception as e:
-            logger.error(f"Error buscando cliente por documento: {e}")
-            raise
+        query = "SELECT * FROM clientes WHERE numero_documento = %s"
+        return execute_query(query, (numero_documento,), fetch='one')
     
+    @log_errors(logger)
     def search(self, term: str) -> List[Dict[str, Any]]:
         """
-        Busca clientes por documento o nombre.
+        Busca clientes por documento o nombre (sin distinguir mayúsculas).
         
         Args:
             term (str): Término de búsqueda
@@ -56,22 +63,8 @@ class ClienteRepository(BaseRepository):
         Returns:
             List[Dict]: Clientes encontrados
         """
-        try:
-            query = """
-                SELECT * FROM clientes
-                WHERE (numero_documento LIKE %s 
-                   OR nombres LIKE %s 
-                   OR apellidos LIKE %s
-                   OR razon_social LIKE %s)
-                  AND activo = TRUE
-                ORDER BY nombres ASC
-                LIMIT 50
-            """
-            search_term = f"%{term}%"
-            return execute_query(
-                query, 
-                (search_term, search_term, search_term, search_term)
-            ) or []
-        except Exception as e:
-            logger.error(f"Error buscando clientes: {e}")
-            raise
\ No newline at end of file
+        search_term = f"%{escape_like(term)}%"
+        return execute_query(
+            _SEARCH_SQL,
+            (search_term, search_term, search_term, search_term)
+        ) or []
\ No newline at end of file
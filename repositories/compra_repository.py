@@ -5,12 +5,359 @@ REPOSITORIO DE COMPRAS - POSTGRESQL (CORREGIDO Y VALIDADO)
 """
 
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Optional, Set, Tuple, Iterator
 from datetime import datetime, date
-from config.database import execute_query, get_db_cursor
+from .base_repository import (
+    log_errors,
+    request_cached,
+    load_many,
+    forget_request_cache,
+    write_scope,
+    _compile_update
+)
+from config.database import (
+    execute_query,
+    get_write_cursor,
+    execute_bulk_insert,
+    cached_query,
+    prepared_statement,
+    stream_query
+)
 
 logger = logging.getLogger(__name__)
 
+# Columnas de cabecera que usan los listados (sin columnas de auditoría)
+_COMPRA_COLUMNS = """
+        c.id, c.numero_compra, c.proveedor_id, c.usuario_id,
+        c.fecha_compra, c.fecha_recepcion, c.estado,
+        c.subtotal, c.impuesto, c.total, c.observaciones"""
+
+# Búsquedas frecuentes, preparadas en el servidor con nombre propio
+_FIND_BY_ID_SQL = prepared_statement(
+    'compra_por_id',
+    "SELECT * FROM compras WHERE id = %s"
+)
+_FIND_BY_IDS_SQL = prepared_statement(
+    'compras_por_ids',
+    "SELECT * FROM compras WHERE id = ANY(%s)"
+)
+_FIND_BY_NUMERO_SQL = prepared_statement('compra_por_numero', f"""
+    SELECT {_COMPRA_COLUMNS},
+        p.razon_social as proveedor_nombre,
+        u.nombre_completo as usuario_nombre
+    FROM compras c
+    INNER JOIN proveedores p ON c.proveedor_id = p.id
+    INNER JOIN usuarios u ON c.usuario_id = u.id
+    WHERE c.numero_compra = %s
+""")
+_GET_BY_PROVEEDOR_SQL = prepared_statement('compras_por_proveedor', f"""
+    SELECT {_COMPRA_COLUMNS},
+        p.razon_social as proveedor_nombre
+    FROM compras c
+    INNER JOIN proveedores p ON c.proveedor_id = p.id
+    WHERE c.proveedor_id = %s
+    ORDER BY c.fecha_compra DESC
+""")
+
+_INSERT_COMPRA_SQL = """
+    INSERT INTO compras (
+        numero_compra,
+        proveedor_id,
+        usuario_id,
+        fecha_compra,
+        subtotal,
+        impuesto,
+        total,
+        estado,
+        observaciones
+    ) VALUES (
+        %(numero_compra)s,
+        %(proveedor_id)s,
+        %(usuario_id)s,
+        %(fecha_compra)s,
+        %(subtotal)s,
+        %(impuesto)s,
+        %(total)s,
+        %(estado)s,
+        %(observaciones)s
+    ) RETURNING *
+"""
+
+# Cambio de estado en una sola sentencia; la fecha de recepción solo se
+# sobrescribe si se indica
+_UPDATE_ESTADO_SQL = """
+    UPDATE compras
+    SET estado = %s,
+        fecha_recepcion = COALESCE(%s, fecha_recepcion)
+    WHERE id = %s
+"""
+# Estado de la compra bloqueando la fila hasta el fin de la transacción
+_LOCK_ESTADO_SQL = "SELECT estado FROM compras WHERE id = %s FOR UPDATE"
+
+# Columnas fijas de un detalle de compra; el INSERT se arma una sola vez
+_DETALLE_COLUMNS = ('compra_id', 'producto_id', 'cantidad', 'precio_unitario', 'subtotal')
+_INSERT_DETALLE_SQL = (
+    f"INSERT INTO detalle_compras ({', '.join(_DETALLE_COLUMNS)}) "
+    f"VALUES ({', '.join(f'%({c})s' for c in _DETALLE_COLUMNS)}) "
+    "RETURNING id"
+)
+
+# Cabecera + detalles en una sola sentencia (CTE de escritura)
+_INSERT_COMPRA_CON_DETALLES_SQL = """
+    WITH c AS (
+        INSERT INTO compras (
+            numero_compra,
+            proveedor_id,
+            usuario_id,
+            fecha_compra,
+            subtotal,
+            impuesto,
+            total,
+            estado,
+            observaciones
+        ) VALUES (
+            %(numero_compra)s,
+            %(proveedor_id)s,
+            %(usuario_id)s,
+            %(fecha_compra)s,
+            %(subtotal)s,
+            %(impuesto)s,
+            %(total)s,
+            %(estado)s,
+            %(observaciones)s
+        ) RETURNING id
+    ), d AS (
+        INSERT INTO detalle_compras (compra_id, producto_id, cantidad, precio_unitario, subtotal)
+        SELECT c.id, x.producto_id, x.cantidad, x.precio_unitario, x.subtotal
+        FROM c
+        CROSS JOIN UNNEST(
+            %(producto_ids)s::int[],
+            %(cantidades)s::int[],
+            %(precios)s::numeric[],
+            %(subtotales)s::numeric[]
+        ) AS x(producto_id, cantidad, precio_unitario, subtotal)
+    )
+    SELECT id FROM c
+"""
+
+
+# Años cuya secuencia de numeración ya se verificó en este proceso
+_numero_sequences: Set[int] = set()
+_numero_lock = threading.Lock()
+
+# Siguiente número libre según las compras ya registradas del año. Con
+# las columnas anio/numero_seq (sql/optimizaciones_postgresql.sql) el
+# máximo sale del índice ix_compras_anio_seq; sin ellas se extrae del texto
+_SIGUIENTE_NUMERO_SQL = """
+    COALESCE((
+        SELECT MAX(numero_seq)
+        FROM compras
+        WHERE anio = {year}
+    ), 0) + 1
+"""
+_SIGUIENTE_NUMERO_TEXTO_SQL = """
+    COALESCE((
+        SELECT MAX(split_part(numero_compra, '-', 3)::int)
+        FROM compras
+        WHERE numero_compra ~ '^COM-{year}-[0-9]+$'
+    ), 0) + 1
+"""
+_HAS_NUMERO_SEQ_SQL = """
+    SELECT 1 FROM information_schema.columns
+    WHERE table_name = 'compras' AND column_name = 'numero_seq'
+"""
+_numero_seq_column: Optional[bool] = None
+
+
+def _siguiente_numero_sql(year: int) -> str:
+    """Expresión SQL del siguiente número del año (detecta numero_seq una vez)"""
+    global _numero_seq_column
+    if _numero_seq_column is None:
+        _numero_seq_column = execute_query(_HAS_NUMERO_SEQ_SQL, fetch='one') is not None
+    template = _SIGUIENTE_NUMERO_SQL if _numero_seq_column else _SIGUIENTE_NUMERO_TEXTO_SQL
+    return template.format(year=int(year))
+
+
+def _ensure_numero_sequence(year: int) -> str:
+    """
+    Crea (si no existe) la secuencia de numeración de compras del año.
+    
+    Al crearla la inicializa después del mayor número COM-AAAA-NNN ya
+    registrado, para no repetir números existentes. La verificación se
+    hace una sola vez por año y proceso.
+    
+    Args:
+        year (int): Año de la numeración
+        
+    Returns:
+        str: Nombre de la secuencia
+    """
+    sequence = f"compras_num_seq_{int(year)}"
+    if year in _numero_sequences:
+        return sequence
+    
+    with _numero_lock:
+        if year in _numero_sequences:
+            return sequence
+        
+        ddl = f"""
+            DO $$
+            BEGIN
+                IF to_regclass('{sequence}') IS NULL THEN
+                    CREATE SEQUENCE {sequence};
+                    PERFORM setval('{sequence}', {_siguiente_numero_sql(year)}, false);
+                END IF;
+            END
+            $$
+        """
+        with get_write_cursor() as (cursor, conn):
+            cursor.execute(ddl)
+            conn.commit()
+        
+        _numero_sequences.add(year)
+    
+    return sequence
+
+
+def _reseed_numero_sequence(year: int) -> None:
+    """
+    Realinea la secuencia del año con el mayor número ya registrado.
+    
+    Se usa cuando un INSERT choca con un numero_compra existente (por
+    ejemplo, compras cargadas a mano por fuera de la secuencia).
+    
+    Args:
+        year (int): Año de la numeración
+    """
+    sequence = _ensure_numero_sequence(year)
+    with get_write_cursor() as (cursor, conn):
+        cursor.execute(
+            f"SELECT setval('{sequence}', {_siguiente_numero_sql(year)}, false)"
+        )
+        conn.commit()
+    logger.warning(f"Secuencia {sequence} realineada con las compras existentes")
+
+
+# ============================================
+# CACHÉ DE LECTURAS
+# ============================================
+# Los listados de compras se consultan en cada clic y cambian poco: se
+# cachean unos segundos y cualquier escritura de CompraRepository los
+# invalida. Los métodos retornan copias (dict) de las filas cacheadas.
+
+_CACHE_TTL = 30
+
+
+@cached_query(ttl=_CACHE_TTL, maxsize=256)
+def _cached_all_with_details():
+    """Compras con proveedor y usuario"""
+    query = f"""
+        SELECT {_COMPRA_COLUMNS},
+            p.razon_social as proveedor_nombre,
+            u.nombre_completo as usuario_nombre
+        FROM compras c
+        INNER JOIN proveedores p ON c.proveedor_id = p.id
+        INNER JOIN usuarios u ON c.usuario_id = u.id
+        ORDER BY c.fecha_compra DESC, c.id DESC
+    """
+    return execute_query(query) or []
+
+
+@cached_query(ttl=_CACHE_TTL, maxsize=256)
+def _cached_by_estado(estado: str):
+    """Compras en un estado"""
+    query = """
+        SELECT * FROM compras
+        WHERE estado = %s
+        ORDER BY fecha_compra DESC
+    """
+    return execute_query(query, (estado,)) or []
+
+
+@cached_query(ttl=_CACHE_TTL, maxsize=256)
+def _cached_detalle(compra_id: int):
+    """Detalles de una compra con datos del producto"""
+    query = """
+        SELECT 
+            dc.*,
+            p.codigo as producto_codigo,
+            p.nombre as producto_nombre,
+            p.unidad_medida
+        FROM detalle_compras dc
+        INNER JOIN productos p ON dc.producto_id = p.id
+        WHERE dc.compra_id = %s
+        ORDER BY dc.id
+    """
+    return execute_query(query, (compra_id,)) or []
+
+
+# Una fila por compra con sus detalles agregados en JSON (evita 1+N consultas)
+_COMPRAS_CON_DETALLES_SQL = """
+    SELECT
+        c.*,
+        p.razon_social AS proveedor_nombre,
+        u.nombre_completo AS usuario_nombre,
+        COALESCE(
+            jsonb_agg(
+                jsonb_build_object(
+                    'id', dc.id,
+                    'producto_id', dc.producto_id,
+                    'cantidad', dc.cantidad,
+                    'precio_unitario', dc.precio_unitario,
+                    'subtotal', dc.subtotal,
+                    'producto_codigo', pr.codigo,
+                    'producto_nombre', pr.nombre,
+                    'unidad_medida', pr.unidad_medida
+                ) ORDER BY dc.id
+            ) FILTER (WHERE dc.id IS NOT NULL),
+            '[]'::jsonb
+        ) AS detalles
+    FROM compras c
+    INNER JOIN proveedores p ON c.proveedor_id = p.id
+    INNER JOIN usuarios u ON c.usuario_id = u.id
+    LEFT JOIN detalle_compras dc ON dc.compra_id = c.id
+    LEFT JOIN productos pr ON pr.id = dc.producto_id
+    {where}
+    GROUP BY c.id, p.razon_social, u.nombre_completo
+    ORDER BY c.fecha_compra DESC, c.id DESC
+"""
+_COMPRAS_CON_DETALLES_ALL_SQL = _COMPRAS_CON_DETALLES_SQL.format(where="")
+_COMPRAS_CON_DETALLES_ESTADO_SQL = _COMPRAS_CON_DETALLES_SQL.format(where="WHERE c.estado = %s")
+
+# Paginación por keyset: (fecha_compra, id) de la última fila vista
+_PAGE_SQL = """
+    SELECT {columns},
+        p.razon_social as proveedor_nombre,
+        u.nombre_completo as usuario_nombre
+    FROM compras c
+    INNER JOIN proveedores p ON c.proveedor_id = p.id
+    INNER JOIN usuarios u ON c.usuario_id = u.id
+    {where}
+    ORDER BY c.fecha_compra DESC, c.id DESC
+    LIMIT %s
+"""
+_FIRST_PAGE_SQL = _PAGE_SQL.format(columns=_COMPRA_COLUMNS, where="")
+_NEXT_PAGE_SQL = _PAGE_SQL.format(
+    columns=_COMPRA_COLUMNS,
+    where="WHERE (c.fecha_compra, c.id) < (%s, %s)"
+)
+
+
+def _invalidate_cache():
+    """Descarta las lecturas cacheadas tras una escritura"""
+    _cached_all_with_details.cache_clear()
+    _cached_by_estado.cache_clear()
+    _cached_detalle.cache_clear()
+    forget_request_cache(CompraRepository)
+
+
+def _row_to_dict(cursor, row) -> Optional[Dict[str, Any]]:
+    """Convierte la fila de un RETURNING * en dict, sea cual sea el cursor"""
+    if row is None or isinstance(row, dict):
+        return row
+    return {column.name: value for column, value in zip(cursor.description, row)}
+
 
 class CompraRepository:
     """Repositorio para gestionar compras - PostgreSQL"""
@@ -18,114 +365,199 @@ class CompraRepository:
     def __init__(self):
         self.table_name = 'compras'
     
+    def after_commit(self) -> None:
+        """
+        Descarta las lecturas cacheadas tras confirmar una transacción en
+        la que se escribió con cursor=... (ver BaseRepository.after_commit).
+        """
+        _invalidate_cache()
+    
+    @log_errors(logger)
     def get_all_with_details(self) -> List[Dict[str, Any]]:
-        try:
-            query = """
-                SELECT 
-                    c.*,
-                    p.razon_social as proveedor_nombre,
-                    u.nombre_completo as usuario_nombre
-                FROM compras c
-                INNER JOIN proveedores p ON c.proveedor_id = p.id
-                INNER JOIN usuarios u ON c.usuario_id = u.id
-                ORDER BY c.fecha_compra DESC, c.id DESC
-            """
-            return execute_query(query) or []
-        except Exception as e:
-            logger.error(f"Error obteniendo compras con detalles: {e}")
-            raise
+        return [dict(row) for row in _cached_all_with_details()]
+    
+    @log_errors(logger)
+    def get_page(self, before: Optional[Tuple] = None,
+                 limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[Tuple]]:
+        """
+        Obtiene una página de compras, de la más reciente a la más antigua.
+        
+        Args:
+            before (tuple): Cursor (fecha_compra, id) devuelto por la
+                página anterior; None para la primera página
+            limit (int): Cantidad máxima de registros
+            
+        Returns:
+            tuple: (compras, siguiente_cursor); el cursor es None cuando
+                no quedan más páginas
+                
+        Example:
+            >>> compras, cursor = repo.get_page(limit=20)
+            >>> siguientes, cursor = repo.get_page(cursor, limit=20)
+        """
+        if before is None:
+            rows = execute_query(_FIRST_PAGE_SQL, (limit,)) or []
+        else:
+            rows = execute_query(_NEXT_PAGE_SQL, (*before, limit)) or []
+        
+        if len(rows) < limit:
+            return rows, None
+        return rows, (rows[-1]['fecha_compra'], rows[-1]['id'])
+    
+    def iter_all_with_details(self, chunk: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre todas las compras con un cursor del lado del servidor.
+        
+        Pensado para reportes y exportaciones: las filas llegan en bloques
+        de `chunk` y la conexión queda tomada mientras se consume el
+        iterador. Para listados en pantalla usar get_page().
+        
+        Args:
+            chunk (int): Filas por cada viaje al servidor
+            
+        Yields:
+            Dict: Compra con proveedor_nombre y usuario_nombre
+        """
+        # LIMIT NULL equivale a sin límite
+        yield from stream_query(_FIRST_PAGE_SQL, (None,), itersize=chunk, real_dict=True)
     
+    @log_errors(logger)
+    def get_all_with_detalles_aggregated(self, estado: str = None) -> List[Dict[str, Any]]:
+        """
+        Obtiene las compras con sus detalles en una sola consulta.
+        
+        Reemplaza el patrón get_all_with_details() + get_detalle(id) por
+        compra: cada fila trae la lista 'detalles' (jsonb_agg).
+        
+        Args:
+            estado (str): Estado a filtrar (opcional)
+            
+        Returns:
+            List[Dict]: Compras con proveedor_nombre, usuario_nombre y detalles
+        """
+        if estado:
+            return execute_query(_COMPRAS_CON_DETALLES_ESTADO_SQL, (estado,)) or []
+        return execute_query(_COMPRAS_CON_DETALLES_ALL_SQL) or []
+    
+    @log_errors(logger)
+    @request_cached('by_id')
     def find_by_id(self, compra_id: int) -> Optional[Dict[str, Any]]:
-        try:
-            query = f"SELECT * FROM {self.table_name} WHERE id = %s"
-            return execute_query(query, (compra_id,), fetch='one')
-        except Exception as e:
-            logger.error(f"Error buscando compra por ID: {e}")
-            raise
+        return execute_query(_FIND_BY_ID_SQL, (compra_id,), fetch='one')
     
+    @log_errors(logger)
+    def lock_estado(self, compra_id: int, cursor) -> Optional[str]:
+        """
+        Lee el estado de una compra bloqueando su fila (SELECT ... FOR UPDATE).
+        
+        Dentro de la transacción de recepción garantiza que dos
+        recepciones simultáneas de la misma compra no sumen el stock dos
+        veces: la segunda espera y ve el estado ya cambiado.
+        
+        Args:
+            compra_id (int): ID de la compra
+            cursor: Cursor de tuplas de la transacción abierta
+            
+        Returns:
+            str|None: Estado actual o None si la compra no existe
+        """
+        cursor.execute(_LOCK_ESTADO_SQL, (compra_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    
+    @log_errors(logger)
+    def find_by_ids(self, compra_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Busca varias compras por ID con una sola consulta (id = ANY).
+        
+        Args:
+            compra_ids (List[int]): IDs a buscar
+            
+        Returns:
+            Dict[int, Dict]: {id: compra} con las compras encontradas
+        """
+        if not compra_ids:
+            return {}
+        rows = execute_query(_FIND_BY_IDS_SQL, (list(compra_ids),)) or []
+        return {row['id']: row for row in rows}
+    
+    def load_by_ids(self, compra_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Carga varias compras de una vez dentro de la petición actual.
+        
+        Las compras quedan en la caché por petición: los find_by_id
+        posteriores sobre esos IDs no vuelven a consultar.
+        
+        Args:
+            compra_ids (List[int]): IDs a cargar
+            
+        Returns:
+            Dict[int, Dict]: {id: compra} con las compras encontradas
+            
+        Example:
+            >>> with request_scope():
+            ...     repo.load_by_ids([c['id'] for c in compras])
+            ...     compra = repo.find_by_id(compras[0]['id'])  # sin consulta
+        """
+        return load_many(self, 'by_id', compra_ids, self.find_by_ids)
+    
+    @log_errors(logger)
+    @request_cached('by_numero')
     def find_by_numero(self, numero_compra: str) -> Optional[Dict[str, Any]]:
-        try:
-            query = """
-                SELECT 
-                    c.*,
-                    p.razon_social as proveedor_nombre,
-                    u.nombre_completo as usuario_nombre
-                FROM compras c
-                INNER JOIN proveedores p ON c.proveedor_id = p.id
-                INNER JOIN usuarios u ON c.usuario_id = u.id
-                WHERE c.numero_compra = %s
-            """
-            return execute_query(query, (numero_compra,), fetch='one')
-        except Exception as e:
-            logger.error(f"Error buscando compra por número: {e}")
-            raise
+        return execute_query(_FIND_BY_NUMERO_SQL, (numero_compra,), fetch='one')
     
+    @log_errors(logger)
     def get_by_proveedor(self, proveedor_id: int) -> List[Dict[str, Any]]:
-        try:
-            query = """
-                SELECT c.*, p.razon_social as proveedor_nombre
-                FROM compras c
-                INNER JOIN proveedores p ON c.proveedor_id = p.id
-                WHERE c.proveedor_id = %s
-                ORDER BY c.fecha_compra DESC
-            """
-            return execute_query(query, (proveedor_id,)) or []
-        except Exception as e:
-            logger.error(f"Error obteniendo compras por proveedor: {e}")
-            raise
+        return execute_query(_GET_BY_PROVEEDOR_SQL, (proveedor_id,)) or []
     
+    @log_errors(logger)
     def get_by_estado(self, estado: str) -> List[Dict[str, Any]]:
-        try:
-            query = f"""
-                SELECT * FROM {self.table_name}
-                WHERE estado = %s
-                ORDER BY fecha_compra DESC
-            """
-            return execute_query(query, (estado,)) or []
-        except Exception as e:
-            logger.error(f"Error obteniendo compras por estado: {e}")
-            raise
+        return [dict(row) for row in _cached_by_estado(estado)]
     
+    @log_errors(logger)
     def get_by_date_range(self, fecha_inicio: date, fecha_fin: date) -> List[Dict[str, Any]]:
-        try:
-            query = """
-                SELECT 
-                    c.*,
-                    p.razon_social as proveedor_nombre
-                FROM compras c
-                INNER JOIN proveedores p ON c.proveedor_id = p.id
-                WHERE c.fecha_compra BETWEEN %s AND %s
-                ORDER BY c.fecha_compra DESC
-            """
-            return execute_query(query, (fecha_inicio, fecha_fin)) or []
-        except Exception as e:
-            logger.error(f"Error obteniendo compras por rango de fechas: {e}")
-            raise
+        query = f"""
+            SELECT {_COMPRA_COLUMNS},
+                p.razon_social as proveedor_nombre
+            FROM compras c
+            INNER JOIN proveedores p ON c.proveedor_id = p.id
+            WHERE c.fecha_compra BETWEEN %s AND %s
+            ORDER BY c.fecha_compra DESC
+        """
+        return execute_query(query, (fecha_inicio, fecha_fin)) or []
     
+    @log_errors(logger)
+    def get_estadisticas_periodo(self, fecha_inicio: date, fecha_fin: date) -> Dict[str, Any]:
+        """
+        Cuenta y totaliza las compras de un período en una sola fila.
+        
+        Returns:
+            Dict: total_compras, compras_recibidas, compras_pendientes y
+                total_gastado (suma de las recibidas)
+        """
+        query = """
+            SELECT 
+                COUNT(*) as total_compras,
+                COUNT(*) FILTER (WHERE estado = 'recibida') as compras_recibidas,
+                COUNT(*) FILTER (WHERE estado = 'pendiente') as compras_pendientes,
+                COALESCE(SUM(total) FILTER (WHERE estado = 'recibida'), 0) as total_gastado
+            FROM compras
+            WHERE fecha_compra BETWEEN %s AND %s
+        """
+        return execute_query(query, (fecha_inicio, fecha_fin), fetch='one')
+    
+    @log_errors(logger)
     def get_detalle(self, compra_id: int) -> List[Dict[str, Any]]:
-        try:
-            query = """
-                SELECT 
-                    dc.*,
-                    p.codigo as producto_codigo,
-                    p.nombre as producto_nombre,
-                    p.unidad_medida
-                FROM detalle_compras dc
-                INNER JOIN productos p ON dc.producto_id = p.id
-                WHERE dc.compra_id = %s
-                ORDER BY dc.id
-            """
-            return execute_query(query, (compra_id,)) or []
-        except Exception as e:
-            logger.error(f"Error obteniendo detalle de compra: {e}")
-            raise
+        return [dict(row) for row in _cached_detalle(compra_id)]
     
     # ✅ CORREGIDO: Método insert() con validación robusta
-    def insert(self, datos_compra: Dict[str, Any]) -> int:
+    @staticmethod
+    def _validar_compra(datos_compra: Dict[str, Any]) -> None:
         """
-        Inserta compra y retorna ID REAL usando RETURNING (PostgreSQL)
+        Valida la cabecera de una compra antes de insertarla.
+        
+        Raises:
+            ValueError: Si falta algún campo obligatorio
         """
-        # ✅ Validar campos obligatorios ANTES de intentar insertar
         campos_obligatorios = [
             'numero_compra', 'proveedor_id', 'usuario_id', 'fecha_compra',
             'tipo_comprobante', 'subtotal', 'impuesto', 'total', 'estado'
@@ -133,34 +565,93 @@ class CompraRepository:
         for campo in campos_obligatorios:
             if campo not in datos_compra or datos_compra[campo] is None:
                 raise ValueError(f"Campo obligatorio faltante: {campo}")
+    
+    def insert(self, datos_compra: Dict[str, Any], *, cursor=None) -> int:
+        """
+        Inserta compra y retorna ID REAL usando RETURNING (PostgreSQL)
         
-        query = """
-            INSERT INTO compras (
-                numero_compra,
-                proveedor_id,
-                usuario_id,
-                fecha_compra,
-                subtotal,
-                impuesto,
-                total,
-                estado,
-                observaciones
-            ) VALUES (
-                %(numero_compra)s,
-                %(proveedor_id)s,
-                %(usuario_id)s,
-                %(fecha_compra)s,
-                %(subtotal)s,
-                %(impuesto)s,
-                %(total)s,
-                %(estado)s,
-                %(observaciones)s
-            ) RETURNING id
+        Args:
+            datos_compra (Dict): Cabecera de la compra
+            cursor (optional): Cursor de una transacción abierta; si se
+                indica no se hace commit
+        """
+        return self.insert_returning(datos_compra, cursor=cursor)['id']
+    
+    def insert_returning(self, datos_compra: Dict[str, Any], *, cursor=None) -> Dict[str, Any]:
         """
+        Inserta compra y retorna la fila completa (RETURNING *).
+        
+        Evita un find_by_id posterior para recargar la compra recién
+        creada (valores por defecto, fecha_creacion, etc.).
+        
+        Args:
+            datos_compra (Dict): Cabecera de la compra
+            cursor (optional): Cursor de una transacción abierta; si se
+                indica no se hace commit
+            
+        Returns:
+            Dict: Compra insertada
+        """
+        # ✅ Validar campos obligatorios ANTES de intentar insertar
+        self._validar_compra(datos_compra)
         
         try:
-            with get_db_cursor(dictionary=False) as (cursor, conn):
-                cursor.execute(query, datos_compra)
+            with write_scope(cursor) as cur:
+                cur.execute(_INSERT_COMPRA_SQL, datos_compra)
+                compra = _row_to_dict(cur, cur.fetchone())
+                
+                if not compra or compra['id'] is None:
+                    raise RuntimeError("No se obtuvo ID de la compra insertada")
+            if cursor is None:
+                _invalidate_cache()
+            
+            compra_id = compra['id']
+            if not isinstance(compra_id, int) or compra_id <= 0:
+                raise ValueError(f"ID de compra inválido retornado por PostgreSQL: {compra_id}")
+            
+            logger.info(f"✅ Compra insertada exitosamente con ID REAL: {compra_id}")
+            return compra
+                
+        except Exception as e:
+            logger.error(f"❌ Error CRÍTICO insertando compra: {str(e)}")
+            raise
+    
+    def insert_with_detalles(self, datos_compra: Dict[str, Any],
+                             detalles: List[Dict[str, Any]]) -> int:
+        """
+        Inserta la compra y todos sus detalles en una sola sentencia.
+        
+        Usa un CTE de escritura: la cabecera se inserta con RETURNING id y
+        los detalles se insertan a partir de arreglos paralelos (UNNEST)
+        con ese id. Un solo viaje al servidor y un solo commit.
+        
+        Args:
+            datos_compra (Dict): Cabecera (mismos campos que insert)
+            detalles (List[Dict]): Detalles con producto_id, cantidad,
+                precio_unitario y subtotal (sin compra_id)
+            
+        Returns:
+            int: ID REAL de la compra insertada
+        """
+        self._validar_compra(datos_compra)
+        
+        if not detalles:
+            raise ValueError("La compra debe incluir al menos un detalle")
+        for detalle_data in detalles:
+            for campo in ('producto_id', 'cantidad', 'precio_unitario', 'subtotal'):
+                if detalle_data.get(campo) is None:
+                    raise ValueError(f"Campo obligatorio faltante en detalle: {campo}")
+        
+        params = dict(datos_compra)
+        params.setdefault('observaciones', None)
+        params['producto_ids'] = [d['producto_id'] for d in detalles]
+        params['cantidades'] = [d['cantidad'] for d in detalles]
+        params['precios'] = [d['precio_unitario'] for d in detalles]
+        params['subtotales'] = [d['subtotal'] for d in detalles]
+        
+        try:
+            with get_write_cursor() as (cursor, conn):
+                cursor.execute(_INSERT_COMPRA_CON_DETALLES_SQL, params)
                 result = cursor.fetchone()
                 
                 if not result or result[0] is None:
@@ -168,23 +659,26 @@ class CompraRepository:
                 
                 compra_id = result[0]
                 conn.commit()
+                _invalidate_cache()
                 
-                if not isinstance(compra_id, int) or compra_id <= 0:
-                    raise ValueError(f"ID de compra inválido retornado por PostgreSQL: {compra_id}")
-                
-                logger.info(f"✅ Compra insertada exitosamente con ID REAL: {compra_id}")
+                logger.info(
+                    f"✅ Compra insertada con {len(detalles)} detalles en una sola sentencia | "
+                    f"ID: {compra_id}"
+                )
                 return compra_id
                 
         except Exception as e:
-            logger.error(f"❌ Error CRÍTICO insertando compra: {str(e)}")
-            if 'conn' in locals() and conn:
-                conn.rollback()
+            logger.error(f"❌ Error CRÍTICO insertando compra con detalles: {str(e)}")
             raise
     
-    # ✅ CORREGIDO: Sintaxis del parámetro + validación estricta
-    def insert_detalle(self, detalle_data: Dict[str, Any]) -> int:  # ← ¡CORREGIDO: detalle_data: Dict!
+    @staticmethod
+    def _validar_detalle(detalle_data: Dict[str, Any]) -> None:
         """
-        Inserta detalle de compra con validación estricta de compra_id
+        Valida un detalle de compra antes de insertarlo.
+        
+        Raises:
+            ValueError: Si falta compra_id o algún campo obligatorio, o si
+                hay campos desconocidos
         """
         # ✅ VALIDACIÓN 1: compra_id existe y es entero positivo
         if 'compra_id' not in detalle_data:
@@ -200,84 +694,157 @@ class CompraRepository:
             if campo not in detalle_data or detalle_data[campo] is None:
                 raise ValueError(f"Campo obligatorio faltante en detalle: {campo}")
         
+        # ✅ VALIDACIÓN 3: Sin columnas desconocidas
+        desconocidos = detalle_data.keys() - set(_DETALLE_COLUMNS)
+        if desconocidos:
+            raise ValueError(f"Campos desconocidos en detalle: {', '.join(sorted(desconocidos))}")
+    
+    # ✅ CORREGIDO: Sintaxis del parámetro + validación estricta
+    def insert_detalle(self, detalle_data: Dict[str, Any], *, cursor=None) -> int:  # ← ¡CORREGIDO: detalle_data: Dict!
+        """
+        Inserta detalle de compra con validación estricta de compra_id
+        
+        Args:
+            detalle_data (Dict): Datos del detalle
+            cursor (optional): Cursor de una transacción abierta; si se
+                indica no se hace commit
+        """
+        self._validar_detalle(detalle_data)
+        compra_id = detalle_data['compra_id']
+        
         try:
-            columns = ', '.join(detalle_data.keys())
-            placeholders = ', '.join([f"%({k})s" for k in detalle_data.keys()])
-            
-            query = f"""
-                INSERT INTO detalle_compras ({columns}) 
-                VALUES ({placeholders})
-                RETURNING id
-            """
-            
-            with get_db_cursor(dictionary=False) as (cursor, conn):
-                cursor.execute(query, detalle_data)
-                result = cursor.fetchone()
+            with write_scope(cursor) as cur:
+                cur.execute(_INSERT_DETALLE_SQL, detalle_data)
+                result = cur.fetchone()
                 
                 if not result or result[0] is None:
                     raise RuntimeError("No se obtuvo ID del detalle insertado")
                 
                 detalle_id = result[0]
-                conn.commit()
-                
-                logger.info(
-                    f"✅ Detalle insertado exitosamente | "
-                    f"Detalle ID: {detalle_id} | "
-                    f"Compra ID: {compra_id} | "
-                    f"Producto ID: {detalle_data['producto_id']}"
-                )
-                return detalle_id
+            if cursor is None:
+                _invalidate_cache()
+            
+            logger.info(
+                f"✅ Detalle insertado exitosamente | "
+                f"Detalle ID: {detalle_id} | "
+                f"Compra ID: {compra_id} | "
+                f"Producto ID: {detalle_data['producto_id']}"
+            )
+            return detalle_id
                 
         except Exception as e:
             logger.error(f"❌ Error CRÍTICO insertando detalle (compra_id={compra_id}): {str(e)}")
-            if 'conn' in locals() and conn:
-                conn.rollback()
             raise
     
-    def update(self, compra_id: int, datos: Dict[str, Any]) -> bool:
+    def bulk_insert_detalles(self, detalles: List[Dict[str, Any]]) -> List[int]:
+        """
+        Inserta todos los detalles de una compra en un solo viaje al servidor.
+        
+        Valida cada detalle y luego usa execute_values dentro de una única
+        transacción (un solo commit).
+        
+        Args:
+            detalles (List[Dict]): Detalles con compra_id, producto_id,
+                cantidad, precio_unitario y subtotal
+            
+        Returns:
+            List[int]: IDs de los detalles insertados, en orden
+        """
+        if not detalles:
+            return []
+        
+        for detalle_data in detalles:
+            self._validar_detalle(detalle_data)
+        
+        rows = [tuple(d[c] for c in _DETALLE_COLUMNS) for d in detalles]
+        
         try:
-            set_clause = ', '.join([f"{k} = %({k})s" for k in datos.keys()])
-            query = f"UPDATE {self.table_name} SET {set_clause} WHERE id = %(id)s"
+            detalle_ids = execute_bulk_insert(
+                'detalle_compras', _DETALLE_COLUMNS, rows, returning='id'
+            )
+            _invalidate_cache()
             
-            datos_completos = datos.copy()
-            datos_completos['id'] = compra_id
+            logger.info(
+                f"✅ {len(detalle_ids)} detalles insertados | "
+                f"Compra ID: {detalles[0]['compra_id']}"
+            )
+            return detalle_ids
             
-            with get_db_cursor() as (cursor, conn):
-                cursor.execute(query, datos_completos)
-                conn.commit()
-                return cursor.rowcount > 0
-                
         except Exception as e:
-            logger.error(f"Error actualizando compra: {e}")
+            logger.error(f"❌ Error CRÍTICO insertando detalles (compra_id={detalles[0]['compra_id']}): {str(e)}")
             raise
     
-    def update_estado(self, compra_id: int, nuevo_estado: str, fecha_recepcion: date = None) -> bool:
-        try:
-            datos = {'estado': nuevo_estado}
-            if fecha_recepcion:
-                datos['fecha_recepcion'] = fecha_recepcion
+    @log_errors(logger)
+    def update(self, compra_id: int, datos: Dict[str, Any], *, cursor=None) -> bool:
+        """
+        Actualiza columnas de una compra.
+        
+        Args:
+            compra_id (int): ID de la compra
+            datos (Dict): Columnas a actualizar
+            cursor (optional): Cursor de una transacción abierta; si se
+                indica no se hace commit
             
-            return self.update(compra_id, datos)
-        except Exception as e:
-            logger.error(f"Error actualizando estado: {e}")
-            raise
+        Returns:
+            bool: True si se actualizó la compra
+        """
+        return self.update_returning(compra_id, datos, cursor=cursor) is not None
     
-    def generate_numero_compra(self) -> str:
-        try:
-            current_year = datetime.now().year
-            query = """
-                SELECT numero_compra 
-                FROM compras 
-                WHERE numero_compra LIKE %s
-                ORDER BY id DESC 
-                LIMIT 1
-            """
-            result = execute_query(query, (f"COM-{current_year}-%",), fetch='one')
+    @log_errors(logger)
+    def update_returning(self, compra_id: int, datos: Dict[str, Any],
+                         *, cursor=None) -> Optional[Dict[str, Any]]:
+        """
+        Actualiza columnas de una compra y retorna la fila resultante.
+        
+        Args:
+            compra_id (int): ID de la compra
+            datos (Dict): Columnas a actualizar
+            cursor (optional): Cursor de una transacción abierta; si se
+                indica no se hace commit
             
-            new_number = int(result['numero_compra'].split('-')[-1]) + 1 if result else 1
-            numero_compra = f"COM-{current_year}-{new_number:03d}"
-            logger.info(f"Número de compra generado: {numero_compra}")
-            return numero_compra
-        except Exception as e:
-            logger.error(f"Error generando número: {e}")
-            raise
\ No newline at end of file
+        Returns:
+            Dict|None: Compra actualizada, o None si no existe
+        """
+        columns = tuple(sorted(datos))
+        query = _compile_update(self.table_name, columns) + " RETURNING *"
+        values = tuple(datos[column] for column in columns) + (compra_id,)
+        
+        with write_scope(cursor) as cur:
+            cur.execute(query, values)
+            compra = _row_to_dict(cur, cur.fetchone())
+        if cursor is None:
+            _invalidate_cache()
+        return compra
+    
+    @log_errors(logger)
+    def update_estado(self, compra_id: int, nuevo_estado: str, fecha_recepcion: date = None,
+                      *, cursor=None) -> bool:
+        with write_scope(cursor) as cur:
+            cur.execute(_UPDATE_ESTADO_SQL, (nuevo_estado, fecha_recepcion, compra_id))
+            updated = cur.rowcount > 0
+        if cursor is None:
+            _invalidate_cache()
+        return updated
+    
+    @log_errors(logger)
+    def reseed_numero_compra(self) -> None:
+        """Realinea la numeración del año actual tras un número duplicado"""
+        _reseed_numero_sequence(datetime.now().year)
+    
+    @log_errors(logger)
+    def generate_numero_compra(self) -> str:
+        """
+        Genera el siguiente número de compra (COM-AAAA-NNN).
+        
+        Usa una secuencia por año (compras_num_seq_AAAA): nextval es
+        atómico, así que dos compras simultáneas nunca reciben el mismo
+        número. La secuencia del año se crea la primera vez que se usa,
+        continuando desde el mayor número ya registrado.
+        """
+        current_year = datetime.now().year
+        sequence = _ensure_numero_sequence(current_year)
+        
+        result = execute_query("SELECT nextval(%s)", (sequence,), fetch='one', dictionary=False)
+        numero_compra = f"COM-{current_year}-{result[0]:03d}"
+        logger.info(f"Número de compra generado: {numero_compra}")
+        return numero_compra
\ No newline at end of file
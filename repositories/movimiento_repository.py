@@ -5,20 +5,57 @@ REPOSITORIO DE MOVIMIENTOS DE INVENTARIO
 """
 
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 from datetime import datetime, date
-from .base_repository import BaseRepository
-from config.database import execute_query
+from .base_repository import BaseRepository, log_errors
+from config.database import (
+    execute_query,
+    stream_query,
+    prepared_statement,
+    execute_bulk_insert
+)
 
 logger = logging.getLogger(__name__)
 
+# Columnas del movimiento que muestran el historial y los reportes
+_MOVIMIENTO_COLUMNS = """
+                mi.id, mi.producto_id, mi.tipo_movimiento, mi.cantidad,
+                mi.motivo, mi.referencia_id, mi.stock_anterior, mi.stock_nuevo,
+                mi.usuario_id, mi.observaciones, mi.fecha_movimiento"""
+
+# Historial con producto y usuario; {where} admite el filtro de keyset
+_HISTORIAL_SQL = """
+            SELECT {columns},
+                p.codigo as producto_codigo,
+                p.nombre as producto_nombre,
+                u.nombre_completo as usuario_nombre
+            FROM movimientos_inventario mi
+            INNER JOIN productos p ON mi.producto_id = p.id
+            INNER JOIN usuarios u ON mi.usuario_id = u.id
+            {where}
+            ORDER BY mi.fecha_movimiento DESC, mi.id DESC
+            LIMIT %s
+"""
+# LIMIT como parámetro: un solo plan preparado sirve para cualquier límite
+_FIRST_PAGE_SQL = prepared_statement(
+    'movimientos_recientes',
+    _HISTORIAL_SQL.format(columns=_MOVIMIENTO_COLUMNS, where="")
+)
+_NEXT_PAGE_SQL = prepared_statement('movimientos_pagina', _HISTORIAL_SQL.format(
+    columns=_MOVIMIENTO_COLUMNS,
+    where="WHERE (mi.fecha_movimiento, mi.id) < (%s, %s)"
+))
+
 
 class MovimientoRepository(BaseRepository):
     """Repositorio para gestionar movimientos de inventario"""
     
+    _ALLOWED_ORDER = BaseRepository._ALLOWED_ORDER | {"fecha_movimiento DESC"}
+    
     def __init__(self):
         super().__init__('movimientos_inventario')
     
+    @log_errors(logger)
     def get_all_with_details(self) -> List[Dict[str, Any]]:
         """
         Obtiene todos los movimientos con detalles de producto y usuario.
@@ -26,24 +63,20 @@ class MovimientoRepository(BaseRepository):
         Returns:
             List[Dict]: Lista de movimientos
         """
-        try:
-            query = """
-                SELECT 
-                    mi.*,
-                    p.codigo as producto_codigo,
-                    p.nombre as producto_nombre,
-                    u.nombre_completo as usuario_nombre
-                FROM movimientos_inventario mi
-                INNER JOIN productos p ON mi.producto_id = p.id
-                INNER JOIN usuarios u ON mi.usuario_id = u.id
-                ORDER BY mi.fecha_movimiento DESC
-                LIMIT 100
-            """
-            return execute_query(query) or []
-        except Exception as e:
-            logger.error(f"Error obteniendo movimientos con detalles: {e}")
-            raise
+        query = f"""
+            SELECT {_MOVIMIENTO_COLUMNS},
+                p.codigo as producto_codigo,
+                p.nombre as producto_nombre,
+                u.nombre_completo as usuario_nombre
+            FROM movimientos_inventario mi
+            INNER JOIN productos p ON mi.producto_id = p.id
+            INNER JOIN usuarios u ON mi.usuario_id = u.id
+            ORDER BY mi.fecha_movimiento DESC
+            LIMIT 100
+        """
+        return execute_query(query) or []
     
+    @log_errors(logger)
     def get_by_producto(self, producto_id: int) -> List[Dict[str, Any]]:
         """
         Obtiene movimientos de un producto específico.
@@ -54,21 +87,17 @@ class MovimientoRepository(BaseRepository):
         Returns:
             List[Dict]: Lista de movimientos
         """
-        try:
-            query = """
-                SELECT 
-                    mi.*,
-                    u.nombre_completo as usuario_nombre
-                FROM movimientos_inventario mi
-                INNER JOIN usuarios u ON mi.usuario_id = u.id
-                WHERE mi.producto_id = %s
-                ORDER BY mi.fecha_movimiento DESC
-            """
-            return execute_query(query, (producto_id,)) or []
-        except Exception as e:
-            logger.error(f"Error obteniendo movimientos por producto: {e}")
-            raise
+        query = f"""
+            SELECT {_MOVIMIENTO_COLUMNS},
+                u.nombre_completo as usuario_nombre
+            FROM movimientos_inventario mi
+            INNER JOIN usuarios u ON mi.usuario_id = u.id
+            WHERE mi.producto_id = %s
+            ORDER BY mi.fecha_movimiento DESC
+        """
+        return execute_query(query, (producto_id,)) or []
     
+    @log_errors(logger)
     def get_by_tipo(self, tipo_movimiento: str) -> List[Dict[str, Any]]:
         """
         Obtiene movimientos por tipo.
@@ -79,16 +108,13 @@ class MovimientoRepository(BaseRepository):
         Returns:
             List[Dict]: Lista de movimientos
         """
-        try:
-            return self.find_all(
-                conditions="tipo_movimiento = %s",
-                params=(tipo_movimiento,),
-                order_by="fecha_movimiento DESC"
-            )
-        except Exception as e:
-            logger.error(f"Error obteniendo movimientos por tipo: {e}")
-            raise
+        return self.find_all(
+            conditions="tipo_movimiento = %s",
+            params=(tipo_movimiento,),
+            order_by="fecha_movimiento DESC"
+        )
     
+    @log_errors(logger)
     def get_by_date_range(self, fecha_inicio: date, fecha_fin: date) -> List[Dict[str, Any]]:
         """
         Obtiene movimientos en un rango de fechas.
@@ -100,24 +126,54 @@ class MovimientoRepository(BaseRepository):
         Returns:
             List[Dict]: Lista de movimientos
         """
-        try:
-            query = """
-                SELECT 
-                    mi.*,
-                    p.codigo as producto_codigo,
-                    p.nombre as producto_nombre,
-                    u.nombre_completo as usuario_nombre
-                FROM movimientos_inventario mi
-                INNER JOIN productos p ON mi.producto_id = p.id
-                INNER JOIN usuarios u ON mi.usuario_id = u.id
-                WHERE DATE(mi.fecha_movimiento) BETWEEN %s AND %s
-                ORDER BY mi.fecha_movimiento DESC
-            """
-            return execute_query(query, (fecha_inicio, fecha_fin)) or []
-        except Exception as e:
-            logger.error(f"Error obteniendo movimientos por rango de fechas: {e}")
-            raise
+        query = f"""
+            SELECT {_MOVIMIENTO_COLUMNS},
+                p.codigo as producto_codigo,
+                p.nombre as producto_nombre,
+                u.nombre_completo as usuario_nombre
+            FROM movimientos_inventario mi
+            INNER JOIN productos p ON mi.producto_id = p.id
+            INNER JOIN usuarios u ON mi.usuario_id = u.id
+            WHERE mi.fecha_movimiento >= %s
+              AND mi.fecha_movimiento < (%s::date + INTERVAL '1 day')
+            ORDER BY mi.fecha_movimiento DESC
+        """
+        return execute_query(query, (fecha_inicio, fecha_fin)) or []
     
+    @log_errors(logger)
+    def aggregate_salidas(self, fecha_inicio: date, fecha_fin: date) -> List[Dict[str, Any]]:
+        """
+        Totaliza las salidas de cada producto en un rango de fechas.
+        
+        La agregación se hace en el servidor: se transfiere una fila por
+        producto y no una por movimiento.
+        
+        Args:
+            fecha_inicio (date): Fecha inicial
+            fecha_fin (date): Fecha final (incluida)
+            
+        Returns:
+            List[Dict]: producto_id, codigo, nombre, stock_actual,
+                cantidad_vendida y numero_ventas por producto
+        """
+        query = """
+            SELECT 
+                mi.producto_id,
+                p.codigo,
+                p.nombre,
+                p.stock_actual,
+                SUM(mi.cantidad) as cantidad_vendida,
+                COUNT(*) as numero_ventas
+            FROM movimientos_inventario mi
+            INNER JOIN productos p ON mi.producto_id = p.id
+            WHERE mi.tipo_movimiento = 'salida'
+              AND mi.fecha_movimiento >= %s
+              AND mi.fecha_movimiento < (%s::date + INTERVAL '1 day')
+            GROUP BY mi.producto_id, p.codigo, p.nombre, p.stock_actual
+        """
+        return execute_query(query, (fecha_inicio, fecha_fin)) or []
+    
+    @log_errors(logger)
     def get_movimientos_recientes(self, limit: int = 50) -> List[Dict[str, Any]]:
         """
         Obtiene los movimientos más recientes.
@@ -128,46 +184,104 @@ class MovimientoRepository(BaseRepository):
         Returns:
             List[Dict]: Lista de movimientos recientes
         """
-        try:
-            query = f"""
-                SELECT 
-                    mi.*,
-                    p.codigo as producto_codigo,
-                    p.nombre as producto_nombre,
-                    u.nombre_completo as usuario_nombre
-                FROM movimientos_inventario mi
-                INNER JOIN productos p ON mi.producto_id = p.id
-                INNER JOIN usuarios u ON mi.usuario_id = u.id
-                ORDER BY mi.fecha_movimiento DESC
-                LIMIT {limit}
-            """
-            return execute_query(query) or []
-        except Exception as e:
-            logger.error(f"Error obteniendo movimientos recientes: {e}")
-            raise
+        return execute_query(_FIRST_PAGE_SQL, (int(limit),)) or []
+    
+    @log_errors(logger)
+    def get_page(self, before: Optional[Tuple] = None,
+                 limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[Tuple]]:
+        """
+        Obtiene una página del historial, del movimiento más reciente al
+        más antiguo.
+        
+        Args:
+            before (tuple): Cursor (fecha_movimiento, id) devuelto por la
+                página anterior; None para la primera página
+            limit (int): Cantidad máxima de registros
+            
+        Returns:
+            tuple: (movimientos, siguiente_cursor); el cursor es None
+                cuando no quedan más páginas
+                
+        Example:
+            >>> movimientos, cursor = repo.get_page(limit=50)
+            >>> siguientes, cursor = repo.get_page(cursor, limit=50)
+        """
+        if before is None:
+            rows = execute_query(_FIRST_PAGE_SQL, (limit,)) or []
+        else:
+            rows = execute_query(_NEXT_PAGE_SQL, (*before, limit)) or []
+        
+        if len(rows) < limit:
+            return rows, None
+        return rows, (rows[-1]['fecha_movimiento'], rows[-1]['id'])
+    
+    def iter_all_with_details(self, chunk: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre todo el historial con un cursor del lado del servidor.
+        
+        Pensado para reportes y exportaciones: las filas llegan en bloques
+        de `chunk` y la conexión queda tomada mientras se consume el
+        iterador. Para listados en pantalla usar get_page().
+        
+        Args:
+            chunk (int): Filas por cada viaje al servidor
+            
+        Yields:
+            Dict: Movimiento con datos de producto y usuario
+        """
+        # LIMIT NULL equivale a sin límite
+        yield from stream_query(_FIRST_PAGE_SQL, (None,), itersize=chunk, real_dict=True)
     
-    def registrar_movimiento(self, movimiento_data: Dict[str, Any]) -> Optional[int]:
+    @log_errors(logger)
+    def registrar_movimiento(self, movimiento_data: Dict[str, Any],
+                             cursor=None) -> Optional[int]:
         """
         Registra un nuevo movimiento de inventario.
         Esta función es un alias de insert() con logging específico.
         
         Args:
             movimiento_data (Dict): Datos del movimiento
+            cursor (optional): Cursor de una transacción abierta; si se
+                indica no se hace commit
             
         Returns:
             int|None: ID del movimiento registrado
         """
-        try:
-            movimiento_id = self.insert(movimiento_data)
-            
-            if movimiento_id:
-                logger.info(
-                    f"Movimiento registrado: Producto {movimiento_data['producto_id']}, "
-                    f"Tipo {movimiento_data['tipo_movimiento']}, "
-                    f"Cantidad {movimiento_data['cantidad']}"
-                )
+        movimiento_id = self.insert(movimiento_data, cursor=cursor)
+        
+        if movimiento_id:
+            logger.info(
+                f"Movimiento registrado: Producto {movimiento_data['producto_id']}, "
+                f"Tipo {movimiento_data['tipo_movimiento']}, "
+                f"Cantidad {movimiento_data['cantidad']}"
+            )
+        
+        return movimiento_id
+    
+    @log_errors(logger)
+    def registrar_movimientos_bulk(self, movimientos: List[Dict[str, Any]],
+                                   cursor=None) -> List[int]:
+        """
+        Registra varios movimientos con un INSERT multi-fila.
+        
+        Todos los movimientos deben tener las mismas columnas.
+        
+        Args:
+            movimientos (List[Dict]): Datos de los movimientos
+            cursor (optional): Cursor de una transacción abierta; si se
+                indica no se hace commit
             
-            return movimiento_id
-        except Exception as e:
-            logger.error(f"Error registrando movimiento: {e}")
-            raise
\ No newline at end of file
+        Returns:
+            List[int]: IDs de los movimientos registrados, en orden
+        """
+        if not movimientos:
+            return []
+        
+        columns = list(movimientos[0])
+        rows = [tuple(m[c] for c in columns) for m in movimientos]
+        movimiento_ids = execute_bulk_insert(
+            self.table_name, columns, rows, returning='id', cursor=cursor
+        )
+        
+        logger.info(f"Movimientos registrados en bloque: {len(movimiento_ids)}")
+        return movimiento_ids
\ No newline at end of file
@@ -5,19 +5,102 @@ REPOSITORIO DE PRODUCTOS
 """
 
 import logging
-from typing import List, Dict, Any, Optional
-from .base_repository import BaseRepository
-from config.database import execute_query, get_db_cursor
+from typing import List, Dict, Any, Optional, Set, Tuple
+from datetime import date
+from .base_repository import BaseRepository, log_errors, write_scope, escape_like, load_many
+from config.database import execute_query, cached_query, prepared_statement
 
 logger = logging.getLogger(__name__)
 
 
+# Búsquedas puntuales de uso constante en el punto de venta; se
+# descartan en cada escritura sobre productos (incluido el stock)
+_LOOKUP_TTL = 300
+
+
+_BY_CODIGO_SQL = prepared_statement(
+    'producto_por_codigo',
+    "SELECT * FROM productos WHERE codigo = %s AND activo = TRUE"
+)
+
+
+@cached_query(ttl=_LOOKUP_TTL, maxsize=1024)
+def _cached_by_codigo(codigo: str):
+    """Producto activo por código"""
+    return execute_query(_BY_CODIGO_SQL, (codigo,), fetch='one')
+
+
+_EXISTING_IDS_SQL = "SELECT id FROM productos WHERE id = ANY(%s)"
+
+
+# Un solo texto de sentencia para sumar y restar (delta con signo); el
+# CHECK stock_actual >= 0 de sql/optimizaciones_postgresql.sql rechaza
+# en la misma sentencia una salida mayor que el stock
+_UPDATE_STOCK_SQL = "UPDATE productos SET stock_actual = stock_actual + %s WHERE id = %s"
+# Bloqueo de las filas en orden de id antes del incremento en bloque: el
+# UPDATE ... FROM no bloquea en un orden fijo y dos transacciones con los
+# mismos productos en distinto orden podrían bloquearse mutuamente
+_LOCK_STOCKS_SQL = "SELECT id FROM productos WHERE id = ANY(%s) ORDER BY id FOR UPDATE"
+# Incremento en bloque con el stock anterior y el nuevo de cada producto
+_INCREMENT_STOCKS_SQL = """
+    UPDATE productos p
+    SET stock_actual = p.stock_actual + v.cantidad
+    FROM unnest(%s::int[], %s::int[]) AS v(id, cantidad)
+    WHERE p.id = v.id
+    RETURNING p.id, p.stock_actual - v.cantidad, p.stock_actual
+"""
+
+# Columnas de los listados de productos: lo que leen las tablas, filtros
+# y formularios de la UI; descripcion y las fechas de auditoría quedan
+# para find_by_id (p. ej. el formulario de edición)
+_LIST_COLUMNS = """
+        p.id,
+        p.codigo,
+        p.nombre,
+        p.categoria_id,
+        p.precio_compra,
+        p.precio_venta,
+        p.stock_actual,
+        p.stock_minimo,
+        p.unidad_medida,
+        p.activo"""
+
+# Búsqueda en dos pasos: prefijo (btree text_pattern_ops) y, si faltan
+# filas para el límite, subcadena (trigram) sin repetir los ya hallados
+_SEARCH_LIMIT = 50
+_SEARCH_SELECT = f"""
+    SELECT {_LIST_COLUMNS},
+        c.nombre as categoria_nombre
+    FROM productos p
+    INNER JOIN categorias c ON p.categoria_id = c.id
+"""
+_SEARCH_PREFIX_SQL = _SEARCH_SELECT + """
+    WHERE (p.codigo LIKE %s ESCAPE '\\' OR p.nombre LIKE %s ESCAPE '\\')
+      AND p.activo = TRUE
+    ORDER BY p.nombre ASC
+    LIMIT %s
+"""
+_SEARCH_SUBSTRING_SQL = _SEARCH_SELECT + """
+    WHERE (p.codigo LIKE %s ESCAPE '\\' OR p.nombre LIKE %s ESCAPE '\\')
+      AND p.activo = TRUE
+      AND p.id <> ALL(%s::int[])
+    ORDER BY p.nombre ASC
+    LIMIT %s
+"""
+
+
 class ProductoRepository(BaseRepository):
     """Repositorio para gestionar productos"""
     
+    _ALLOWED_ORDER = BaseRepository._ALLOWED_ORDER | {"nombre ASC"}
+    
     def __init__(self):
         super().__init__('productos')
     
+    def _after_write(self) -> None:
+        _cached_by_codigo.cache_clear()
+    
+    @log_errors(logger)
     def get_all_with_category(self) -> List[Dict[str, Any]]:
         """
         Obtiene todos los productos con información de categoría.
@@ -25,21 +108,17 @@ class ProductoRepository(BaseRepository):
         Returns:
             List[Dict]: Lista de productos con categoría
         """
-        try:
-            query = """
-                SELECT 
-                    p.*,
-                    c.nombre as categoria_nombre
-                FROM productos p
-                INNER JOIN categorias c ON p.categoria_id = c.id
-                WHERE p.activo = TRUE
-                ORDER BY p.nombre ASC
-            """
-            return execute_query(query) or []
-        except Exception as e:
-            logger.error(f"Error obteniendo productos con categoría: {e}")
-            raise
+        query = f"""
+            SELECT {_LIST_COLUMNS},
+                c.nombre as categoria_nombre
+            FROM productos p
+            INNER JOIN categorias c ON p.categoria_id = c.id
+            WHERE p.activo = TRUE
+            ORDER BY p.nombre ASC
+        """
+        return execute_query(query) or []
     
+    @log_errors(logger)
     def find_by_codigo(self, codigo: str) -> Optional[Dict[str, Any]]:
         """
         Busca un producto ACTIVO por su código.
@@ -50,14 +129,33 @@ class ProductoRepository(BaseRepository):
         Returns:
             Dict|None: Producto encontrado o None
         """
-        try:
-            # ✅ Solo busca productos ACTIVOS
-            query = "SELECT * FROM productos WHERE codigo = %s AND activo = TRUE"
-            return execute_query(query, (codigo,), fetch='one')
-        except Exception as e:
-            logger.error(f"Error buscando producto por código: {e}")
-            raise
+        # ✅ Solo busca productos ACTIVOS
+        producto = _cached_by_codigo(codigo)
+        return dict(producto) if producto else None
     
+    @log_errors(logger)
+    def exists_many(self, producto_ids: List[int]) -> Set[int]:
+        """
+        Indica cuáles de los IDs corresponden a productos existentes.
+        
+        Los IDs ya verificados en la petición actual (request_scope) se
+        toman de la caché por ID; los demás se consultan juntos con un
+        solo id = ANY(...). La caché no depende del stock, así que las
+        actualizaciones de stock no la invalidan.
+        
+        Args:
+            producto_ids (List[int]): IDs a verificar
+            
+        Returns:
+            Set[int]: Subconjunto de los IDs que existen
+        """
+        def fetch_many(ids):
+            rows = execute_query(_EXISTING_IDS_SQL, (ids,), dictionary=False) or []
+            return {row[0]: {'id': row[0]} for row in rows}
+        
+        return set(load_many(self, 'exists', producto_ids, fetch_many))
+    
+    @log_errors(logger)
     def get_by_category(self, categoria_id: int) -> List[Dict[str, Any]]:
         """
         Obtiene productos de una categoría específica.
@@ -68,16 +166,13 @@ class ProductoRepository(BaseRepository):
         Returns:
             List[Dict]: Lista de productos
         """
-        try:
-            return self.find_all(
-                conditions="categoria_id = %s AND activo = TRUE",
-                params=(categoria_id,),
-                order_by="nombre ASC"
-            )
-        except Exception as e:
-            logger.error(f"Error obteniendo productos por categoría: {e}")
-            raise
+        return self.find_all(
+            conditions="categoria_id = %s AND activo = TRUE",
+            params=(categoria_id,),
+            order_by="nombre ASC"
+        )
     
+    @log_errors(logger)
     def get_low_stock(self) -> List[Dict[str, Any]]:
         """
         Obtiene productos con stock bajo o igual al mínimo.
@@ -85,24 +180,21 @@ class ProductoRepository(BaseRepository):
         Returns:
             List[Dict]: Lista de productos con stock bajo
         """
-        try:
-            query = """
-                SELECT 
-                    p.*,
-                    c.nombre as categoria_nombre,
-                    (p.stock_minimo - p.stock_actual) as cantidad_requerida
-                FROM productos p
-                INNER JOIN categorias c ON p.categoria_id = c.id
-                WHERE p.stock_actual <= p.stock_minimo 
-                  AND p.activo = TRUE
-                ORDER BY cantidad_requerida DESC
-            """
-            return execute_query(query) or []
-        except Exception as e:
-            logger.error(f"Error obteniendo productos con stock bajo: {e}")
-            raise
+        query = f"""
+            SELECT {_LIST_COLUMNS},
+                c.nombre as categoria_nombre,
+                (p.stock_minimo - p.stock_actual) as cantidad_requerida
+            FROM productos p
+            INNER JOIN categorias c ON p.categoria_id = c.id
+            WHERE p.stock_actual <= p.stock_minimo 
+              AND p.activo = TRUE
+            ORDER BY cantidad_requerida DESC
+        """
+        return execute_query(query) or []
     
-    def update_stock(self, producto_id: int, cantidad: int, operacion: str = 'sumar') -> bool:
+    @log_errors(logger)
+    def update_stock(self, producto_id: int, cantidad: int, operacion: str = 'sumar',
+                     cursor=None) -> bool:
         """
         Actualiza el stock de un producto.
         
@@ -110,75 +202,176 @@ class ProductoRepository(BaseRepository):
             producto_id (int): ID del producto
             cantidad (int): Cantidad a sumar o restar
             operacion (str): 'sumar' o 'restar'
+            cursor (optional): Cursor de la transacción de la venta o
+                compra; si se indica no se hace commit ni se toma otra
+                conexión del pool
             
         Returns:
             bool: True si se actualizó correctamente
         """
-        try:
-            if operacion == 'sumar':
-                query = "UPDATE productos SET stock_actual = stock_actual + %s WHERE id = %s"
-            else:  # restar
-                query = "UPDATE productos SET stock_actual = stock_actual - %s WHERE id = %s"
-            
-            with get_db_cursor() as (cursor, conn):
-                cursor.execute(query, (cantidad, producto_id))
-                conn.commit()
-                
-                if cursor.rowcount > 0:
-                    logger.info(f"Stock actualizado: Producto {producto_id}, {operacion} {cantidad}")
-                    return True
-                return False
-                
-        except Exception as e:
-            logger.error(f"Error actualizando stock: {e}")
-            raise
+        delta = cantidad if operacion == 'sumar' else -cantidad
+        
+        with write_scope(cursor) as cur:
+            cur.execute(_UPDATE_STOCK_SQL, (delta, producto_id))
+            actualizado = cur.rowcount > 0
+        if cursor is None:
+            self._after_write()
+        
+        if actualizado:
+            logger.info(f"Stock actualizado: Producto {producto_id}, {operacion} {cantidad}")
+        return actualizado
     
-    def get_stock_actual(self, producto_id: int) -> Optional[int]:
+    @log_errors(logger)
+    def get_stock_actual(self, producto_id: int, cursor=None) -> Optional[int]:
         """
         Obtiene el stock actual de un producto.
         
         Args:
             producto_id (int): ID del producto
+            cursor (optional): Cursor de tuplas de una transacción abierta,
+                para ver el stock que esa transacción ya modificó
             
         Returns:
             int|None: Stock actual o None
         """
-        try:
-            query = "SELECT stock_actual FROM productos WHERE id = %s"
-            result = execute_query(query, (producto_id,), fetch='one')
-            return result['stock_actual'] if result else None
-        except Exception as e:
-            logger.error(f"Error obteniendo stock actual: {e}")
-            raise
+        query = "SELECT stock_actual FROM productos WHERE id = %s"
+        if cursor is not None:
+            cursor.execute(query, (producto_id,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+        result = execute_query(query, (producto_id,), fetch='one')
+        return result['stock_actual'] if result else None
     
+    @log_errors(logger)
+    def increment_stocks_returning(self, deltas: Dict[int, int],
+                                   cursor=None) -> Dict[int, Tuple[int, int]]:
+        """
+        Suma stock a varios productos y retorna el stock antes y después.
+        
+        Las filas se bloquean primero en orden de id (SELECT ... FOR
+        UPDATE) y luego un solo UPDATE ... FROM unnest(ids, cantidades)
+        con RETURNING aplica los cambios: no hace falta leer el stock
+        antes de escribirlo, y los valores retornados son los de la propia
+        fila bloqueada, así que no hay carrera entre la lectura y la
+        escritura.
+        
+        Args:
+            deltas (Dict[int, int]): {producto_id: cantidad con signo}
+            cursor (optional): Cursor de tuplas de una transacción abierta;
+                si se indica no se hace commit
+            
+        Returns:
+            Dict[int, Tuple[int, int]]: {producto_id: (stock_anterior, stock_nuevo)}
+                de los productos actualizados
+        """
+        if not deltas:
+            return {}
+        
+        ids = sorted(deltas)
+        with write_scope(cursor) as cur:
+            cur.execute(_LOCK_STOCKS_SQL, (ids,))
+            cur.execute(_INCREMENT_STOCKS_SQL, (ids, [deltas[i] for i in ids]))
+            stocks = {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+        if cursor is None:
+            self._after_write()
+        
+        logger.info(f"Stock actualizado en bloque: {len(stocks)} productos")
+        return stocks
+    
+    @log_errors(logger)
     def search(self, term: str) -> List[Dict[str, Any]]:
         """
         Busca productos por código o nombre.
         
+        Primero busca por prefijo (lo que se escribe en el autocompletado),
+        que resuelve un índice btree text_pattern_ops; solo si no llena el
+        límite completa con coincidencias por subcadena (índices trigram),
+        excluyendo los ya encontrados. Los resultados por prefijo van
+        primero.
+        
         Args:
             term (str): Término de búsqueda
             
         Returns:
             List[Dict]: Productos encontrados
         """
-        try:
-            query = """
-                SELECT 
-                    p.*,
-                    c.nombre as categoria_nombre
-                FROM productos p
-                INNER JOIN categorias c ON p.categoria_id = c.id
-                WHERE (p.codigo LIKE %s OR p.nombre LIKE %s)
-                  AND p.activo = TRUE
-                ORDER BY p.nombre ASC
-                LIMIT 50
-            """
-            search_term = f"%{term}%"
-            return execute_query(query, (search_term, search_term)) or []
-        except Exception as e:
-            logger.error(f"Error buscando productos: {e}")
-            raise
+        safe_term = escape_like(term)
+        
+        prefix_term = f"{safe_term}%"
+        productos = execute_query(
+            _SEARCH_PREFIX_SQL, (prefix_term, prefix_term, _SEARCH_LIMIT)
+        ) or []
+        if len(productos) >= _SEARCH_LIMIT:
+            return productos
+        
+        search_term = f"%{safe_term}%"
+        encontrados = [p['id'] for p in productos]
+        productos += execute_query(
+            _SEARCH_SUBSTRING_SQL,
+            (search_term, search_term, encontrados, _SEARCH_LIMIT - len(productos))
+        ) or []
+        return productos
+    
+    @log_errors(logger)
+    def get_inventario_aggregates(self) -> Dict[str, Any]:
+        """
+        Calcula los totales del inventario activo en una sola consulta.
+        
+        Returns:
+            Dict: total_productos, total_unidades, valor_compra y
+                valor_venta (0 si no hay productos activos)
+        """
+        query = """
+            SELECT 
+                COUNT(*) as total_productos,
+                COALESCE(SUM(stock_actual), 0) as total_unidades,
+                COALESCE(SUM(stock_actual * precio_compra), 0) as valor_compra,
+                COALESCE(SUM(stock_actual * precio_venta), 0) as valor_venta
+            FROM productos
+            WHERE activo = TRUE
+        """
+        return execute_query(query, fetch='one')
     
+    @log_errors(logger)
+    def get_sin_movimiento(self, fecha_limite: date) -> List[Dict[str, Any]]:
+        """
+        Obtiene los productos activos sin movimientos desde una fecha.
+        
+        Una sola consulta: el último movimiento de cada producto sale de
+        un GROUP BY sobre movimientos_inventario, en lugar de leer el
+        historial completo de cada producto.
+        
+        Args:
+            fecha_limite (date): Productos cuyo último movimiento es
+                anterior a esta fecha (o que nunca se movieron)
+            
+        Returns:
+            List[Dict]: Productos con categoria_nombre y ultimo_movimiento
+                (None si nunca tuvieron movimientos)
+        """
+        query = """
+            SELECT 
+                p.id,
+                p.codigo,
+                p.nombre,
+                p.stock_actual,
+                p.precio_venta,
+                c.nombre as categoria_nombre,
+                m.ultimo_movimiento
+            FROM productos p
+            INNER JOIN categorias c ON p.categoria_id = c.id
+            LEFT JOIN (
+                SELECT producto_id, MAX(fecha_movimiento) as ultimo_movimiento
+                FROM movimientos_inventario
+                GROUP BY producto_id
+            ) m ON m.producto_id = p.id
+            WHERE p.activo = TRUE
+              AND (m.ultimo_movimiento IS NULL OR m.ultimo_movimiento < %s)
+            ORDER BY p.nombre ASC
+        """
+        return execute_query(query, (fecha_limite,)) or []
+    
+    @log_errors(logger)
     def get_all_inactive(self) -> List[Dict[str, Any]]:
         """
         Obtiene todos los productos INACTIVOS con información de categoría.
@@ -186,17 +379,12 @@ class ProductoRepository(BaseRepository):
         Returns:
             List[Dict]: Lista de productos inactivos
         """
-        try:
-            query = """
-                SELECT 
-                    p.*,
-                    c.nombre as categoria_nombre
-                FROM productos p
-                INNER JOIN categorias c ON p.categoria_id = c.id
-                WHERE p.activo = FALSE
-                ORDER BY p.nombre ASC
-            """
-            return execute_query(query) or []
-        except Exception as e:
-            logger.error(f"Error obteniendo productos inactivos: {e}")
-            raise
\ No newline at end of file
+        query = f"""
+            SELECT {_LIST_COLUMNS},
+                c.nombre as categoria_nombre
+            FROM productos p
+            INNER JOIN categorias c ON p.categoria_id = c.id
+            WHERE p.activo = FALSE
+            ORDER BY p.nombre ASC
+        """
+        return execute_query(query) or []
\ No newline at end of file
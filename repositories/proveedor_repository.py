@@ -6,29 +6,71 @@ REPOSITORIO DE PROVEEDORES
 
 import logging
 from typing import List, Dict, Any, Optional
-from .base_repository import BaseRepository
-from config.database import execute_query
+from .base_repository import BaseRepository, log_errors, escape_like
+from config.database import execute_query, cached_query, prepared_statement
 
 logger = logging.getLogger(__name__)
 
 
+# Búsquedas por RUC (al registrar proveedores) y por ID (al validar
+# compras); se descartan en cada escritura
+_LOOKUP_TTL = 300
+
+
+_BY_RUC_SQL = prepared_statement(
+    'proveedor_por_ruc',
+    "SELECT * FROM proveedores WHERE ruc = %s"
+)
+_BY_ID_SQL = prepared_statement(
+    'proveedor_por_id',
+    "SELECT * FROM proveedores WHERE id = %s"
+)
+
+
+@cached_query(ttl=_LOOKUP_TTL, maxsize=1024)
+def _cached_by_ruc(ruc: str):
+    """Proveedor por RUC"""
+    return execute_query(_BY_RUC_SQL, (ruc,), fetch='one')
+
+
+@cached_query(ttl=_LOOKUP_TTL, maxsize=1024)
+def _cached_by_id(proveedor_id: int):
+    """Proveedor por ID"""
+    return execute_query(_BY_ID_SQL, (proveedor_id,), fetch='one')
+
+
 class ProveedorRepository(BaseRepository):
     """Repositorio para gestionar proveedores"""
     
+    _ALL_ACTIVE_SQL = "SELECT * FROM proveedores WHERE activo = TRUE ORDER BY razon_social ASC"
+    
     def __init__(self):
         super().__init__('proveedores')
     
+    def _after_write(self) -> None:
+        _cached_by_ruc.cache_clear()
+        _cached_by_id.cache_clear()
+    
+    @log_errors(logger)
+    def find_by_id(self, id: int) -> Optional[Dict[str, Any]]:
+        """
+        Busca un proveedor por su ID (cacheado).
+        
+        Args:
+            id (int): ID del proveedor
+            
+        Returns:
+            Dict|None: Proveedor encontrado o None
+        """
+        proveedor = _cached_by_id(id)
+        return dict(proveedor) if proveedor else None
+    
+    @log_errors(logger)
     def get_all_active(self) -> List[Dict[str, Any]]:
         """Obtiene todos los proveedores activos"""
-        try:
-            return self.find_all(
-                conditions="activo = TRUE",
-                order_by="razon_social ASC"
-            )
-        except Exception as e:
-            logger.error(f"Error obteniendo proveedores activos: {e}")
-            raise
+        return execute_query(self._ALL_ACTIVE_SQL) or []
     
+    @log_errors(logger)
     def find_by_ruc(self, ruc: str) -> Optional[Dict[str, Any]]:
         """
         Busca un proveedor por RUC.
@@ -39,13 +81,10 @@ class ProveedorRepository(BaseRepository):
         Returns:
             Dict|None: Proveedor encontrado o None
         """
-        try:
-            query = "SELECT * FROM proveedores WHERE ruc = %s"
-            return execute_query(query, (ruc,), fetch='one')
-        except Exception as e:
-            logger.error(f"Error buscando proveedor por RUC: {e}")
-            raise
+        proveedor = _cached_by_ruc(ruc)
+        return dict(proveedor) if proveedor else None
     
+    @log_errors(logger)
     def search(self, term: str) -> List[Dict[str, Any]]:
         """
         Busca proveedores por RUC o razón social.
@@ -56,16 +95,12 @@ class ProveedorRepository(BaseRepository):
         Returns:
             List[Dict]: Proveedores encontrados
         """
-        try:
-            query = """
-                SELECT * FROM proveedores
-                WHERE (ruc LIKE %s OR razon_social LIKE %s)
-                  AND activo = TRUE
-                ORDER BY razon_social ASC
-                LIMIT 50
-            """
-            search_term = f"%{term}%"
-            return execute_query(query, (search_term, search_term)) or []
-        except Exception as e:
-            logger.error(f"Error buscando proveedores: {e}")
-            raise
\ No newline at end of file
+        query = """
+            SELECT * FROM proveedores
+            WHERE (ruc LIKE %s ESCAPE '\\' OR razon_social LIKE %s ESCAPE '\\')
+              AND activo = TRUE
+            ORDER BY razon_social ASC
+            LIMIT 50
+        """
+        search_term = f"%{escape_like(term)}%"
+        return execute_query(query, (search_term, search_term)) or []
\ No newline at end of file
@@ -6,29 +6,58 @@ REPOSITORIO DE USUARIOS
 
 import logging
 from typing import List, Dict, Any, Optional
-from .base_repository import BaseRepository
-from config.database import execute_query
+from .base_repository import BaseRepository, log_errors
+from config.database import execute_query, cached_query, prepared_statement
 
 logger = logging.getLogger(__name__)
 
 
+# Búsquedas de login; se descartan en cada escritura sobre usuarios
+_LOOKUP_TTL = 300
+
+
+_BY_USERNAME_SQL = prepared_statement(
+    'usuario_por_nombre',
+    "SELECT * FROM usuarios WHERE nombre_usuario = %s"
+)
+_BY_EMAIL_SQL = prepared_statement(
+    'usuario_por_email',
+    "SELECT * FROM usuarios WHERE email = %s"
+)
+
+
+@cached_query(ttl=_LOOKUP_TTL, maxsize=1024)
+def _cached_by_username(nombre_usuario: str):
+    """Usuario por nombre de usuario"""
+    return execute_query(_BY_USERNAME_SQL, (nombre_usuario,), fetch='one')
+
+
+@cached_query(ttl=_LOOKUP_TTL, maxsize=1024)
+def _cached_by_email(email: str):
+    """Usuario por email"""
+    return execute_query(_BY_EMAIL_SQL, (email,), fetch='one')
+
+
 class UsuarioRepository(BaseRepository):
     """Repositorio para gestionar usuarios"""
     
+    _ALLOWED_ORDER = BaseRepository._ALLOWED_ORDER | {"nombre_completo ASC"}
+    
+    _ALL_ACTIVE_SQL = "SELECT * FROM usuarios WHERE activo = TRUE ORDER BY nombre_completo ASC"
+    
     def __init__(self):
         super().__init__('usuarios')
     
+    def _after_write(self) -> None:
+        _cached_by_username.cache_clear()
+        _cached_by_email.cache_clear()
+    
+    @log_errors(logger)
     def get_all_active(self) -> List[Dict[str, Any]]:
         """Obtiene todos los usuarios activos"""
-        try:
-            return self.find_all(
-                conditions="activo = TRUE",
-                order_by="nombre_completo ASC"
-            )
-        except Exception as e:
-            logger.error(f"Error obteniendo usuarios activos: {e}")
-            raise
+        return execute_query(self._ALL_ACTIVE_SQL) or []
     
+    @log_errors(logger)
     def find_by_username(self, nombre_usuario: str) -> Optional[Dict[str, Any]]:
         """
         Busca un usuario por nombre de usuario.
@@ -39,13 +68,10 @@ class UsuarioRepository(BaseRepository):
         Returns:
             Dict|None: Usuario encontrado o None
         """
-        try:
-            query = "SELECT * FROM usuarios WHERE nombre_usuario = %s"
-            return execute_query(query, (nombre_usuario,), fetch='one')
-        except Exception as e:
-            logger.error(f"Error buscando usuario por username: {e}")
-            raise
+        usuario = _cached_by_username(nombre_usuario)
+        return dict(usuario) if usuario else None
     
+    @log_errors(logger)
     def find_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """
         Busca un usuario por email.
@@ -56,13 +82,10 @@ class UsuarioRepository(BaseRepository):
         Returns:
             Dict|None: Usuario encontrado o None
         """
-        try:
-            query = "SELECT * FROM usuarios WHERE email = %s"
-            return execute_query(query, (email,), fetch='one')
-        except Exception as e:
-            logger.error(f"Error buscando usuario por email: {e}")
-            raise
+        usuario = _cached_by_email(email)
+        return dict(usuario) if usuario else None
     
+    @log_errors(logger)
     def get_by_rol(self, rol: str) -> List[Dict[str, Any]]:
         """
         Obtiene usuarios por rol.
@@ -73,12 +96,8 @@ class UsuarioRepository(BaseRepository):
         Returns:
             List[Dict]: Lista de usuarios
         """
-        try:
-            return self.find_all(
-                conditions="rol = %s AND activo = TRUE",
-                params=(rol,),
-                order_by="nombre_completo ASC"
-            )
-        except Exception as e:
-            logger.error(f"Error obteniendo usuarios por rol: {e}")
-            raise
\ No newline at end of file
+        return self.find_all(
+            conditions="rol = %s AND activo = TRUE",
+            params=(rol,),
+            order_by="nombre_completo ASC"
+        )
\ No newline at end of file
@@ -5,44 +5,329 @@ REPOSITORIO DE VENTAS - POSTGRESQL
 """
 
 import logging
-from typing import List, Dict, Any, Optional
-from datetime import datetime, date
-from .base_repository import BaseRepository
-from config.database import execute_query, get_db_cursor
+import threading
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from datetime import datetime, date, timedelta
+from .base_repository import BaseRepository, log_errors, write_scope
+from config.database import (
+    execute_query,
+    get_write_cursor,
+    execute_bulk_insert,
+    stream_query,
+    prepared_statement
+)
 
 logger = logging.getLogger(__name__)
 
+# ============================================
+# NUMERACIÓN DE VENTAS (venta_counters)
+# ============================================
+# Un contador por prefijo y año; el incremento es una sola sentencia
+# con bloqueo de fila, así que dos ventas simultáneas nunca reciben el
+# mismo número
+_CREATE_COUNTERS_SQL = """
+    CREATE TABLE IF NOT EXISTS venta_counters (
+        prefijo VARCHAR(8) NOT NULL,
+        anio INT NOT NULL,
+        last_number INT NOT NULL,
+        PRIMARY KEY (prefijo, anio)
+    )
+"""
+_NEXT_NUMBER_SQL = """
+    UPDATE venta_counters
+    SET last_number = last_number + 1
+    WHERE prefijo = %s AND anio = %s
+    RETURNING last_number
+"""
+# Primera venta del prefijo/año: continúa desde el mayor número registrado
+_SEED_COUNTER_SQL = """
+    INSERT INTO venta_counters (prefijo, anio, last_number)
+    VALUES (%s, %s, COALESCE((
+        SELECT MAX(split_part(numero_venta, '-', 3)::int)
+        FROM ventas
+        WHERE numero_venta ~ %s
+    ), 0) + 1)
+    ON CONFLICT (prefijo, anio)
+    DO UPDATE SET last_number = venta_counters.last_number + 1
+    RETURNING last_number
+"""
+
+# Contador ya creado pero sin fila para el prefijo/año: la crea con el
+# mayor número registrado, sin consumir número (lo hace el INSERT)
+_INIT_COUNTER_SQL = """
+    INSERT INTO venta_counters (prefijo, anio, last_number)
+    VALUES (%s, %s, COALESCE((
+        SELECT MAX(split_part(numero_venta, '-', 3)::int)
+        FROM ventas
+        WHERE numero_venta ~ %s
+    ), 0))
+    ON CONFLICT (prefijo, anio) DO NOTHING
+"""
+# Numera e inserta la venta en una sola sentencia: el UPDATE del contador
+# y el INSERT van en el mismo viaje y en la misma transacción. Sin fila
+# de contador no inserta nada (ver _INIT_COUNTER_SQL).
+_INSERT_NUMERADA_SQL = """
+    WITH n AS (
+        UPDATE venta_counters
+        SET last_number = last_number + 1
+        WHERE prefijo = %(prefijo)s AND anio = %(anio)s
+        RETURNING last_number
+    )
+    INSERT INTO ventas (
+        numero_venta,
+        cliente_id,
+        usuario_id,
+        fecha_venta,
+        tipo_comprobante,
+        metodo_pago,
+        subtotal,
+        impuesto,
+        descuento,
+        total,
+        estado,
+        observaciones
+    )
+    SELECT
+        %(prefijo)s || '-' || %(anio)s::text || '-'
+            || lpad(n.last_number::text, GREATEST(4, length(n.last_number::text)), '0'),
+        %(cliente_id)s,
+        %(usuario_id)s,
+        %(fecha_venta)s,
+        %(tipo_comprobante)s,
+        %(metodo_pago)s,
+        %(subtotal)s,
+        %(impuesto)s,
+        %(descuento)s,
+        %(total)s,
+        %(estado)s,
+        %(observaciones)s
+    FROM n
+    RETURNING id, numero_venta
+"""
+_PREFIJOS = {
+    'boleta': 'BOL',
+    'factura': 'FAC',
+    'ticket': 'TIC'
+}
+
+_counters_ready = False
+_counters_lock = threading.Lock()
+
+
+def _ensure_counters_table() -> None:
+    """Crea la tabla venta_counters una sola vez por proceso"""
+    global _counters_ready
+    if _counters_ready:
+        return
+    with _counters_lock:
+        if _counters_ready:
+            return
+        with get_write_cursor() as (cursor, conn):
+            cursor.execute(_CREATE_COUNTERS_SQL)
+            conn.commit()
+        _counters_ready = True
+
+
+# ============================================
+# TOTALES POR PERÍODO
+# ============================================
+# Solo se cachean días ya cerrados (anteriores a hoy); el día en curso se
+# consulta siempre. Una venta registrada o anulada con fecha pasada
+# descarta los períodos que contienen esa fecha.
+_TOTAL_PERIODO_SQL = """
+    SELECT COALESCE(SUM(total), 0)
+    FROM ventas
+    WHERE fecha_venta BETWEEN %s AND %s
+      AND estado = 'completada'
+"""
+_ANULAR_SQL = "UPDATE ventas SET estado = 'anulada' WHERE id = %s RETURNING fecha_venta"
+_TOTALES_MAXSIZE = 256
+_totales_cache: Dict[Tuple[date, date], float] = {}
+_totales_lock = threading.Lock()
+
+
+def _query_total(fecha_inicio: date, fecha_fin: date) -> float:
+    """Suma de ventas completadas del período, siempre desde la base"""
+    result = execute_query(_TOTAL_PERIODO_SQL, (fecha_inicio, fecha_fin),
+                           fetch='one', dictionary=False)
+    return float(result[0]) if result else 0.0
+
+
+def _total_historico(fecha_inicio: date, fecha_fin: date) -> float:
+    """Total de un período ya cerrado, cacheado por (inicio, fin)"""
+    key = (fecha_inicio, fecha_fin)
+    total = _totales_cache.get(key)
+    if total is None:
+        total = _query_total(fecha_inicio, fecha_fin)
+        with _totales_lock:
+            if len(_totales_cache) >= _TOTALES_MAXSIZE:
+                _totales_cache.pop(next(iter(_totales_cache)))
+            _totales_cache[key] = total
+    return total
+
+
+def _invalidate_totales(fecha: Any = None) -> None:
+    """Descarta los totales que incluyen `fecha` (todos si es None)"""
+    if isinstance(fecha, datetime):
+        fecha = fecha.date()
+    with _totales_lock:
+        if not isinstance(fecha, date):
+            _totales_cache.clear()
+            return
+        for key in [k for k in _totales_cache if k[0] <= fecha <= k[1]]:
+            del _totales_cache[key]
+
+# Nombre del cliente: columna generada clientes.nombre_completo (ver
+# sql/optimizaciones_postgresql.sql) o, si aún no existe, la concatenación.
+_HAS_NOMBRE_COMPLETO_SQL = """
+    SELECT 1 FROM information_schema.columns
+    WHERE table_name = 'clientes' AND column_name = 'nombre_completo'
+"""
+_CLIENTE_NOMBRE_GENERADO = "c.nombre_completo"
+_CLIENTE_NOMBRE_CALCULADO = "TRIM(c.nombres || ' ' || COALESCE(c.apellidos, ''))"
+_cliente_nombre_expr: Optional[str] = None
+_venta_queries: Dict[str, str] = {}
+
+
+def _venta_sql(template: str, name: Optional[str] = None) -> str:
+    """
+    Completa {cliente_nombre} en una consulta de ventas.
+    
+    Detecta una sola vez por proceso si existe la columna generada y
+    guarda la consulta resultante (registrando su nombre de sentencia
+    preparada si se indica).
+    
+    Args:
+        template (str): Consulta con el marcador {cliente_nombre}
+        name (str): Nombre opcional de la sentencia preparada
+        
+    Returns:
+        str: Consulta lista para execute_query/stream_query
+    """
+    global _cliente_nombre_expr
+    query = _venta_queries.get(template)
+    if query is None:
+        if _cliente_nombre_expr is None:
+            existe = execute_query(_HAS_NOMBRE_COMPLETO_SQL, fetch='one') is not None
+            _cliente_nombre_expr = (
+                _CLIENTE_NOMBRE_GENERADO if existe else _CLIENTE_NOMBRE_CALCULADO
+            )
+        query = template.format(cliente_nombre=_cliente_nombre_expr)
+        if name:
+            query = prepared_statement(name, query)
+        _venta_queries[template] = query
+    return query
+
+
+# Listados y búsquedas de ventas (las listas se comparten con el streaming)
+_ALL_WITH_DETAILS_SQL = """
+    SELECT 
+        v.*,
+        c.numero_documento,
+        {cliente_nombre} as cliente_nombre,
+        u.nombre_completo as vendedor_nombre
+    FROM ventas v
+    INNER JOIN clientes c ON v.cliente_id = c.id
+    INNER JOIN usuarios u ON v.usuario_id = u.id
+    ORDER BY v.fecha_venta DESC, v.id DESC
+"""
+_FIND_BY_NUMERO_SQL = """
+    SELECT 
+        v.*,
+        c.numero_documento,
+        {cliente_nombre} as cliente_nombre,
+        u.nombre_completo as vendedor_nombre
+    FROM ventas v
+    INNER JOIN clientes c ON v.cliente_id = c.id
+    INNER JOIN usuarios u ON v.usuario_id = u.id
+    WHERE v.numero_venta = %s
+"""
+_BY_DATE_RANGE_SQL = """
+    SELECT 
+        v.*,
+        {cliente_nombre} as cliente_nombre
+    FROM ventas v
+    INNER JOIN clientes c ON v.cliente_id = c.id
+    WHERE v.fecha_venta BETWEEN %s AND %s
+      AND v.estado = 'completada'
+    ORDER BY v.fecha_venta DESC
+"""
+# Ventas con sus detalles anidados como JSON (una fila por venta)
+_NESTED_DETALLES_SQL = """
+    SELECT 
+        v.*,
+        c.numero_documento,
+        {cliente_nombre} as cliente_nombre,
+        u.nombre_completo as vendedor_nombre,
+        COALESCE(
+            jsonb_agg(
+                jsonb_build_object(
+                    'id', dv.id,
+                    'producto_id', dv.producto_id,
+                    'producto_codigo', p.codigo,
+                    'producto_nombre', p.nombre,
+                    'cantidad', dv.cantidad,
+                    'precio_unitario', dv.precio_unitario,
+                    'descuento', dv.descuento,
+                    'subtotal', dv.subtotal
+                ) ORDER BY dv.id
+            ) FILTER (WHERE dv.id IS NOT NULL),
+            '[]'::jsonb
+        ) as detalles
+    FROM ventas v
+    INNER JOIN clientes c ON v.cliente_id = c.id
+    INNER JOIN usuarios u ON v.usuario_id = u.id
+    LEFT JOIN detalle_ventas dv ON dv.venta_id = v.id
+    LEFT JOIN productos p ON dv.producto_id = p.id
+    GROUP BY v.id, c.id, u.id
+    ORDER BY v.fecha_venta DESC, v.id DESC
+"""
+
 
 class VentaRepository(BaseRepository):
     """Repositorio para gestionar ventas y sus detalles"""
     
+    _ALLOWED_ORDER = BaseRepository._ALLOWED_ORDER | {"fecha_venta DESC"}
+    
     def __init__(self):
         super().__init__('ventas')
     
-    def get_all_with_details(self) -> List[Dict[str, Any]]:
+    def _after_write(self, fecha_venta: Any = None) -> None:
+        # Sin fecha (escrituras genéricas de BaseRepository) se descarta todo
+        _invalidate_totales(fecha_venta)
+    
+    @log_errors(logger)
+    def get_all_with_details(self, dict_rows: bool = True) -> List[Any]:
         """
         Obtiene todas las ventas con información de cliente.
         
+        Args:
+            dict_rows (bool): Si False retorna namedtuples (venta.total),
+                mucho más livianas que un dict por fila en listados grandes
+        
         Returns:
             List[Dict]: Lista de ventas
         """
-        try:
-            query = """
-                SELECT 
-                    v.*,
-                    c.numero_documento,
-                    c.nombres || ' ' || COALESCE(c.apellidos, '') as cliente_nombre,  -- ✅ PostgreSQL usa ||
-                    u.nombre_completo as vendedor_nombre
-                FROM ventas v
-                INNER JOIN clientes c ON v.cliente_id = c.id
-                INNER JOIN usuarios u ON v.usuario_id = u.id
-                ORDER BY v.fecha_venta DESC, v.id DESC
-            """
-            return execute_query(query) or []
-        except Exception as e:
-            logger.error(f"Error obteniendo ventas con detalles: {e}")
-            raise
+        return execute_query(_venta_sql(_ALL_WITH_DETAILS_SQL), named=not dict_rows) or []
     
+    def iter_all_with_details(self, chunk: int = 2000) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre todas las ventas con un cursor del lado del servidor.
+        
+        Para reportes y exportaciones que solo iteran: la memoria usada
+        es O(chunk) en lugar de O(ventas). Las filas son las mismas que
+        las de get_all_with_details().
+        
+        Args:
+            chunk (int): Filas por cada viaje al servidor
+            
+        Yields:
+            Dict: Venta con datos de cliente y vendedor
+        """
+        yield from stream_query(_venta_sql(_ALL_WITH_DETAILS_SQL), itersize=chunk, real_dict=True)
+    
+    @log_errors(logger)
     def find_by_numero(self, numero_venta: str) -> Optional[Dict[str, Any]]:
         """
         Busca una venta por su número.
@@ -53,23 +338,11 @@ class VentaRepository(BaseRepository):
         Returns:
             Dict|None: Venta encontrada o None
         """
-        try:
-            query = """
-                SELECT 
-                    v.*,
-                    c.numero_documento,
-                    c.nombres || ' ' || COALESCE(c.apellidos, '') as cliente_nombre,  -- ✅ PostgreSQL
-                    u.nombre_completo as vendedor_nombre
-                FROM ventas v
-                INNER JOIN clientes c ON v.cliente_id = c.id
-                INNER JOIN usuarios u ON v.usuario_id = u.id
-                WHERE v.numero_venta = %s
-            """
-            return execute_query(query, (numero_venta,), fetch='one')
-        except Exception as e:
-            logger.error(f"Error buscando venta por número: {e}")
-            raise
+        return execute_query(
+            _venta_sql(_FIND_BY_NUMERO_SQL, 'venta_por_numero'), (numero_venta,), fetch='one'
+        )
     
+    @log_errors(logger)
     def get_by_cliente(self, cliente_id: int) -> List[Dict[str, Any]]:
         """
         Obtiene ventas de un cliente específico.
@@ -80,16 +353,13 @@ class VentaRepository(BaseRepository):
         Returns:
             List[Dict]: Lista de ventas
         """
-        try:
-            return self.find_all(
-                conditions="cliente_id = %s AND estado = 'completada'",
-                params=(cliente_id,),
-                order_by="fecha_venta DESC"
-            )
-        except Exception as e:
-            logger.error(f"Error obteniendo ventas por cliente: {e}")
-            raise
+        return self.find_all(
+            conditions="cliente_id = %s AND estado = 'completada'",
+            params=(cliente_id,),
+            order_by="fecha_venta DESC"
+        )
     
+    @log_errors(logger)
     def get_by_estado(self, estado: str) -> List[Dict[str, Any]]:
         """
         Obtiene ventas por estado.
@@ -100,77 +370,132 @@ class VentaRepository(BaseRepository):
         Returns:
             List[Dict]: Lista de ventas
         """
-        try:
-            return self.find_all(
-                conditions="estado = %s",
-                params=(estado,),
-                order_by="fecha_venta DESC"
-            )
-        except Exception as e:
-            logger.error(f"Error obteniendo ventas por estado: {e}")
-            raise
+        return self.find_all(
+            conditions="estado = %s",
+            params=(estado,),
+            order_by="fecha_venta DESC"
+        )
     
-    def get_by_date_range(self, fecha_inicio: date, fecha_fin: date) -> List[Dict[str, Any]]:
+    @log_errors(logger)
+    def get_by_date_range(self, fecha_inicio: date, fecha_fin: date,
+                          dict_rows: bool = True) -> List[Any]:
         """
         Obtiene ventas en un rango de fechas.
         
         Args:
             fecha_inicio (date): Fecha inicial
             fecha_fin (date): Fecha final
+            dict_rows (bool): Si False retorna namedtuples en lugar de dicts
             
         Returns:
             List[Dict]: Lista de ventas
         """
-        try:
-            query = """
-                SELECT 
-                    v.*,
-                    c.nombres || ' ' || COALESCE(c.apellidos, '') as cliente_nombre  -- ✅ PostgreSQL
-                FROM ventas v
-                INNER JOIN clientes c ON v.cliente_id = c.id
-                WHERE v.fecha_venta BETWEEN %s AND %s
-                  AND v.estado = 'completada'
-                ORDER BY v.fecha_venta DESC
-            """
-            return execute_query(query, (fecha_inicio, fecha_fin)) or []
-        except Exception as e:
-            logger.error(f"Error obteniendo ventas por rango de fechas: {e}")
-            raise
+        return execute_query(
+            _venta_sql(_BY_DATE_RANGE_SQL), (fecha_inicio, fecha_fin), named=not dict_rows
+        ) or []
+    
+    def iter_by_date_range(self, fecha_inicio: date, fecha_fin: date,
+                           chunk: int = 2000) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre las ventas de un rango de fechas con un cursor del lado del servidor.
+        
+        Args:
+            fecha_inicio (date): Fecha inicial
+            fecha_fin (date): Fecha final
+            chunk (int): Filas por cada viaje al servidor
+            
+        Yields:
+            Dict: Venta con cliente_nombre
+        """
+        yield from stream_query(
+            _venta_sql(_BY_DATE_RANGE_SQL), (fecha_inicio, fecha_fin), itersize=chunk, real_dict=True
+        )
     
-    def get_detalle(self, venta_id: int) -> List[Dict[str, Any]]:
+    @log_errors(logger)
+    def get_detalle(self, venta_id: int, dict_rows: bool = True) -> List[Any]:
         """
         Obtiene el detalle de productos de una venta.
         
         Args:
             venta_id (int): ID de la venta
+            dict_rows (bool): Si False retorna namedtuples en lugar de dicts
             
         Returns:
             List[Dict]: Lista de productos vendidos
         """
-        try:
-            query = """
-                SELECT 
-                    dv.*,
-                    p.codigo as producto_codigo,
-                    p.nombre as producto_nombre,
-                    p.unidad_medida
-                FROM detalle_ventas dv
-                INNER JOIN productos p ON dv.producto_id = p.id
-                WHERE dv.venta_id = %s
-                ORDER BY dv.id
-            """
-            return execute_query(query, (venta_id,)) or []
-        except Exception as e:
-            logger.error(f"Error obteniendo detalle de venta: {e}")
-            raise
+        query = """
+            SELECT 
+                dv.*,
+                p.codigo as producto_codigo,
+                p.nombre as producto_nombre,
+                p.unidad_medida
+            FROM detalle_ventas dv
+            INNER JOIN productos p ON dv.producto_id = p.id
+            WHERE dv.venta_id = %s
+            ORDER BY dv.id
+        """
+        return execute_query(query, (venta_id,), named=not dict_rows) or []
+    
+    @log_errors(logger)
+    def get_detalles_bulk(self, venta_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Obtiene los detalles de varias ventas en una sola consulta.
+        
+        Reemplaza llamar a get_detalle(venta_id) por cada venta de un
+        listado (1+N consultas) por una consulta con venta_id = ANY.
+        
+        Args:
+            venta_ids (List[int]): IDs de las ventas
+            
+        Returns:
+            Dict[int, List[Dict]]: Detalles agrupados por venta_id; las
+                ventas sin detalles no aparecen
+        """
+        if not venta_ids:
+            return {}
+        
+        query = """
+            SELECT 
+                dv.*,
+                p.codigo as producto_codigo,
+                p.nombre as producto_nombre,
+                p.unidad_medida
+            FROM detalle_ventas dv
+            INNER JOIN productos p ON dv.producto_id = p.id
+            WHERE dv.venta_id = ANY(%s)
+            ORDER BY dv.venta_id, dv.id
+        """
+        detalles = defaultdict(list)
+        for row in execute_query(query, (list(venta_ids),)) or []:
+            detalles[row['venta_id']].append(row)
+        return dict(detalles)
+    
+    @log_errors(logger)
+    def get_all_with_nested_detalles(self) -> List[Dict[str, Any]]:
+        """
+        Obtiene todas las ventas con sus detalles en una sola consulta.
+        
+        Los detalles se agregan como JSON en el servidor (jsonb_agg), sin
+        una segunda consulta ni agrupar filas en Python. psycopg2
+        convierte la columna jsonb a listas de dicts; los importes llegan
+        como números JSON (float), no como Decimal.
+        
+        Returns:
+            List[Dict]: Ventas de get_all_with_details() con la lista
+                'detalles' (vacía si la venta no tiene detalles)
+        """
+        return execute_query(_venta_sql(_NESTED_DETALLES_SQL)) or []
     
     # ✅ CORRECCIÓN CRÍTICA: Método insert() personalizado para PostgreSQL
-    def insert(self, datos_venta: Dict[str, Any]) -> int:
+    @log_errors(logger)
+    def insert(self, datos_venta: Dict[str, Any], cursor=None) -> int:
         """
         Inserta una nueva venta y retorna su ID (compatible con PostgreSQL)
         
         Args:
             datos_venta (Dict): Datos de la venta
+            cursor (optional): Cursor de una transacción abierta; si se
+                indica no se hace commit
             
         Returns:
             int: ID de la venta insertada
@@ -205,23 +530,60 @@ class VentaRepository(BaseRepository):
             ) RETURNING id  -- ✅ ¡ES CLAVE PARA POSTGRESQL!
         """
         
-        try:
-            with get_db_cursor(dictionary=False) as (cursor, conn):  # dictionary=False para tupla
-                cursor.execute(query, datos_venta)
-                venta_id = cursor.fetchone()[0]  # ✅ Obtiene el ID real
-                
-                if not venta_id or venta_id <= 0:
-                    raise Exception(f"ID de venta inválido retornado: {venta_id}")
-                
-                conn.commit()
-                logger.info(f"Venta insertada exitosamente con ID: {venta_id}")
-                return venta_id
-                
-        except Exception as e:
-            logger.error(f"Error insertando venta: {e}")
-            raise
+        with write_scope(cursor) as cur:  # cursor de tuplas
+            cur.execute(query, datos_venta)
+            venta_id = cur.fetchone()[0]  # ✅ Obtiene el ID real
+            
+            if not venta_id or venta_id <= 0:
+                raise Exception(f"ID de venta inválido retornado: {venta_id}")
+        
+        if cursor is None:
+            self._after_write(datos_venta.get('fecha_venta'))
+        logger.info(f"Venta insertada exitosamente con ID: {venta_id}")
+        return venta_id
+    
+    @log_errors(logger)
+    def insert_numerada(self, datos_venta: Dict[str, Any], cursor=None) -> Tuple[int, str]:
+        """
+        Inserta una venta generando su número en la misma sentencia.
+        
+        Reemplaza generate_numero_venta() + insert(): el contador de
+        venta_counters se incrementa dentro del INSERT, así que se ahorra
+        un viaje al servidor y, con el cursor de la transacción de la
+        venta, un rollback no consume número. Solo la primera venta del
+        prefijo/año hace una consulta extra para crear el contador.
+        
+        Args:
+            datos_venta (Dict): Datos de la venta, sin numero_venta
+            cursor (optional): Cursor de tuplas de una transacción
+                abierta; si se indica no se hace commit
+            
+        Returns:
+            Tuple[int, str]: (ID de la venta, número asignado)
+        """
+        anio = datetime.now().year
+        prefijo = _PREFIJOS.get(datos_venta['tipo_comprobante'], 'VEN')
+        params = {**datos_venta, 'prefijo': prefijo, 'anio': anio}
+        
+        _ensure_counters_table()
+        with write_scope(cursor) as cur:
+            cur.execute(_INSERT_NUMERADA_SQL, params)
+            row = cur.fetchone()
+            if row is None:
+                cur.execute(
+                    _INIT_COUNTER_SQL, (prefijo, anio, f"^{prefijo}-{anio}-[0-9]+$")
+                )
+                cur.execute(_INSERT_NUMERADA_SQL, params)
+                row = cur.fetchone()
+        
+        venta_id, numero_venta = row
+        if cursor is None:
+            self._after_write(datos_venta.get('fecha_venta'))
+        logger.info(f"Venta {numero_venta} insertada con ID: {venta_id}")
+        return venta_id, numero_venta
     
     # ✅ CORRECCIÓN CRÍTICA: Método insert_detalle() para PostgreSQL
+    @log_errors(logger)
     def insert_detalle(self, detalle_data: Dict[str, Any]) -> int:
         """
         Inserta un detalle de venta (compatible con PostgreSQL).
@@ -232,27 +594,56 @@ class VentaRepository(BaseRepository):
         Returns:
             int: ID del detalle insertado
         """
-        try:
-            columns = ', '.join(detalle_data.keys())
-            placeholders = ', '.join(['%(' + k + ')s' for k in detalle_data.keys()])  # ✅ Named placeholders
+        columns = ', '.join(detalle_data.keys())
+        placeholders = ', '.join(['%(' + k + ')s' for k in detalle_data.keys()])  # ✅ Named placeholders
+        
+        query = f"""
+            INSERT INTO detalle_ventas ({columns}) 
+            VALUES ({placeholders})
+            RETURNING id  -- ✅ PostgreSQL requiere RETURNING
+        """
+        
+        with get_write_cursor() as (cursor, conn):
+            cursor.execute(query, detalle_data)
+            detalle_id = cursor.fetchone()[0]  # ✅ Obtiene el ID real
+            conn.commit()
+            logger.info(f"Detalle de venta insertado: ID {detalle_id}")
+            return detalle_id
+    
+    @log_errors(logger)
+    def insert_detalles_bulk(self, detalles: List[Dict[str, Any]], cursor=None) -> List[int]:
+        """
+        Inserta todos los detalles de una venta en un solo INSERT multi-fila.
+        
+        Todos los detalles deben tener las mismas columnas que el primero.
+        
+        Args:
+            detalles (List[Dict]): Detalles de la venta
+            cursor (optional): Cursor de una transacción abierta; si se
+                indica no se hace commit
             
-            query = f"""
-                INSERT INTO detalle_ventas ({columns}) 
-                VALUES ({placeholders})
-                RETURNING id  -- ✅ PostgreSQL requiere RETURNING
-            """
+        Returns:
+            List[int]: IDs de los detalles insertados, en orden
             
-            with get_db_cursor(dictionary=False) as (cursor, conn):
-                cursor.execute(query, detalle_data)
-                detalle_id = cursor.fetchone()[0]  # ✅ Obtiene el ID real
-                conn.commit()
-                logger.info(f"Detalle de venta insertado: ID {detalle_id}")
-                return detalle_id
-                
-        except Exception as e:
-            logger.error(f"Error insertando detalle de venta: {e}")
-            raise
+        Raises:
+            ValueError: Si los detalles no comparten las mismas columnas
+        """
+        if not detalles:
+            return []
+        
+        columns = list(detalles[0])
+        expected = set(columns)
+        if any(set(d) != expected for d in detalles):
+            raise ValueError("Todos los detalles de venta deben tener las mismas columnas")
+        
+        rows = [tuple(d[c] for c in columns) for d in detalles]
+        detalle_ids = execute_bulk_insert(
+            'detalle_ventas', columns, rows, returning='id', cursor=cursor
+        )
+        logger.info("Detalles de venta insertados: %s", len(detalle_ids))
+        return detalle_ids
     
+    @log_errors(logger)
     def anular_venta(self, venta_id: int) -> bool:
         """
         Anula una venta.
@@ -263,91 +654,91 @@ class VentaRepository(BaseRepository):
         Returns:
             bool: True si se anuló correctamente
         """
-        try:
-            return self.update(venta_id, {'estado': 'anulada'})
-        except Exception as e:
-            logger.error(f"Error anulando venta: {e}")
-            raise
+        with get_write_cursor() as (cursor, conn):
+            cursor.execute(_ANULAR_SQL, (venta_id,))
+            result = cursor.fetchone()
+            conn.commit()
+        
+        if result is None:
+            logger.warning("anular_venta: ID %s no encontrado", venta_id)
+            return False
+        
+        self._after_write(result[0])
+        logger.info("Venta %s anulada", venta_id)
+        return True
     
+    @log_errors(logger)
     def generate_numero_venta(self, tipo_comprobante: str) -> str:
         """
         Genera un número de venta único según el tipo de comprobante.
         
+        Incrementa el contador (prefijo, año) de venta_counters con un
+        UPDATE ... RETURNING atómico; la primera vez en el año lo crea a
+        partir del mayor número ya registrado.
+        
         Args:
             tipo_comprobante (str): Tipo ('boleta', 'factura', 'ticket')
             
         Returns:
             str: Número de venta (ej: BOL-2024-001, FAC-2024-001)
         """
-        try:
-            current_year = datetime.now().year
-            
-            # Prefijo según tipo de comprobante
-            prefijos = {
-                'boleta': 'BOL',
-                'factura': 'FAC',
-                'ticket': 'TIC'
-            }
-            
-            prefijo = prefijos.get(tipo_comprobante, 'VEN')
-            
-            query = """
-                SELECT numero_venta 
-                FROM ventas 
-                WHERE numero_venta LIKE %s
-                ORDER BY id DESC 
-                LIMIT 1
-            """
-            
-            result = execute_query(query, (f"{prefijo}-{current_year}-%",), fetch='one')
-            
-            if result:
-                last_number = int(result['numero_venta'].split('-')[-1])
-                new_number = last_number + 1
-            else:
-                new_number = 1
-            
-            numero_venta = f"{prefijo}-{current_year}-{new_number:04d}"
-            logger.info(f"Número de venta generado: {numero_venta}")
-            return numero_venta
-            
-        except Exception as e:
-            logger.error(f"Error generando número de venta: {e}")
-            raise
+        current_year = datetime.now().year
+        
+        # Prefijo según tipo de comprobante
+        prefijo = _PREFIJOS.get(tipo_comprobante, 'VEN')
+        
+        _ensure_counters_table()
+        with get_write_cursor() as (cursor, conn):
+            cursor.execute(_NEXT_NUMBER_SQL, (prefijo, current_year))
+            result = cursor.fetchone()
+            if result is None:
+                cursor.execute(
+                    _SEED_COUNTER_SQL,
+                    (prefijo, current_year, f"^{prefijo}-{current_year}-[0-9]+$")
+                )
+                result = cursor.fetchone()
+            conn.commit()
+        
+        new_number = result[0]
+        numero_venta = f"{prefijo}-{current_year}-{new_number:04d}"
+        logger.info(f"Número de venta generado: {numero_venta}")
+        return numero_venta
     
-    def get_ventas_del_dia(self, fecha: date = None) -> List[Dict[str, Any]]:
+    @log_errors(logger)
+    def get_ventas_del_dia(self, fecha: date = None, dict_rows: bool = True) -> List[Any]:
         """
         Obtiene las ventas de un día específico.
         
         Args:
             fecha (date): Fecha a consultar (hoy si no se especifica)
+            dict_rows (bool): Si False retorna namedtuples en lugar de dicts
             
         Returns:
             List[Dict]: Lista de ventas del día
         """
-        try:
-            if fecha is None:
-                fecha = datetime.now().date()
-            
-            query = """
-                SELECT 
-                    v.*,
-                    c.nombres || ' ' || COALESCE(c.apellidos, '') as cliente_nombre  -- ✅ PostgreSQL
-                FROM ventas v
-                INNER JOIN clientes c ON v.cliente_id = c.id
-                WHERE v.fecha_venta = %s
-                  AND v.estado = 'completada'
-                ORDER BY v.id DESC
-            """
-            return execute_query(query, (fecha,)) or []
-        except Exception as e:
-            logger.error(f"Error obteniendo ventas del día: {e}")
-            raise
+        if fecha is None:
+            fecha = datetime.now().date()
+        
+        query = """
+            SELECT 
+                v.*,
+                {cliente_nombre} as cliente_nombre
+            FROM ventas v
+            INNER JOIN clientes c ON v.cliente_id = c.id
+            WHERE v.fecha_venta = %s
+              AND v.estado = 'completada'
+            ORDER BY v.id DESC
+        """
+        return execute_query(_venta_sql(query), (fecha,), named=not dict_rows) or []
     
+    @log_errors(logger)
     def get_total_ventas_periodo(self, fecha_inicio: date, fecha_fin: date) -> float:
         """
         Obtiene el total de ventas en un período.
         
+        Los días anteriores a hoy se sirven desde una caché en memoria;
+        el día en curso se suma siempre desde la base.
+        
         Args:
             fecha_inicio (date): Fecha inicial
             fecha_fin (date): Fecha final
@@ -355,15 +746,15 @@ class VentaRepository(BaseRepository):
         Returns:
             float: Total vendido
         """
-        try:
-            query = """
-                SELECT COALESCE(SUM(total), 0) as total_vendido
-                FROM ventas
-                WHERE fecha_venta BETWEEN %s AND %s
-                  AND estado = 'completada'
-            """
-            result = execute_query(query, (fecha_inicio, fecha_fin), fetch='one')
-            return float(result['total_vendido']) if result else 0.0
-        except Exception as e:
-            logger.error(f"Error obteniendo total de ventas: {e}")
-            raise
\ No newline at end of file
+        if fecha_inicio > fecha_fin:
+            return 0.0
+        
+        hoy = datetime.now().date()
+        if fecha_fin < hoy:
+            return _total_historico(fecha_inicio, fecha_fin)
+        if fecha_inicio >= hoy:
+            return _query_total(fecha_inicio, fecha_fin)
+        
+        # Parte cerrada desde la caché + lo que va desde hoy, en vivo
+        ayer = hoy - timedelta(days=1)
+        return _total_historico(fecha_inicio, ayer) + _query_total(hoy, fecha_fin)
@@ -10,6 +10,8 @@ Incluye registro de compras y actualización de inventario.
 import logging
 from typing import List, Dict, Any
 from datetime import datetime, date
+from psycopg2 import errors as pg_errors
+from config.database import transaction
 from repositories import (
     CompraRepository, 
     ProductoRepository, 
@@ -67,6 +69,7 @@ class CompraService:
         """
         try:
             # Validar proveedor
+            # Proveedor y productos se validan contra lecturas cacheadas
             proveedor = self.proveedor_repo.find_by_id(proveedor_id)
             if not proveedor:
                 raise ProveedorNoEncontradoException(str(proveedor_id))
@@ -75,12 +78,15 @@ class CompraService:
             if not productos or len(productos) == 0:
                 raise DatosInvalidosException('productos', 'Debe incluir al menos un producto')
             
+            productos_existentes = self.producto_repo.exists_many(
+                [item['producto_id'] for item in productos]
+            )
+            
             # Validar cada producto y calcular totales
             subtotal = 0
             for item in productos:
                 # Validar producto existe
-                producto = self.producto_repo.find_by_id(item['producto_id'])
-                if not producto:
+                if item['producto_id'] not in productos_existentes:
                     raise ProductoNoEncontradoException(str(item['producto_id']), "ID")
                 
                 # Validar datos del item
@@ -105,7 +111,7 @@ class CompraService:
             # Generar número de compra
             numero_compra = self.compra_repo.generate_numero_compra()
             
-            # ✅ INSERTAR COMPRA (el repositorio maneja su propia transacción con RETURNING id)
+            # ✅ DATOS DE LA COMPRA (el repositorio maneja su propia transacción con RETURNING id)
             datos_compra = {
                 'numero_compra': numero_compra,
                 'proveedor_id': proveedor_id,
@@ -120,23 +126,30 @@ class CompraService:
                 'observaciones': observaciones
             }
             
-            # ✅ OBTENER EL ID REAL DE LA COMPRA (NUNCA SERÁ 0)
-            compra_id = self.compra_repo.insert(datos_compra)
-            logger.info(f"✅ Compra ID real obtenido: {compra_id}")  # ← ¡CLAVE PARA DIAGNÓSTICO!
-            
-            if compra_id <= 0:
-                raise Exception(f"ID de compra inválido retornado por repositorio: {compra_id}")
-            
-            # ✅ INSERTAR DETALLES (cada detalle usa el compra_id REAL > 0)
-            for item in productos:
-                detalle_data = {
-                    'compra_id': compra_id,  # ✅ AHORA ES SIEMPRE > 0
+            # ✅ INSERTAR COMPRA + DETALLES en una sola sentencia (ID REAL > 0)
+            detalles = [
+                {
                     'producto_id': item['producto_id'],
                     'cantidad': item['cantidad'],
                     'precio_unitario': item['precio_unitario'],
                     'subtotal': item['subtotal']
                 }
-                self.compra_repo.insert_detalle(detalle_data)
+                for item in productos
+            ]
+            try:
+                compra_id = self.compra_repo.insert_with_detalles(datos_compra, detalles)
+            except pg_errors.UniqueViolation as e:
+                if 'numero_compra' not in (e.diag.constraint_name or ''):
+                    raise
+                # Número ya usado fuera de la secuencia: realinear y reintentar una vez
+                self.compra_repo.reseed_numero_compra()
+                numero_compra = self.compra_repo.generate_numero_compra()
+                datos_compra['numero_compra'] = numero_compra
+                compra_id = self.compra_repo.insert_with_detalles(datos_compra, detalles)
+            logger.info(f"✅ Compra ID real obtenido: {compra_id}")  # ← ¡CLAVE PARA DIAGNÓSTICO!
+            
+            if compra_id <= 0:
+                raise Exception(f"ID de compra inválido retornado por repositorio: {compra_id}")
             
             logger.info(
                 f"✅ Compra registrada exitosamente: {numero_compra}, "
@@ -200,34 +213,57 @@ class CompraService:
             # Obtener detalles de la compra
             detalles = self.compra_repo.get_detalle(compra_id)
             
-            # ✅ ACTUALIZAR STOCK Y REGISTRAR MOVIMIENTOS (sin transacción manual externa)
-            for detalle in detalles:
-                producto_id = detalle['producto_id']
-                cantidad = detalle['cantidad']
+            # ✅ ACTUALIZAR STOCK Y REGISTRAR MOVIMIENTOS: dos sentencias en bloque
+            # (UPDATE de stock con RETURNING, INSERT de movimientos) sobre el mismo cursor;
+            # transaction() confirma al salir del bloque o revierte si algo falla
+            with transaction() as cursor:
+                # Bloquear la compra y volver a validar su estado: otra
+                # recepción simultánea pudo haberla procesado ya
+                estado = self.compra_repo.lock_estado(compra_id, cursor)
+                if estado != 'pendiente':
+                    raise EstadoInvalidoException('Compra', estado, 'recibir compra')
                 
-                # Obtener stock anterior
-                stock_anterior = self.producto_repo.get_stock_actual(producto_id)
-                stock_nuevo = stock_anterior + cantidad
+                # Sumar el stock con un solo UPDATE que retorna el stock
+                # anterior y el nuevo de cada producto
+                deltas = {}
+                for detalle in detalles:
+                    producto_id = detalle['producto_id']
+                    deltas[producto_id] = deltas.get(producto_id, 0) + detalle['cantidad']
+                stocks = self.producto_repo.increment_stocks_returning(deltas, cursor=cursor)
                 
-                # Actualizar stock
-                self.producto_repo.update_stock(producto_id, cantidad, 'sumar')
+                movimientos = []
+                stock_actual = {producto_id: antes for producto_id, (antes, _) in stocks.items()}
+                for detalle in detalles:
+                    producto_id = detalle['producto_id']
+                    cantidad = detalle['cantidad']
+                    
+                    # Un movimiento por detalle (cubre productos repetidos)
+                    stock_anterior = stock_actual[producto_id]
+                    stock_nuevo = stock_anterior + cantidad
+                    stock_actual[producto_id] = stock_nuevo
+                    
+                    movimientos.append({
+                        'producto_id': producto_id,
+                        'tipo_movimiento': 'entrada',
+                        'cantidad': cantidad,
+                        'motivo': 'compra',
+                        'referencia_id': compra_id,
+                        'stock_anterior': stock_anterior,
+                        'stock_nuevo': stock_nuevo,
+                        'usuario_id': usuario_id,
+                        'observaciones': f"Entrada por compra {compra['numero_compra']}"
+                    })
                 
-                # Registrar movimiento
-                movimiento_data = {
-                    'producto_id': producto_id,
-                    'tipo_movimiento': 'entrada',
-                    'cantidad': cantidad,
-                    'motivo': 'compra',
-                    'referencia_id': compra_id,
-                    'stock_anterior': stock_anterior,
-                    'stock_nuevo': stock_nuevo,
-                    'usuario_id': usuario_id,
-                    'observaciones': f"Entrada por compra {compra['numero_compra']}"
-                }
-                self.movimiento_repo.registrar_movimiento(movimiento_data)
+                self.movimiento_repo.registrar_movimientos_bulk(movimientos, cursor=cursor)
+                
+                # Actualizar estado de la compra
+                self.compra_repo.update_estado(
+                    compra_id, 'recibida', fecha_recepcion, cursor=cursor
+                )
             
-            # Actualizar estado de la compra
-            self.compra_repo.update_estado(compra_id, 'recibida', fecha_recepcion)
+            # Invalidar cachés solo después del commit
+            self.producto_repo.after_commit()
+            self.compra_repo.after_commit()
             
             logger.info(
                 f"✅ Compra recibida: {compra['numero_compra']}, "
@@ -313,6 +349,24 @@ class CompraService:
             logger.error(f"❌ Error listando compras: {e}")
             raise
     
+    def listar_compras_con_detalles(self, estado: str = None) -> List[Dict[str, Any]]:
+        """
+        Lista compras incluyendo sus detalles, en una sola consulta.
+        
+        Args:
+            estado (str): Estado a filtrar (opcional)
+            
+        Returns:
+            List[Dict]: Compras, cada una con la lista 'detalles'
+        """
+        try:
+            compras = self.compra_repo.get_all_with_detalles_aggregated(estado)
+            logger.info(f"✅ Compras con detalles listadas: {len(compras)}")
+            return compras
+        except Exception as e:
+            logger.error(f"❌ Error listando compras con detalles: {e}")
+            raise
+    
     def obtener_compra_completa(self, compra_id: int) -> Dict[str, Any]:
         """
         Obtiene una compra con todos sus detalles.
@@ -372,18 +426,17 @@ class CompraService:
             Dict: Estadísticas de compras
         """
         try:
-            compras = self.compra_repo.get_by_date_range(fecha_inicio, fecha_fin)
-            
-            compras_recibidas = [c for c in compras if c['estado'] == 'recibida']
+            estadisticas = self.compra_repo.get_estadisticas_periodo(fecha_inicio, fecha_fin)
             
-            total_gastado = sum(c['total'] for c in compras_recibidas)
+            compras_recibidas = estadisticas['compras_recibidas']
+            total_gastado = estadisticas['total_gastado']
             
             resultado = {
-                'total_compras': len(compras),
-                'compras_recibidas': len(compras_recibidas),
-                'compras_pendientes': len([c for c in compras if c['estado'] == 'pendiente']),
+                'total_compras': estadisticas['total_compras'],
+                'compras_recibidas': compras_recibidas,
+                'compras_pendientes': estadisticas['compras_pendientes'],
                 'total_gastado': round(total_gastado, 2),
-                'promedio_por_compra': round(total_gastado / len(compras_recibidas), 2) if compras_recibidas else 0,
+                'promedio_por_compra': round(total_gastado / compras_recibidas, 2) if compras_recibidas else 0,
                 'fecha_inicio': fecha_inicio,
                 'fecha_fin': fecha_fin
             }
@@ -170,23 +170,17 @@ class InventarioService:
             Dict: Valor del inventario
         """
         try:
-            productos = self.producto_repo.find_all(conditions="activo = TRUE")
+            totales = self.producto_repo.get_inventario_aggregates()
             
-            valor_compra = 0
-            valor_venta = 0
-            total_unidades = 0
-            
-            for producto in productos:
-                stock = producto['stock_actual']
-                total_unidades += stock
-                valor_compra += stock * producto['precio_compra']
-                valor_venta += stock * producto['precio_venta']
+            total_unidades = totales['total_unidades']
+            valor_compra = totales['valor_compra']
+            valor_venta = totales['valor_venta']
             
             ganancia_potencial = valor_venta - valor_compra
             margen_porcentaje = (ganancia_potencial / valor_compra * 100) if valor_compra > 0 else 0
             
             resultado = {
-                'total_productos': len(productos),
+                'total_productos': totales['total_productos'],
                 'total_unidades': total_unidades,
                 'valor_compra': round(valor_compra, 2),
                 'valor_venta': round(valor_venta, 2),
@@ -220,46 +214,28 @@ class InventarioService:
             fecha_inicio = datetime.now().date() - timedelta(days=dias)
             fecha_fin = datetime.now().date()
             
-            # Obtener movimientos de salida del período
-            movimientos = self.movimiento_repo.get_by_date_range(fecha_inicio, fecha_fin)
-            salidas = [m for m in movimientos if m['tipo_movimiento'] == 'salida']
-            
-            # Agrupar por producto
-            rotacion_por_producto = {}
-            for movimiento in salidas:
-                producto_id = movimiento['producto_id']
-                if producto_id not in rotacion_por_producto:
-                    rotacion_por_producto[producto_id] = {
-                        'producto_codigo': movimiento.get('producto_codigo', ''),
-                        'producto_nombre': movimiento.get('producto_nombre', ''),
-                        'cantidad_vendida': 0,
-                        'numero_ventas': 0
-                    }
-                rotacion_por_producto[producto_id]['cantidad_vendida'] += movimiento['cantidad']
-                rotacion_por_producto[producto_id]['numero_ventas'] += 1
+            # Salidas del período ya agrupadas por producto (con su stock actual)
+            salidas = self.movimiento_repo.aggregate_salidas(fecha_inicio, fecha_fin)
             
-            # Obtener stock actual y calcular rotación
             resultado = []
-            for producto_id, datos in rotacion_por_producto.items():
-                producto = self.producto_repo.find_by_id(producto_id)
-                if producto:
-                    stock_actual = producto['stock_actual']
-                    cantidad_vendida = datos['cantidad_vendida']
-                    
-                    # Tasa de rotación = cantidad vendida / stock promedio
-                    # Simplificado: cantidad vendida / stock actual
-                    rotacion = (cantidad_vendida / stock_actual) if stock_actual > 0 else 0
-                    
-                    resultado.append({
-                        'producto_id': producto_id,
-                        'codigo': datos['producto_codigo'],
-                        'nombre': datos['producto_nombre'],
-                        'stock_actual': stock_actual,
-                        'cantidad_vendida': cantidad_vendida,
-                        'numero_ventas': datos['numero_ventas'],
-                        'tasa_rotacion': round(rotacion, 2),
-                        'dias_inventario': round(dias / rotacion, 2) if rotacion > 0 else 0
-                    })
+            for fila in salidas:
+                stock_actual = fila['stock_actual']
+                cantidad_vendida = int(fila['cantidad_vendida'])
+                
+                # Tasa de rotación = cantidad vendida / stock promedio
+                # Simplificado: cantidad vendida / stock actual
+                rotacion = (cantidad_vendida / stock_actual) if stock_actual > 0 else 0
+                
+                resultado.append({
+                    'producto_id': fila['producto_id'],
+                    'codigo': fila['codigo'],
+                    'nombre': fila['nombre'],
+                    'stock_actual': stock_actual,
+                    'cantidad_vendida': cantidad_vendida,
+                    'numero_ventas': fila['numero_ventas'],
+                    'tasa_rotacion': round(rotacion, 2),
+                    'dias_inventario': round(dias / rotacion, 2) if rotacion > 0 else 0
+                })
             
             # Ordenar por tasa de rotación descendente
             resultado.sort(key=lambda x: x['tasa_rotacion'], reverse=True)
@@ -284,33 +260,20 @@ class InventarioService:
         try:
             fecha_limite = datetime.now().date() - timedelta(days=dias)
             
-            # Obtener todos los productos activos
-            productos = self.producto_repo.get_all_with_category()
-            
-            productos_sin_movimiento = []
-            
-            for producto in productos:
-                # Obtener movimientos del producto
-                movimientos = self.movimiento_repo.get_by_producto(producto['id'])
-                
-                # Filtrar movimientos recientes
-                movimientos_recientes = [
-                    m for m in movimientos
-                    if m['fecha_movimiento'].date() >= fecha_limite
-                ]
-                
-                if not movimientos_recientes:
-                    ultimo_movimiento = movimientos[0] if movimientos else None
-                    
-                    productos_sin_movimiento.append({
-                        'producto_id': producto['id'],
-                        'codigo': producto['codigo'],
-                        'nombre': producto['nombre'],
-                        'categoria': producto.get('categoria_nombre', ''),
-                        'stock_actual': producto['stock_actual'],
-                        'valor_inventario': producto['stock_actual'] * producto['precio_venta'],
-                        'ultimo_movimiento': ultimo_movimiento['fecha_movimiento'] if ultimo_movimiento else None
-                    })
+            productos = self.producto_repo.get_sin_movimiento(fecha_limite)
+            
+            productos_sin_movimiento = [
+                {
+                    'producto_id': producto['id'],
+                    'codigo': producto['codigo'],
+                    'nombre': producto['nombre'],
+                    'categoria': producto['categoria_nombre'],
+                    'stock_actual': producto['stock_actual'],
+                    'valor_inventario': producto['stock_actual'] * producto['precio_venta'],
+                    'ultimo_movimiento': producto['ultimo_movimiento']
+                }
+                for producto in productos
+            ]
             
             logger.info(f"Productos sin movimiento ({dias} días): {len(productos_sin_movimiento)}")
             return productos_sin_movimiento
@@ -167,8 +167,7 @@ class ProductoService:
                 )
 
             # Validar que la categoría exista
-            categoria = self.categoria_repo.find_by_id(datos_producto['categoria_id'])
-            if not categoria:
+            if not self.categoria_repo.exists(datos_producto['categoria_id']):
                 raise DatosInvalidosException(
                     'categoria_id',
                     'La categoría especificada no existe'
@@ -287,23 +286,16 @@ class ProductoService:
             Dict: Valor en precio de compra y precio de venta
         """
         try:
-            productos = self.producto_repo.find_all(conditions="activo = TRUE")
+            totales = self.producto_repo.get_inventario_aggregates()
             
-            valor_compra = sum(
-                p['stock_actual'] * p['precio_compra'] 
-                for p in productos
-            )
-            
-            valor_venta = sum(
-                p['stock_actual'] * p['precio_venta'] 
-                for p in productos
-            )
+            valor_compra = totales['valor_compra']
+            valor_venta = totales['valor_venta']
             
             resultado = {
                 'valor_compra': round(valor_compra, 2),
                 'valor_venta': round(valor_venta, 2),
                 'ganancia_potencial': round(valor_venta - valor_compra, 2),
-                'total_productos': len(productos)
+                'total_productos': totales['total_productos']
             }
             
             logger.info(f"Valor de inventario calculado: S/. {resultado['valor_venta']:.2f}")
@@ -10,6 +10,7 @@ Incluye validación de stock y registro de ventas.
 import logging
 from typing import List, Dict, Any
 from datetime import datetime, date
+from psycopg2 import errors as pg_errors
 from repositories import (
     VentaRepository,
     ProductoRepository,
@@ -24,10 +25,14 @@ from exceptions import (
     EstadoInvalidoException,
     DatosInvalidosException
 )
-from config.database import get_db_cursor
+from config.database import get_db_cursor, get_write_cursor
+from config.settings import VALID_TIPOS_COMPROBANTE, VALID_METODOS_PAGO
 
 logger = logging.getLogger(__name__)
 
+# CHECK (stock_actual >= 0) de sql/optimizaciones_postgresql.sql
+_STOCK_CONSTRAINT = 'chk_productos_stock_no_negativo'
+
 
 class VentaService:
     """Servicio para gestionar la lógica de negocio de ventas"""
@@ -76,7 +81,7 @@ class VentaService:
         """
         try:
             # Validar cliente
-            cliente = self.cliente_repo.find_by_id(cliente_id)
+            cliente = self.cliente_repo.find_by_id_cols(cliente_id, ('nombres', 'apellidos'))
             if not cliente:
                 raise ClienteNoEncontradoException(str(cliente_id))
             
@@ -85,21 +90,23 @@ class VentaService:
                 raise DatosInvalidosException('productos', 'Debe incluir al menos un producto')
             
             # Validar tipo de comprobante
-            if tipo_comprobante not in ['boleta', 'factura', 'ticket']:
+            if tipo_comprobante not in VALID_TIPOS_COMPROBANTE:
                 raise DatosInvalidosException('tipo_comprobante', 'Tipo inválido')
             
             # Validar método de pago
-            if metodo_pago not in ['efectivo', 'tarjeta', 'transferencia']:
+            if metodo_pago not in VALID_METODOS_PAGO:
                 raise DatosInvalidosException('metodo_pago', 'Método inválido')
             
             # Validar stock y calcular totales
             subtotal = 0
+            nombres_productos = {}
             
             for item in productos:
                 # Validar producto existe
                 producto = self.producto_repo.find_by_id(item['producto_id'])
                 if not producto:
                     raise ProductoNoEncontradoException(str(item['producto_id']), "ID")
+                nombres_productos[item['producto_id']] = producto['nombre']
                 
                 # Validar cantidad
                 if item['cantidad'] <= 0:
@@ -135,17 +142,14 @@ class VentaService:
             if fecha_venta is None:
                 fecha_venta = datetime.now().date()
             
-            # Generar número de venta
-            numero_venta = self.venta_repo.generate_numero_venta(tipo_comprobante)
-            
-            # TRANSACCIÓN: Insertar venta, detalles, actualizar stock y registrar movimientos
+            # TRANSACCIÓN: Insertar venta, detalles, actualizar stock y registrar
+            # movimientos en una sola conexión, con un único commit al final
             venta_id = None
             
-            with get_db_cursor() as (cursor, conn):
+            with get_write_cursor() as (cursor, conn):
                 try:
-                    # 1. Insertar venta
+                    # 1. Insertar venta (el número se genera en el mismo INSERT)
                     datos_venta = {
-                        'numero_venta': numero_venta,
                         'cliente_id': cliente_id,
                         'usuario_id': usuario_id,
                         'fecha_venta': fecha_venta,
@@ -159,33 +163,44 @@ class VentaService:
                         'observaciones': observaciones
                     }
                     
-                    venta_id = self.venta_repo.insert(datos_venta)
+                    venta_id, numero_venta = self.venta_repo.insert_numerada(
+                        datos_venta, cursor=cursor
+                    )
                     
-                    # 2. Insertar detalles, actualizar stock y registrar movimientos
-                    for item in productos:
-                        producto_id = item['producto_id']
-                        cantidad = item['cantidad']
-                        
-                        # Insertar detalle
-                        detalle_data = {
+                    # 2. Insertar todos los detalles en un solo INSERT
+                    self.venta_repo.insert_detalles_bulk([
+                        {
                             'venta_id': venta_id,
-                            'producto_id': producto_id,
-                            'cantidad': cantidad,
+                            'producto_id': item['producto_id'],
+                            'cantidad': item['cantidad'],
                             'precio_unitario': item['precio_unitario'],
                             'descuento': item.get('descuento', 0),
                             'subtotal': item['subtotal']
                         }
-                        self.venta_repo.insert_detalle(detalle_data)
+                        for item in productos
+                    ], cursor=cursor)
+                    
+                    # 3. Restar el stock con un solo UPDATE (filas bloqueadas en
+                    # orden de producto_id) que retorna el stock anterior y el nuevo
+                    items_ordenados = sorted(productos, key=lambda item: item['producto_id'])
+                    deltas = {}
+                    for item in items_ordenados:
+                        producto_id = item['producto_id']
+                        deltas[producto_id] = deltas.get(producto_id, 0) - item['cantidad']
+                    stocks = self.producto_repo.increment_stocks_returning(deltas, cursor=cursor)
+                    
+                    # 4. Registrar movimientos (uno por línea, cubre productos repetidos)
+                    movimientos = []
+                    stock_actual = {producto_id: antes for producto_id, (antes, _) in stocks.items()}
+                    for item in items_ordenados:
+                        producto_id = item['producto_id']
+                        cantidad = item['cantidad']
                         
-                        # Obtener stock anterior
-                        stock_anterior = self.producto_repo.get_stock_actual(producto_id)
+                        stock_anterior = stock_actual[producto_id]
                         stock_nuevo = stock_anterior - cantidad
+                        stock_actual[producto_id] = stock_nuevo
                         
-                        # Actualizar stock
-                        self.producto_repo.update_stock(producto_id, cantidad, 'restar')
-                        
-                        # Registrar movimiento
-                        movimiento_data = {
+                        movimientos.append({
                             'producto_id': producto_id,
                             'tipo_movimiento': 'salida',
                             'cantidad': cantidad,
@@ -195,11 +210,16 @@ class VentaService:
                             'stock_nuevo': stock_nuevo,
                             'usuario_id': usuario_id,
                             'observaciones': f"Salida por venta {numero_venta}"
-                        }
-                        self.movimiento_repo.registrar_movimiento(movimiento_data)
+                        })
+                    
+                    self.movimiento_repo.registrar_movimientos_bulk(movimientos, cursor=cursor)
                     
                     conn.commit()
                     
+                    # Invalidar cachés solo después del commit
+                    self.venta_repo.after_commit(fecha_venta)
+                    self.producto_repo.after_commit()
+                    
                     cliente_nombre = f"{cliente['nombres']} {cliente.get('apellidos', '')}".strip()
                     
                     logger.info(
@@ -208,6 +228,13 @@ class VentaService:
                         f"Total: S/. {total:.2f}"
                     )
                     
+                except pg_errors.CheckViolation as e:
+                    conn.rollback()
+                    if e.diag.constraint_name != _STOCK_CONSTRAINT:
+                        logger.error(f"Error en transacción de venta: {e}")
+                        raise
+                    # Otra venta concurrente consumió el stock después de la validación
+                    raise self._stock_insuficiente(deltas, nombres_productos) from e
                 except Exception as e:
                     conn.rollback()
                     logger.error(f"Error en transacción de venta: {e}")
@@ -240,6 +267,31 @@ class VentaService:
             logger.error(f"Error registrando venta: {e}")
             raise
     
+    def _stock_insuficiente(self, deltas: Dict[int, int],
+                            nombres_productos: Dict[int, str]) -> StockInsuficienteException:
+        """
+        Construye la excepción de stock insuficiente tras un rechazo del
+        CHECK de stock, con el producto de menor margen según el stock
+        vigente (el que provocó el rechazo, salvo que se haya repuesto).
+        
+        Args:
+            deltas (Dict[int, int]): {producto_id: cantidad restada (negativa)}
+            nombres_productos (Dict[int, str]): {producto_id: nombre}
+            
+        Returns:
+            StockInsuficienteException: Excepción a lanzar
+        """
+        faltantes = []
+        for producto_id in sorted(deltas):
+            solicitado = -deltas[producto_id]
+            disponible = self.producto_repo.get_stock_actual(producto_id) or 0
+            faltantes.append((disponible - solicitado, producto_id, disponible, solicitado))
+        
+        _, producto_id, disponible, solicitado = min(faltantes)
+        return StockInsuficienteException(
+            nombres_productos[producto_id], disponible, solicitado
+        )
+    
     def anular_venta(self, venta_id: int, usuario_id: int) -> bool:
         """
         Anula una venta y devuelve el stock.
@@ -359,6 +411,35 @@ class VentaService:
             logger.error(f"Error listando ventas: {e}")
             raise
     
+    def listar_ventas_con_detalles(
+        self,
+        estado: str = None,
+        fecha_inicio: date = None,
+        fecha_fin: date = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Lista ventas incluyendo sus detalles, con dos consultas en total.
+        
+        Args:
+            estado (str): Estado a filtrar ('completada', 'anulada')
+            fecha_inicio (date): Fecha inicial (opcional)
+            fecha_fin (date): Fecha final (opcional)
+            
+        Returns:
+            List[Dict]: Ventas, cada una con la lista 'detalles'
+        """
+        try:
+            ventas = self.listar_ventas(estado, fecha_inicio, fecha_fin)
+            detalles = self.venta_repo.get_detalles_bulk([v['id'] for v in ventas])
+            
+            for venta in ventas:
+                venta['detalles'] = detalles.get(venta['id'], [])
+            
+            return ventas
+        except Exception as e:
+            logger.error(f"Error listando ventas con detalles: {e}")
+            raise
+    
     def obtener_venta_completa(self, venta_id: int) -> Dict[str, Any]:
         """
         Obtiene una venta con todos sus detalles.
@@ -419,27 +500,29 @@ class VentaService:
             Dict: Estadísticas de ventas
         """
         try:
-            ventas = self.venta_repo.get_by_date_range(fecha_inicio, fecha_fin)
+            ventas = self.venta_repo.get_by_date_range(
+                fecha_inicio, fecha_fin, dict_rows=False
+            )
             
-            total_vendido = sum(v['total'] for v in ventas)
-            total_descuentos = sum(v['descuento'] for v in ventas)
+            total_vendido = sum(v.total for v in ventas)
+            total_descuentos = sum(v.descuento for v in ventas)
             
             # Agrupar por método de pago
             por_metodo = {}
             for venta in ventas:
-                metodo = venta['metodo_pago']
+                metodo = venta.metodo_pago
                 if metodo not in por_metodo:
                     por_metodo[metodo] = {'cantidad': 0, 'monto': 0}
                 por_metodo[metodo]['cantidad'] += 1
-                por_metodo[metodo]['monto'] += venta['total']
+                por_metodo[metodo]['monto'] += venta.total
             
             resultado = {
                 'total_ventas': len(ventas),
                 'total_vendido': round(total_vendido, 2),
                 'total_descuentos': round(total_descuentos, 2),
                 'promedio_por_venta': round(total_vendido / len(ventas), 2) if ventas else 0,
-                'ticket_minimo': round(min((v['total'] for v in ventas), default=0), 2),
-                'ticket_maximo': round(max((v['total'] for v in ventas), default=0), 2),
+                'ticket_minimo': round(min((v.total for v in ventas), default=0), 2),
+                'ticket_maximo': round(max((v.total for v in ventas), default=0), 2),
                 'por_metodo_pago': por_metodo,
                 'fecha_inicio': fecha_inicio,
                 'fecha_fin': fecha_fin
@@ -0,0 +1,212 @@
+-- ============================================
+-- SISTEMA DE COMERCIALIZACIÓN
+-- Optimizaciones para PostgreSQL (Neon)
+-- ============================================
+-- schema.sql describe el esquema original en MySQL; este archivo
+-- reúne los índices y extensiones que usa la aplicación sobre
+-- PostgreSQL. Todas las sentencias son idempotentes.
+-- ============================================
+
+-- ============================================
+-- BÚSQUEDA DE CLIENTES (ClienteRepository.search)
+-- ============================================
+-- Índices trigram: permiten usar índice en ILIKE '%texto%'
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_clientes_documento_trgm
+    ON clientes USING gin (numero_documento gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_clientes_nombres_trgm
+    ON clientes USING gin (nombres gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_clientes_apellidos_trgm
+    ON clientes USING gin (apellidos gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_clientes_razon_social_trgm
+    ON clientes USING gin (razon_social gin_trgm_ops);
+
+-- ============================================
+-- BÚSQUEDA DE PRODUCTOS Y PROVEEDORES (search)
+-- ============================================
+-- Mismo esquema: LIKE '%texto%' usa estos índices sin cambiar la
+-- consulta (requiere pg_trgm, creada arriba).
+CREATE INDEX IF NOT EXISTS idx_productos_codigo_trgm
+    ON productos USING gin (codigo gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_productos_nombre_trgm
+    ON productos USING gin (nombre gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_proveedores_ruc_trgm
+    ON proveedores USING gin (ruc gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_proveedores_razon_social_trgm
+    ON proveedores USING gin (razon_social gin_trgm_ops);
+
+-- ============================================
+-- NUMERACIÓN DE COMPRAS (CompraRepository.generate_numero_compra)
+-- ============================================
+-- Una secuencia por año: compras_num_seq_AAAA. La aplicación la crea
+-- la primera vez que la necesita, continuando desde el mayor número
+-- COM-AAAA-NNN existente, por lo que no hace falta reiniciarla cada
+-- año. Para crearla por adelantado (p. ej. para 2026):
+--
+--   CREATE SEQUENCE IF NOT EXISTS compras_num_seq_2026;
+--
+-- anio y numero_seq se derivan de numero_compra (columnas generadas, se
+-- completan solas para las filas existentes). Con ellas el máximo del
+-- año es un MAX entero sobre el índice, sin analizar texto; si no
+-- existen, la aplicación sigue extrayendo el número de numero_compra.
+ALTER TABLE compras
+    ADD COLUMN IF NOT EXISTS anio SMALLINT GENERATED ALWAYS AS (
+        CASE WHEN numero_compra ~ '^COM-[0-9]{4}-[0-9]+$'
+             THEN split_part(numero_compra, '-', 2)::smallint
+        END
+    ) STORED,
+    ADD COLUMN IF NOT EXISTS numero_seq INT GENERATED ALWAYS AS (
+        CASE WHEN numero_compra ~ '^COM-[0-9]{4}-[0-9]+$'
+             THEN split_part(numero_compra, '-', 3)::int
+        END
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS ix_compras_anio_seq
+    ON compras (anio, numero_seq DESC);
+
+-- ============================================
+-- RANGOS DE FECHAS (get_by_date_range)
+-- ============================================
+-- Las consultas comparan la columna directamente (sin DATE()), así
+-- que pueden usar estos índices. CONCURRENTLY no bloquea escrituras
+-- pero no puede ejecutarse dentro de una transacción: correr estas
+-- sentencias por separado.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_movimientos_fecha
+    ON movimientos_inventario (fecha_movimiento);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_compras_fecha
+    ON compras (fecha_compra);
+
+-- ============================================
+-- LISTADO DE COMPRAS (CompraRepository.get_all_with_details)
+-- ============================================
+-- Los listados piden columnas explícitas; este índice cubre el orden
+-- del historial y las columnas de cabecera más leídas, de modo que el
+-- recorrido puede resolverse en gran parte con index-only scans.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_compras_list
+    ON compras (fecha_compra DESC, id DESC)
+    INCLUDE (numero_compra, proveedor_id, usuario_id, estado, total);
+
+-- ============================================
+-- PAGINACIÓN POR KEYSET (get_page)
+-- ============================================
+-- El historial se pagina con (fecha_movimiento, id) < (%s, %s); este
+-- índice sigue el mismo orden. Para compras lo cubre ix_compras_list.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_movimientos_keyset
+    ON movimientos_inventario (fecha_movimiento DESC, id DESC);
+
+-- ============================================
+-- NUMERACIÓN DE VENTAS (VentaRepository.generate_numero_venta)
+-- ============================================
+-- La búsqueda del último número usa LIKE 'BOL-2024-%'. Con una
+-- collation distinta de C el índice btree normal no sirve para
+-- prefijos; text_pattern_ops sí.
+CREATE INDEX IF NOT EXISTS idx_ventas_numero_pattern
+    ON ventas (numero_venta text_pattern_ops);
+--
+-- El número se toma de venta_counters (un contador por prefijo y año,
+-- incrementado con UPDATE ... RETURNING). La aplicación crea la tabla
+-- si no existe; el LIKE anterior solo se usa para sembrar el contador
+-- la primera vez en el año.
+CREATE TABLE IF NOT EXISTS venta_counters (
+    prefijo VARCHAR(8) NOT NULL,
+    anio INT NOT NULL,
+    last_number INT NOT NULL,
+    PRIMARY KEY (prefijo, anio)
+);
+
+-- ============================================
+-- STOCK BAJO (ProductoRepository.get_low_stock)
+-- ============================================
+-- Índice parcial: solo contiene los productos activos bajo el mínimo
+-- (normalmente pocos), ya ordenados por la cantidad requerida que usa
+-- el ORDER BY. El predicado repite el de la consulta para que el
+-- planificador pueda usarlo.
+CREATE INDEX IF NOT EXISTS idx_productos_low_stock
+    ON productos ((stock_minimo - stock_actual) DESC)
+    WHERE activo = TRUE AND stock_actual <= stock_minimo;
+
+-- ============================================
+-- STOCK NO NEGATIVO (ProductoRepository.update_stock)
+-- ============================================
+-- update_stock suma un delta con signo en una sola sentencia; el CHECK
+-- rechaza ahí mismo una salida mayor que el stock disponible, aunque
+-- dos ventas concurrentes hayan pasado la validación previa. NOT VALID
+-- aplica la regla a las escrituras nuevas sin fallar por filas
+-- antiguas; ejecutar VALIDATE CONSTRAINT después de corregirlas.
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'chk_productos_stock_no_negativo'
+    ) THEN
+        ALTER TABLE productos
+            ADD CONSTRAINT chk_productos_stock_no_negativo
+            CHECK (stock_actual >= 0) NOT VALID;
+    END IF;
+END
+$$;
+
+-- ============================================
+-- REPORTES DE VENTAS (get_by_date_range, get_total_ventas_periodo,
+-- get_ventas_del_dia)
+-- ============================================
+-- Las tres filtran estado = 'completada' y un rango (o día) de
+-- fecha_venta. Con la igualdad primero el rango queda contiguo en el
+-- índice; INCLUDE (total, cliente_id) permite resolver la suma de
+-- get_total_ventas_periodo con un index-only scan.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ventas_estado_fecha
+    ON ventas (estado, fecha_venta)
+    INCLUDE (total, cliente_id);
+
+-- ============================================
+-- NOMBRE COMPLETO DEL CLIENTE (listados de VentaRepository)
+-- ============================================
+-- Columna generada con el nombre que muestran los listados de ventas;
+-- se calcula al escribir el cliente en lugar de concatenar en cada fila
+-- leída. Se usa || y no CONCAT porque la expresión debe ser inmutable.
+-- VentaRepository detecta la columna y, si no existe, sigue
+-- concatenando en la consulta.
+ALTER TABLE clientes
+    ADD COLUMN IF NOT EXISTS nombre_completo VARCHAR(255)
+    GENERATED ALWAYS AS (TRIM(nombres || ' ' || COALESCE(apellidos, ''))) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_clientes_nombre_completo_trgm
+    ON clientes USING gin (nombre_completo gin_trgm_ops);
+
+-- ============================================
+-- LISTADOS POR CLIENTE Y POR ROL (VentaRepository.get_by_cliente,
+-- UsuarioRepository.get_by_rol)
+-- ============================================
+-- Claves = columna filtrada + columna del ORDER BY, y el mismo predicado
+-- fijo que usa el método como condición del índice parcial: la lectura
+-- sale ya ordenada (sin Sort) de un índice pequeño. get_by_estado
+-- (estado, ORDER BY fecha_venta DESC) usa idx_ventas_estado_fecha
+-- recorrido hacia atrás. El nombre evita chocar con
+-- idx_ventas_cliente_fecha de schema.sql, que no es parcial.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ventas_cliente_fecha_completadas
+    ON ventas (cliente_id, fecha_venta DESC)
+    WHERE estado = 'completada';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_usuarios_rol_nombre
+    ON usuarios (rol, nombre_completo)
+    WHERE activo = TRUE;
+
+-- ============================================
+-- BÚSQUEDA DE PRODUCTOS POR PREFIJO (ProductoRepository.search)
+-- ============================================
+-- search prueba primero LIKE 'term%'; con text_pattern_ops el btree
+-- resuelve el prefijo como un rango sin importar la collation de la
+-- base. Los trigram de arriba quedan para el segundo paso por subcadena.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_productos_nombre_pattern
+    ON productos (nombre text_pattern_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_productos_codigo_pattern
+    ON productos (codigo text_pattern_ops);
+
+-- ============================================
+-- ÚLTIMO MOVIMIENTO POR PRODUCTO (ProductoRepository.get_sin_movimiento,
+-- MovimientoRepository.get_by_producto)
+-- ============================================
+-- MAX(fecha_movimiento) por producto_id se resuelve recorriendo este
+-- índice; get_by_producto obtiene el historial ya ordenado.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_movimientos_producto_fecha
+    ON movimientos_inventario (producto_id, fecha_movimiento DESC);
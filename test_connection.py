@@ -25,11 +25,24 @@ from config.database import (
     execute_query,
     test_connection,
     get_pool_status,
+    initialize_pool,
     close_pool
 )
+from config.logging_setup import configure_logging
 from config.settings import DatabaseConfig
 
 
+def setup_module(module):
+    """Inicializa el pool cuando pytest recolecta estas pruebas"""
+    configure_logging()
+    initialize_pool()
+
+
+def teardown_module(module):
+    """Cierra el pool al terminar las pruebas del módulo"""
+    close_pool()
+
+
 def print_header(title):
     """Imprime un encabezado formateado"""
     print("\n" + "="*60)
@@ -400,6 +413,8 @@ def run_all_tests():
 
 if __name__ == '__main__':
     try:
+        configure_logging()
+        initialize_pool()
         exit_code = 0 if run_all_tests() else 1
         
         # Cerrar pool al finalizar
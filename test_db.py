@@ -5,7 +5,8 @@ try:
     print(f"   Versión: {psycopg2.__version__}")
     
     # Probar conexión rápida
-    from config.database import test_connection
+    from config.database import initialize_pool, test_connection
+    initialize_pool()
     if test_connection():
         print("✅ Conexión a PostgreSQL exitosa")
 except ImportError as e:
@@ -10,6 +10,9 @@ from datetime import datetime, date, timedelta
 
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
+from config.database import initialize_pool, close_pool
+from config.logging_setup import configure_logging
+
 from repositories import (
     ProductoRepository,
     CategoriaRepository,
@@ -22,6 +25,17 @@ from repositories import (
 )
 
 
+def setup_module(module):
+    """Inicializa el pool cuando pytest recolecta estas pruebas"""
+    configure_logging()
+    initialize_pool()
+
+
+def teardown_module(module):
+    """Cierra el pool al terminar las pruebas del módulo"""
+    close_pool()
+
+
 def test_categorias():
     """Prueba repositorio de categorías"""
     print("\n" + "="*60)
@@ -149,6 +163,15 @@ def test_compras():
         numero = repo.generate_numero_compra()
         print(f"✓ Número de compra generado: {numero}")
         
+        # Tras realinear la secuencia, dos números seguidos son correlativos
+        repo.reseed_numero_compra()
+        primero = repo.generate_numero_compra()
+        segundo = repo.generate_numero_compra()
+        assert primero != segundo, "Números de compra repetidos"
+        assert int(segundo.rsplit('-', 1)[1]) == int(primero.rsplit('-', 1)[1]) + 1, \
+            "Números de compra no consecutivos"
+        print(f"✓ Números correlativos tras realinear: {primero}, {segundo}")
+        
         # Obtener todas las compras
         compras = repo.get_all_with_details()
         print(f"✓ Total de compras: {len(compras)}")
@@ -321,4 +344,6 @@ def run_all_tests():
 
 
 if __name__ == '__main__':
+    configure_logging()
+    initialize_pool()
     run_all_tests()
\ No newline at end of file
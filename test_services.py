@@ -13,10 +13,24 @@ from decimal import Decimal
 
 sys.path.insert(0, str(Path(__file__).resolve().parent))
 
+from config.database import initialize_pool, close_pool, execute_transaction
+from config.logging_setup import configure_logging
+
 from services import ProductoService, CompraService, VentaService, InventarioService
 from exceptions import *
 
 
+def setup_module(module):
+    """Inicializa el pool cuando pytest recolecta estas pruebas"""
+    configure_logging()
+    initialize_pool()
+
+
+def teardown_module(module):
+    """Cierra el pool al terminar las pruebas del módulo"""
+    close_pool()
+
+
 def test_producto_service():
     """Prueba servicio de productos"""
     print("\n" + "="*60)
@@ -184,6 +198,134 @@ def test_venta_service():
         return False
 
 
+def _correlativo(numero: str) -> int:
+    """Parte numérica final de un número de comprobante (BOL-2026-0001 -> 1)"""
+    return int(numero.rsplit('-', 1)[1])
+
+
+# Deshacen los documentos creados por test_numeracion (ids en un array)
+_BORRAR_VENTAS_SQL = [
+    # Devolver el stock descontado por las ventas
+    """
+        UPDATE productos p
+        SET stock_actual = p.stock_actual + d.cantidad
+        FROM (
+            SELECT producto_id, SUM(cantidad) AS cantidad
+            FROM detalle_ventas
+            WHERE venta_id = ANY(%s)
+            GROUP BY producto_id
+        ) d
+        WHERE p.id = d.producto_id
+    """,
+    "DELETE FROM movimientos_inventario WHERE motivo = 'venta' AND referencia_id = ANY(%s)",
+    # detalle_ventas se borra en cascada
+    "DELETE FROM ventas WHERE id = ANY(%s)",
+]
+
+# Una compra pendiente no movió stock; detalle_compras se borra en cascada
+_BORRAR_COMPRAS_SQL = "DELETE FROM compras WHERE id = ANY(%s)"
+
+
+def _verificar_numeracion(etiqueta: str, registrar, campo: str, creados: list) -> None:
+    """
+    Registra dos documentos seguidos y verifica que sus números sean
+    distintos y consecutivos.
+    
+    Args:
+        etiqueta (str): Documento para los mensajes ('venta', 'compra')
+        registrar: Función sin argumentos que registra un documento
+        campo (str): Clave del número en el resultado ('numero_venta', ...)
+        creados (list): Recibe los resultados registrados, para limpiarlos
+            aunque la verificación falle
+    """
+    try:
+        for _ in range(2):
+            creados.append(registrar())
+    except StockInsuficienteException as e:
+        print(f"  ℹ No se pudo registrar {etiqueta}: {e.message}")
+        return
+    
+    numeros = [documento[campo] for documento in creados]
+    print(f"✓ {etiqueta.capitalize()}s registradas: {numeros[0]}, {numeros[1]}")
+    assert numeros[0] != numeros[1], f"Números de {etiqueta} repetidos"
+    assert _correlativo(numeros[1]) == _correlativo(numeros[0]) + 1, \
+        f"Números de {etiqueta} no consecutivos"
+    print(f"✓ Números de {etiqueta} distintos y consecutivos")
+
+
+def test_numeracion():
+    """Prueba que ventas y compras seguidas reciben números correlativos"""
+    print("\n" + "="*60)
+    print("PRUEBA: Numeración de ventas y compras")
+    print("="*60)
+    
+    venta_service = VentaService()
+    compra_service = CompraService()
+    ventas, compras = [], []
+    
+    try:
+        _verificar_numeracion(
+            'venta',
+            lambda: venta_service.registrar_venta(
+                cliente_id=1,
+                usuario_id=1,
+                productos=[{
+                    'producto_id': 1,  # Asumiendo que existe y tiene stock
+                    'cantidad': 1,
+                    'precio_unitario': 2500.00,
+                    'descuento': 0
+                }],
+                tipo_comprobante='boleta',
+                metodo_pago='efectivo',
+                observaciones="Prueba de numeración desde test"
+            ),
+            'numero_venta',
+            ventas
+        )
+        
+        # Realinear la secuencia del año con el último número registrado
+        compra_service.compra_repo.reseed_numero_compra()
+        print("✓ Secuencia de compras realineada")
+        
+        _verificar_numeracion(
+            'compra',
+            lambda: compra_service.registrar_compra(
+                proveedor_id=1,  # Asumiendo que existe
+                usuario_id=1,
+                productos=[{
+                    'producto_id': 1,  # Asumiendo que existe
+                    'cantidad': 1,
+                    'precio_unitario': 1800.00
+                }],
+                observaciones="Prueba de numeración desde test"
+            ),
+            'numero_compra',
+            compras
+        )
+        
+        return True
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+    finally:
+        # No dejar documentos de prueba en la base de datos
+        venta_ids = [venta['venta_id'] for venta in ventas]
+        compra_ids = [compra['compra_id'] for compra in compras]
+        operaciones = [(sql, (venta_ids,)) for sql in _BORRAR_VENTAS_SQL if venta_ids]
+        if compra_ids:
+            operaciones.append((_BORRAR_COMPRAS_SQL, (compra_ids,)))
+        if operaciones:
+            execute_transaction(operaciones)
+            venta_service.venta_repo.after_commit()
+            venta_service.producto_repo.after_commit()
+            if compra_ids:
+                # Que la siguiente compra real reutilice los números liberados
+                compra_service.compra_repo.reseed_numero_compra()
+            print(f"✓ Limpieza: {len(venta_ids)} ventas y {len(compra_ids)} compras eliminadas")
+
+
 def test_inventario_service():
     """Prueba servicio de inventario"""
     print("\n" + "="*60)
@@ -253,6 +395,7 @@ def run_all_tests():
         ("ProductoService", test_producto_service),
         ("CompraService", test_compra_service),
         ("VentaService", test_venta_service),
+        ("Numeración de ventas y compras", test_numeracion),
         ("InventarioService", test_inventario_service)
     ]
     
@@ -288,4 +431,6 @@ def run_all_tests():
 
 
 if __name__ == '__main__':
+    configure_logging()
+    initialize_pool()
     run_all_tests()
\ No newline at end of file
@@ -0,0 +1,48 @@
+"""
+============================================
+VALIDACIÓN ESTÁTICA DE CONFIGURACIÓN
+============================================
+Ejecuta todas las validaciones de config/settings.py fuera del
+arranque de la aplicación (pre-commit / CI).
+
+Fuerza APP_DEBUG=false para comprobar la configuración tal como
+correría en producción.
+
+Uso:
+    python tools/validate_config.py
+============================================
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+os.environ['APP_DEBUG'] = 'false'
+# La validación completa se hace aquí; se omite la rápida del import
+os.environ['SKIP_CONFIG_VALIDATION'] = '1'
+
+from config.settings import validate_config
+
+
+def main() -> int:
+    """
+    Ejecuta la validación completa.
+    
+    Returns:
+        int: Código de salida (0 si la configuración es válida)
+    """
+    try:
+        validate_config()
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    
+    print("✅ Configuración válida")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
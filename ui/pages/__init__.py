@@ -3,18 +3,39 @@
 UI PAGES - MÓDULO DE PÁGINAS
 ============================================
 Páginas de la interfaz gráfica del sistema
+
+Las páginas se importan bajo demanda con get_page(); el módulo queda
+cacheado a nivel de proceso, de modo que cada rerun de Streamlit solo
+hace una búsqueda en un diccionario.
 """
 
-from . import dashboard
-from . import productos
-from . import ventas
-from . import compras
-from . import inventario
+import importlib
+from types import ModuleType
+from typing import Dict
 
 __all__ = [
     'dashboard',
     'productos',
     'ventas',
     'compras',
-    'inventario'
+    'inventario',
+    'get_page'
 ]
+
+_page_cache: Dict[str, ModuleType] = {}
+
+
+def get_page(slug: str) -> ModuleType:
+    """
+    Obtiene el módulo de una página, importándolo la primera vez.
+    
+    Args:
+        slug (str): Nombre de la página ('dashboard', 'productos', ...)
+        
+    Returns:
+        ModuleType: Módulo con la función render()
+    """
+    module = _page_cache.get(slug)
+    if module is None:
+        module = _page_cache.setdefault(slug, importlib.import_module(f"{__name__}.{slug}"))
+    return module
@@ -281,8 +281,8 @@ def recibir_compra():
     try:
         compra_service = CompraService()
         
-        # Obtener compras pendientes
-        compras_pendientes = compra_service.listar_compras(estado='pendiente')
+        # Obtener compras pendientes (con sus detalles, en una sola consulta)
+        compras_pendientes = compra_service.listar_compras_con_detalles(estado='pendiente')
         
         if not compras_pendientes:
             st.info("📋 No hay compras pendientes por recibir")
@@ -319,8 +319,8 @@ def recibir_compra():
             
             st.markdown("---")
             
-            # Obtener detalles de los productos
-            detalles = compra_service.obtener_detalles_compra(compra_seleccionada['id'])
+            # Detalles de los productos (ya incluidos en la compra)
+            detalles = compra_seleccionada['detalles']
             
             if detalles:
                 st.markdown("#### 📦 Productos en la Compra")
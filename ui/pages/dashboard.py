@@ -7,8 +7,23 @@ Vista general del sistema con métricas clave
 
 import streamlit as st
 from services import ProductoService, InventarioService
+from config.database import cached_query
 from datetime import datetime
 
+
+@cached_query(ttl=60)
+def _cargar_metricas():
+    """Consulta (cacheada 60 s) las métricas de solo lectura del dashboard"""
+    producto_service = ProductoService()
+    inventario_service = InventarioService()
+    
+    return {
+        'productos': producto_service.listar_productos_activos(),
+        'stock_critico': producto_service.obtener_productos_stock_critico(),
+        'valor_inventario': inventario_service.calcular_valor_total_inventario()
+    }
+
+
 def render():
     """Renderiza la página del dashboard"""
     
@@ -16,9 +31,10 @@ def render():
     st.markdown("---")
     
     try:
-        # Inicializar servicios
-        producto_service = ProductoService()
-        inventario_service = InventarioService()
+        metricas = _cargar_metricas()
+        productos = metricas['productos']
+        stock_critico = metricas['stock_critico']
+        valor_inventario = metricas['valor_inventario']
         
         # ============================================
         # MÉTRICAS PRINCIPALES
@@ -29,7 +45,6 @@ def render():
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            productos = producto_service.listar_productos_activos()
             st.metric(
                 label="Total Productos",
                 value=len(productos),
@@ -37,7 +52,6 @@ def render():
             )
         
         with col2:
-            stock_critico = producto_service.obtener_productos_stock_critico()
             st.metric(
                 label="Stock Crítico",
                 value=len(stock_critico),
@@ -46,7 +60,6 @@ def render():
             )
         
         with col3:
-            valor_inventario = inventario_service.calcular_valor_total_inventario()
             st.metric(
                 label="Valor Inventario",
                 value=f"S/. {valor_inventario['valor_venta']:,.2f}",
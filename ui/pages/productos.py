@@ -278,6 +278,11 @@ def editar_producto():
         )
         
         if producto_seleccionado:
+            # El listado trae solo las columnas de la tabla; el formulario
+            # necesita el registro completo (descripción incluida)
+            producto_seleccionado = producto_service.obtener_producto_por_id(
+                producto_seleccionado['id']
+            )
             st.markdown("---")
             
             with st.form("form_editar_producto"):